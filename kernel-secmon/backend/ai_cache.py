@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from db_pool import reader, writer
+
+# Cache sizing (overridable via environment)
+AI_CACHE_MEMORY_ENTRIES = int(os.getenv("AI_CACHE_MEMORY_ENTRIES", "2048"))
+AI_CACHE_DB_ENTRIES = int(os.getenv("AI_CACHE_DB_ENTRIES", "100000"))
+AI_CACHE_TTL_SECONDS = float(os.getenv("AI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Expired / excess rows are pruned from SQLite every this many writes
+AI_CACHE_PRUNE_EVERY = 256
+
+SELECT_SQL = "SELECT value, expires_at FROM ai_cache WHERE key = ?"
+UPSERT_SQL = '''
+    INSERT INTO ai_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET value = excluded.value, created_at = excluded.created_at, expires_at = excluded.expires_at
+'''
+
+_MISS = object()
+
+# Volatile parts of event details: hex addresses, IPs, then any other number
+_VOLATILE = [
+    (re.compile(r"0x[0-9a-fA-F]+"), "<addr>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}\b"), "<ip>"),
+    (re.compile(r"\d+"), "<n>"),
+]
+
+
+def event_signature(event_type, process_name, severity, details):
+    """
+    Cache key for templated events: the same type, process name and severity
+    with details that differ only in numbers, addresses or IPs share one key.
+    """
+    normalized = details or ""
+    for pattern, placeholder in _VOLATILE:
+        normalized = pattern.sub(placeholder, normalized)
+    digest = hashlib.sha1(f"{event_type}\x1f{process_name}\x1f{severity}\x1f{normalized}".encode()).hexdigest()
+    return f"sig:{digest}"
+
+
+class AnalysisCache:
+    """
+    Two-tier cache for AI analysis results.
+
+    Tier one is an in-process LRU (microsecond hits); tier two is the
+    ai_cache SQLite table, which survives restarts and is shared by worker
+    processes. Every entry carries an absolute expiry. A tier-two hit is
+    promoted into memory. Values are JSON-serializable. Coroutines use
+    get_async / put_async, which touch SQLite only from a worker thread.
+    """
+
+    def __init__(self, memory_entries=AI_CACHE_MEMORY_ENTRIES, db_entries=AI_CACHE_DB_ENTRIES, ttl=AI_CACHE_TTL_SECONDS):
+        self.memory_entries = memory_entries
+        self.db_entries = db_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "expired": 0, "evicted": 0, "stores": 0}
+
+    def get(self, key):
+        now = time.time()
+        value = self._get_memory(key, now)
+        return self._get_db(key, now) if value is _MISS else value
+
+    async def get_async(self, key):
+        """get() without blocking the event loop: only a memory miss goes to a worker thread."""
+        now = time.time()
+        value = self._get_memory(key, now)
+        return await asyncio.to_thread(self._get_db, key, now) if value is _MISS else value
+
+    async def put_async(self, key, value, ttl=None):
+        await asyncio.to_thread(self.put, key, value, ttl)
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return entry[1]
+                del self._memory[key]
+                self.counters["expired"] += 1
+        return _MISS
+
+    def _get_db(self, key, now):
+        with reader() as conn:
+            row = conn.execute(SELECT_SQL, (key,)).fetchone()
+        if row is None or row[1] <= now:
+            with self._lock:
+                self.counters["misses"] += 1
+            return None
+
+        value = json.loads(row[0])
+        with self._lock:
+            self.counters["db_hits"] += 1
+            self._remember(key, row[1], value)
+        return value
+
+    def put(self, key, value, ttl=None):
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self.counters["stores"] += 1
+            self._remember(key, expires_at, value)
+            self._writes += 1
+            prune = self._writes % AI_CACHE_PRUNE_EVERY == 0
+        with writer() as conn:
+            conn.execute(UPSERT_SQL, (key, json.dumps(value), now, expires_at))
+            if prune:
+                self._prune(conn, now)
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["evicted"] += 1
+
+    def _prune(self, conn, now):
+        """Drops expired rows, then the soonest-to-expire rows past db_entries."""
+        conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (now,))
+        excess = conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0] - self.db_entries
+        if excess > 0:
+            conn.execute("DELETE FROM ai_cache WHERE key IN (SELECT key FROM ai_cache ORDER BY expires_at LIMIT ?)", (excess,))
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        with writer() as conn:
+            conn.execute("DELETE FROM ai_cache")
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            memory_size = len(self._memory)
+        with reader() as conn:
+            db_size = conn.execute("SELECT COUNT(*) FROM ai_cache").fetchone()[0]
+        lookups = counters["memory_hits"] + counters["db_hits"] + counters["misses"]
+        return {
+            **counters,
+            "lookups": lookups,
+            "hit_rate": round((counters["memory_hits"] + counters["db_hits"]) / lookups, 4) if lookups else 0.0,
+            "memory_size": memory_size,
+            "memory_capacity": self.memory_entries,
+            "db_size": db_size,
+            "db_capacity": self.db_entries,
+            "ttl_seconds": self.ttl,
+        }
+
+
+analysis_cache = AnalysisCache()
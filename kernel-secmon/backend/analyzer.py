@@ -1,82 +1,130 @@
-import sqlite3
+import asyncio
+import os
+import time
 from models import KernelEvent
-from datetime import datetime, timedelta
-from gemini_service import generate_xai_explanation, generate_knowledge_graph_data
+from timestamps import to_epoch_us
+from database import get_event
+from behavior import BehaviorDetector
+from rules import RuleEngine
+from correlation import CorrelationEngine
+from gemini_service import (try_generate_xai_explanation, generate_xai_explanation_async, stream_xai_explanation_async,
+                            generate_knowledge_graph_data, _get_fallback_explanation)
+from ai_cache import analysis_cache, event_signature
 from threat_intel import enrich_event_with_threat_intel
 
+# Precomputed analyses embed threat intel, so they expire sooner than explanations
+PRECOMPUTED_ANALYSIS_TTL = float(os.getenv("ENRICH_RESULT_TTL_SECONDS", "3600"))
+
+# Kill-chain state machines per process lineage (chains section of rules.json)
+correlation_engine = CorrelationEngine()
+
+# Declarative detections (rules.json), hot-reloaded on change together with the chains
+rule_engine = RuleEngine(sections=[correlation_engine])
+
 def analyze_event(event: KernelEvent):
     """
-    Analyzes a single incoming event for immediate red flags.
+    Analyzes a single incoming event for immediate red flags using the
+    compiled rule set. Threshold windows run on event time.
     """
-    anomalies = []
-    
-    # 1. Critical Severity immediate flag
-    if event.severity == "HIGH":
-        anomalies.append(f"Critical Event: {event.type} in {event.process_name}")
+    return rule_engine.evaluate(event, event_time(event))
 
-    # 2. Sequential Hooking Pattern
-    # This would usually look at history, for now we flag the event itself
-    if "HOOK" in event.type or "MODIFIED" in event.details:
-        anomalies.append(f"Persistence Technique: {event.type}")
+# Streaming per-PID detector, fed on every ingested event
+behavior_detector = BehaviorDetector()
 
-    return anomalies
+def event_time(event: KernelEvent):
+    """
+    Event time in epoch seconds from the normalized timestamp, capped at the
+    wall clock so a sensor with a fast clock cannot run a window ahead.
+    """
+    now = time.time()
+    ts_us = to_epoch_us(event.timestamp)
+    return now if ts_us is None else min(ts_us / 1e6, now)
 
-def check_behavioral_patterns(db_path="kernel_secmon.db"):
+def check_behavioral_patterns(event: KernelEvent):
     """
-    Scans the database for patterns over time (e.g., brute force, ritualistic hiding).
+    Feeds one event to the sliding-window detector (e.g., brute force,
+    ritualistic hiding). Returns findings for PIDs that just crossed the
+    threshold; no database query is involved. Windows run on event time.
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    findings = []
-    
-    # Example: Look for PID that has triggered multiple security events in 5 minutes
-    five_min_ago = (datetime.now() - timedelta(minutes=5)).isoformat()
-    
-    cursor.execute('''
-        SELECT pid, process_name, COUNT(*) as event_count 
-        FROM events 
-        WHERE severity != 'INFO' AND timestamp > ?
-        GROUP BY pid 
-        HAVING event_count > 3
-    ''', (five_min_ago,))
-    
-    results = cursor.fetchall()
-    for row in results:
-        pid, name, count = row
-        findings.append({
-            "type": "BEHAVIORAL_ANOMALY",
-            "details": f"Process {name} (PID {pid}) triggered {count} events in 5 minutes.",
-            "severity": "HIGH"
-        })
-        
-    conn.close()
-    return findings
-
-def get_event_analysis(event_id, db_path="kernel_secmon.db"):
+    return behavior_detector.observe(event, event_time(event))
+
+def correlate_event(event: KernelEvent):
+    """
+    Advances multi-event kill chains with one event. Returns a composite
+    incident for each chain the event completes.
+    """
+    return correlation_engine.observe(event, event_time(event))
+
+def _cached_explanation(event_id, event_type, process_name, severity, details):
+    """Returns (explanation or None, cache tier or None, store callback)."""
+    event_key = f"event:{event_id}"
+    explanation = analysis_cache.get(event_key)
+    if explanation is not None:
+        return explanation, "event", None
+
+    signature = event_signature(event_type, process_name, severity, details)
+    explanation = analysis_cache.get(signature)
+    if explanation is not None:
+        analysis_cache.put(event_key, explanation)
+        return explanation, "signature", None
+
+    def store(text):
+        analysis_cache.put(signature, text)
+        analysis_cache.put(event_key, text)
+    return None, None, store
+
+async def _cached_explanation_async(event_id, event_type, process_name, severity, details):
+    """_cached_explanation for coroutines; the cache lookups and writes run in a worker thread."""
+    return await asyncio.to_thread(_cached_explanation, event_id, event_type, process_name, severity, details)
+
+def explain_event(event_id, event_type, process_name, pid, severity, details):
+    """
+    Returns (explanation, cache tier or None). Only real Gemini answers are
+    cached; the canned fallback is cheap and is recomputed every time.
+    """
+    explanation, tier, store = _cached_explanation(event_id, event_type, process_name, severity, details)
+    if explanation is not None:
+        return explanation, tier
+
+    explanation = try_generate_xai_explanation(event_type, process_name, pid, severity, details)
+    if explanation is None:
+        return _get_fallback_explanation(event_type, process_name, pid), None
+    store(explanation)
+    return explanation, None
+
+async def explain_event_async(event_id, event_type, process_name, pid, severity, details):
+    """
+    explain_event for async callers: the Gemini call runs off the event loop,
+    under the global concurrency cap and deadline, coalesced per event
+    signature. A call that outlives the deadline still fills the cache.
+    """
+    explanation, tier, store = await _cached_explanation_async(event_id, event_type, process_name, severity, details)
+    if explanation is not None:
+        return explanation, tier
+
+    explanation = await generate_xai_explanation_async(
+        event_type, process_name, pid, severity, details,
+        key=event_signature(event_type, process_name, severity, details), on_result=store
+    )
+    if explanation is None:
+        return _get_fallback_explanation(event_type, process_name, pid), None
+    return explanation, None
+
+def get_event_analysis(event_id):
     """
     Returns enriched analysis and graph data for a specific event using Gemini AI
     and threat intelligence.
     """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM events WHERE id = ?", (event_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
+    event = get_event(event_id)
+    if not event:
         return None
-        
-    _, timestamp, pid, name, severity, type, details = row[:7]  # Handle optional parent_pid
-    
-    # 1. Generate XAI explanation using Gemini AI
-    explanation = generate_xai_explanation(
-        event_type=type,
-        process_name=name,
-        pid=pid,
-        severity=severity,
-        details=details
+
+    pid, name, severity, type, details = (
+        event["pid"], event["process_name"], event["severity"], event["type"], event["details"]
     )
+    
+    # 1. XAI explanation: cached per event, then per event signature, then Gemini AI
+    explanation, cached = explain_event(event_id, type, name, pid, severity, details)
 
     # 2. Build Knowledge Graph using Gemini AI
     graph = generate_knowledge_graph_data(
@@ -89,13 +137,143 @@ def get_event_analysis(event_id, db_path="kernel_secmon.db"):
     # 3. Enrich with Threat Intelligence
     threat_intel = enrich_event_with_threat_intel(details)
 
-    conn.close()
     return {
         "event_id": event_id,
         "xai_explanation": explanation,
+        "cached": cached,
         "graph": graph,
         "threat_intel": threat_intel,
         "raw_details": details
     }
 
 
+
+async def _build_analysis(event_id, event, explanation, cached):
+    """Adds the graph and threat intel (in a worker thread) to an explanation."""
+    pid, name, type, details = event["pid"], event["process_name"], event["type"], event["details"]
+    graph = generate_knowledge_graph_data(event_type=type, process_name=name, pid=pid, details=details)
+    threat_intel = await asyncio.to_thread(enrich_event_with_threat_intel, details)
+
+    return {
+        "event_id": event_id,
+        "xai_explanation": explanation,
+        "cached": cached,
+        "graph": graph,
+        "threat_intel": threat_intel,
+        "raw_details": details
+    }
+
+async def get_event_analysis_async(event_id):
+    """
+    get_event_analysis for the API: a result precomputed by the enrichment
+    worker is returned as is; otherwise database, archive and threat-intel
+    lookups run in worker threads and the AI call never blocks the loop.
+    """
+    precomputed = await analysis_cache.get_async(f"analysis:{event_id}")
+    if precomputed is not None:
+        return {**precomputed, "cached": "precomputed"}
+
+    event = await asyncio.to_thread(get_event, event_id)
+    if not event:
+        return None
+
+    explanation, cached = await explain_event_async(
+        event_id, event["type"], event["process_name"], event["pid"], event["severity"], event["details"]
+    )
+    return await _build_analysis(event_id, event, explanation, cached)
+
+async def stream_event_analysis(event_id):
+    """
+    get_event_analysis_async as a sequence of (section, data) pairs, for the
+    streaming endpoint. The explanation, graph and threat-intel stages run
+    concurrently and each section is yielded as soon as it is ready; a fresh
+    explanation arrives as "token" chunks before its final "explanation".
+    Ends with "done", or a single "error" when the event does not exist.
+    """
+    precomputed = await analysis_cache.get_async(f"analysis:{event_id}")
+    if precomputed is not None:
+        yield "explanation", {"text": precomputed["xai_explanation"], "cached": "precomputed"}
+        yield "graph", precomputed["graph"]
+        yield "threat_intel", precomputed["threat_intel"]
+        yield "done", {"event_id": event_id}
+        return
+
+    event = await asyncio.to_thread(get_event, event_id)
+    if not event:
+        yield "error", {"error": "Event not found"}
+        return
+
+    pid, name, severity, type, details = (
+        event["pid"], event["process_name"], event["severity"], event["type"], event["details"]
+    )
+    sections = asyncio.Queue()
+
+    async def explanation_stage():
+        explanation, cached, store = await _cached_explanation_async(event_id, type, name, severity, details)
+        if explanation is None:
+            parts = []
+            async for text in stream_xai_explanation_async(
+                type, name, pid, severity, details,
+                key=event_signature(type, name, severity, details), on_result=store
+            ):
+                parts.append(text)
+                await sections.put(("token", {"text": text}))
+            explanation = "".join(parts).strip() or _get_fallback_explanation(type, name, pid)
+        await sections.put(("explanation", {"text": explanation, "cached": cached}))
+
+    async def threat_intel_stage():
+        await sections.put(("threat_intel", await asyncio.to_thread(enrich_event_with_threat_intel, details)))
+
+    async def graph_stage():
+        await sections.put(("graph", generate_knowledge_graph_data(event_type=type, process_name=name, pid=pid, details=details)))
+
+    async def run(stage, section):
+        try:
+            await stage()
+        except Exception as e:
+            print(f"Analysis stage {section} failed for event {event_id}: {e}")
+            await sections.put((section, None))
+
+    stages = [asyncio.create_task(run(stage, section)) for stage, section in
+              ((explanation_stage, "explanation"), (threat_intel_stage, "threat_intel"), (graph_stage, "graph"))]
+    try:
+        remaining = len(stages)
+        while remaining:
+            section, data = await sections.get()
+            if section != "token":
+                remaining -= 1
+            yield section, data
+        yield "done", {"event_id": event_id}
+    finally:
+        # Client went away: stop waiting (an upstream call still fills the cache)
+        for task in stages:
+            task.cancel()
+
+async def precompute_event_analysis(event_id, event: KernelEvent, acquire):
+    """
+    Background enrichment of a stored event. Awaits `acquire()` (the RPM
+    budget) only when an upstream AI call is needed; with `acquire` None
+    there is no AI stage and the canned explanation is used. Stores the full
+    analysis and returns True; returns False when it was already stored or
+    Gemini gave no answer in time (a late answer still fills the cache).
+    """
+    key = f"analysis:{event_id}"
+    if await analysis_cache.get_async(key) is not None:
+        return False
+
+    type, name, pid, severity, details = event.type, event.process_name, event.pid, event.severity, event.details
+    explanation, cached, store = await _cached_explanation_async(event_id, type, name, severity, details)
+    if explanation is None and acquire is None:
+        explanation = _get_fallback_explanation(type, name, pid)
+    elif explanation is None:
+        await acquire()
+        explanation = await generate_xai_explanation_async(
+            type, name, pid, severity, details,
+            key=event_signature(type, name, severity, details), on_result=store
+        )
+        if explanation is None:
+            return False
+
+    analysis = await _build_analysis(event_id, event.model_dump(), explanation, cached)
+    await analysis_cache.put_async(key, analysis, ttl=PRECOMPUTED_ANALYSIS_TTL)
+    return True
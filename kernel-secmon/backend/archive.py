@@ -0,0 +1,193 @@
+import os
+from collections import Counter
+
+from db_pool import DB_PATH
+
+# Optional dependency: without pyarrow nothing is archived and archived
+# partitions are skipped by queries
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+ARCHIVE_DIR = os.getenv("SECMON_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "archive"))
+# Sealed partitions older than this move to Parquet (0 = never)
+ARCHIVE_AFTER_DAYS = int(os.getenv("SECMON_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_COMPRESSION = os.getenv("SECMON_ARCHIVE_COMPRESSION", "zstd")
+# Rows per row group: the unit of predicate pushdown and of early stopping
+ARCHIVE_ROW_GROUP_SIZE = 65536
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("id", pa.int64()),
+        ("timestamp", pa.string()),
+        ("pid", pa.int64()),
+        ("parent_pid", pa.int64()),
+        ("process_name", pa.string()),
+        ("severity", pa.string()),
+        ("type", pa.string()),
+        ("details", pa.string()),
+        ("ts_us", pa.int64()),
+    ])
+
+_warned = False
+
+
+def available():
+    global _warned
+    if pa is None and not _warned:
+        print("WARNING: pyarrow not installed. Cold archive is disabled.")
+        _warned = True
+    return pa is not None
+
+
+def archive_path(day):
+    return os.path.join(ARCHIVE_DIR, f"events_{day.replace('-', '')}.parquet")
+
+
+def write_partition(conn, table, path):
+    """
+    Copies a sealed partition table into a Parquet file, in id order, one
+    row group per ARCHIVE_ROW_GROUP_SIZE rows. Low-cardinality columns are
+    dictionary-encoded. Written to a temp file and renamed, so a crash never
+    leaves a half-written archive. Returns the number of rows.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    names = SCHEMA.names
+    temp_path = path + ".tmp"
+    rows = 0
+    cursor = conn.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY id")
+    with pq.ParquetWriter(temp_path, SCHEMA, compression=ARCHIVE_COMPRESSION,
+                          use_dictionary=["process_name", "severity", "type"]) as writer:
+        while True:
+            chunk = cursor.fetchmany(ARCHIVE_ROW_GROUP_SIZE)
+            if not chunk:
+                break
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, SCHEMA)], schema=SCHEMA))
+            rows += len(chunk)
+    os.replace(temp_path, path)
+    return rows
+
+
+def _may_match(row_group, positions, conditions):
+    """Row-group pruning: False when column statistics rule the group out."""
+    for column, op, value in conditions:
+        stats = row_group.column(positions[column]).statistics
+        if stats is None or not stats.has_min_max:
+            continue
+        low, high = stats.min, stats.max
+        if op == "=" and not low <= value <= high:
+            return False
+        if op == "in" and not any(low <= v <= high for v in value):
+            return False
+        if (op == "<" and low >= value) or (op == "<=" and low > value):
+            return False
+        if (op == ">" and high <= value) or (op == ">=" and high < value):
+            return False
+    return True
+
+
+def _expression(conditions):
+    expression = None
+    for column, op, value in conditions:
+        field = pc.field(column)
+        term = {
+            "=": lambda: field == value,
+            "in": lambda: field.isin(list(value)),
+            "<": lambda: field < value,
+            "<=": lambda: field <= value,
+            ">": lambda: field > value,
+            ">=": lambda: field >= value,
+        }[op]()
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def read_events(path, columns, conditions, descending=True, limit=50):
+    """
+    Reads matching events from one archive file.
+
+    Only `columns` plus the filtered columns are decoded, row groups whose
+    statistics cannot match are skipped without reading them, and groups are
+    visited in id order (newest first when `descending`) until `limit` rows
+    are found. Conditions are (column, op, value) with op one of
+    =, in, <, <=, >, >=.
+    """
+    if not available() or not os.path.exists(path):
+        return []
+    parquet = pq.ParquetFile(path)
+    metadata = parquet.metadata
+    positions = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+    needed = list(dict.fromkeys(list(columns) + [c for c, _, _ in conditions]))
+    expression = _expression(conditions)
+
+    groups = range(metadata.num_row_groups)
+    events = []
+    for i in (reversed(groups) if descending else groups):
+        if not _may_match(metadata.row_group(i), positions, conditions):
+            continue
+        table = parquet.read_row_group(i, columns=needed)
+        if expression is not None:
+            table = table.filter(expression)
+        rows = table.select(list(columns)).to_pylist()
+        events.extend(reversed(rows) if descending else rows)
+        if len(events) >= limit:
+            break
+    return events[:limit]
+
+
+def add_ts_us(path, convert):
+    """
+    Rewrites an archive written before ts_us existed, deriving the column
+    from `timestamp` with `convert`. Returns (min, max) of the new column.
+    """
+    if not available() or not os.path.exists(path):
+        return None, None
+    parquet = pq.ParquetFile(path)
+    if "ts_us" in parquet.schema_arrow.names:
+        return _column_bounds(parquet, "ts_us")
+    temp_path = path + ".tmp"
+    low = high = None
+    with pq.ParquetWriter(temp_path, SCHEMA, compression=ARCHIVE_COMPRESSION,
+                          use_dictionary=["process_name", "severity", "type"]) as writer:
+        for i in range(parquet.metadata.num_row_groups):
+            table = parquet.read_row_group(i)
+            values = [convert(t) for t in table.column("timestamp").to_pylist()]
+            table = table.append_column("ts_us", pa.array(values, type=pa.int64()))
+            writer.write_table(table.select(SCHEMA.names).cast(SCHEMA))
+            if values:
+                low = min(values) if low is None else min(low, min(values))
+                high = max(values) if high is None else max(high, max(values))
+    os.replace(temp_path, path)
+    return low, high
+
+
+def _column_bounds(parquet, column):
+    table = parquet.read(columns=[column])
+    bounds = pc.min_max(table.column(column))
+    return bounds["min"].as_py(), bounds["max"].as_py()
+
+
+def iter_rows(path, columns):
+    """Yields tuples of `columns` for every row in an archive file, one row group at a time."""
+    if not available() or not os.path.exists(path):
+        return
+    parquet = pq.ParquetFile(path)
+    for i in range(parquet.metadata.num_row_groups):
+        table = parquet.read_row_group(i, columns=list(columns))
+        yield from zip(*(table.column(name).to_pylist() for name in columns))
+
+
+def group_counts(path):
+    """(severity, type, process_name, count) rows for an archive file."""
+    if not available() or not os.path.exists(path):
+        return []
+    parquet = pq.ParquetFile(path)
+    counts = Counter()
+    for i in range(parquet.metadata.num_row_groups):
+        table = parquet.read_row_group(i, columns=["severity", "type", "process_name"])
+        counts.update(zip(*(table.column(name).to_pylist() for name in table.column_names)))
+    return [(severity, type, process_name, count) for (severity, type, process_name), count in counts.items()]
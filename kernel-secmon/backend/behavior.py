@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Behavioral detector tuning (overridable via environment)
+BEHAVIOR_WINDOW_SECONDS = int(os.getenv("BEHAVIOR_WINDOW_SECONDS", "300"))
+BEHAVIOR_BUCKET_SECONDS = int(os.getenv("BEHAVIOR_BUCKET_SECONDS", "10"))
+BEHAVIOR_THRESHOLD = int(os.getenv("BEHAVIOR_THRESHOLD", "4"))
+BEHAVIOR_MAX_TRACKED = int(os.getenv("BEHAVIOR_MAX_TRACKED", "100000"))
+
+
+class _WindowState:
+    __slots__ = ("buckets", "total", "fired", "label")
+
+    def __init__(self):
+        self.buckets = deque()  # [bucket_index, count], oldest first
+        self.total = 0
+        self.fired = False
+        self.label = None
+
+
+class SlidingWindowCounter:
+    """
+    Per-key event counts over a sliding window made of fixed-size time buckets.
+
+    Each `add` expires buckets that fell out of the window and bumps the
+    current one, so work per event is amortized O(1). Keys are kept in LRU
+    order and the least recently seen key is evicted past `max_keys`.
+    """
+
+    def __init__(self, window_seconds, bucket_seconds, max_keys=BEHAVIOR_MAX_TRACKED):
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = max(1, -(-window_seconds // bucket_seconds))
+        self.max_keys = max_keys
+        self._states = OrderedDict()
+
+    def add(self, key, now):
+        """Counts one event for `key` at time `now` and returns its state."""
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _WindowState()
+            if len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+
+        index = int(now // self.bucket_seconds)
+        buckets = state.buckets
+        if buckets and index < buckets[-1][0]:
+            # Late (out-of-order) event: count it in the newest bucket
+            index = buckets[-1][0]
+        oldest_allowed = index - self.num_buckets + 1
+        while buckets and buckets[0][0] < oldest_allowed:
+            state.total -= buckets.popleft()[1]
+
+        if buckets and buckets[-1][0] == index:
+            buckets[-1][1] += 1
+        else:
+            buckets.append([index, 1])
+        state.total += 1
+        return state
+
+    def __len__(self):
+        return len(self._states)
+
+
+class BehaviorDetector:
+    """
+    Streaming replacement for the periodic GROUP BY scan: flags a PID that
+    raises `threshold` non-INFO events within the window. Fires once per
+    crossing and re-arms after the PID's count drops back below threshold.
+    """
+
+    def __init__(self, window_seconds=BEHAVIOR_WINDOW_SECONDS, bucket_seconds=BEHAVIOR_BUCKET_SECONDS,
+                 threshold=BEHAVIOR_THRESHOLD, max_tracked=BEHAVIOR_MAX_TRACKED):
+        self.window_seconds = window_seconds
+        self.threshold = threshold
+        self.counter = SlidingWindowCounter(window_seconds, bucket_seconds, max_tracked)
+        self.fired = 0
+        self._lock = threading.Lock()
+
+    def observe(self, event, now=None):
+        """Updates counters for one event and returns any new findings."""
+        if event.severity == "INFO":
+            return []
+        now = time.time() if now is None else now
+
+        with self._lock:
+            state = self.counter.add(event.pid, now)
+            state.label = event.process_name
+            if state.total < self.threshold:
+                state.fired = False
+                return []
+            if state.fired:
+                return []
+            state.fired = True
+            self.fired += 1
+            count = state.total
+
+        minutes = self.window_seconds / 60
+        return [{
+            "timestamp": event.timestamp,
+            "type": "BEHAVIORAL_ANOMALY",
+            "pid": event.pid,
+            "process_name": event.process_name,
+            "details": f"Process {event.process_name} (PID {event.pid}) triggered {count} events in {minutes:g} minutes.",
+            "severity": "HIGH"
+        }]
+
+    def stats(self):
+        return {
+            "window_seconds": self.window_seconds,
+            "threshold": self.threshold,
+            "tracked_pids": len(self.counter),
+            "fired": self.fired,
+        }
@@ -0,0 +1,263 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from rules import RULES_PATH, RuleError
+
+# Memory bounds (overridable via environment)
+CORRELATION_MAX_LINEAGE = int(os.getenv("CORRELATION_MAX_LINEAGE", "200000"))
+CORRELATION_MAX_STATES = int(os.getenv("CORRELATION_MAX_STATES", "50000"))
+# Idle state is swept every this many events
+CORRELATION_SWEEP_EVERY = 1024
+
+
+class Chain:
+    """
+    An ordered kill chain. Each stage is a list of groups; a group is a set of
+    alternative event types, and a stage completes once every group matched.
+    {"any": [A, B]} is one group, {"all": [A, B]} is two.
+    """
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise RuleError(f"Chain must be an object, got {spec!r}")
+        self.id = spec.get("id")
+        if not self.id:
+            raise RuleError("Chain without id")
+        self.description = spec.get("description", "")
+        try:
+            self.window = float(spec.get("window_seconds", 600))
+        except (TypeError, ValueError):
+            raise RuleError(f"Chain {self.id}: window_seconds must be a number")
+        if not self.window > 0:
+            raise RuleError(f"Chain {self.id}: window_seconds must be positive")
+        stages = spec.get("stages", [])
+        if not isinstance(stages, list):
+            raise RuleError(f"Chain {self.id}: 'stages' must be a list")
+        self.stages = []
+        for stage in stages:
+            if not isinstance(stage, dict):
+                raise RuleError(f"Chain {self.id}: stage must be an object, got {stage!r}")
+            types = stage.get("all", stage.get("any"))
+            if types is None:
+                raise RuleError(f"Chain {self.id}: stage needs 'any' or 'all'")
+            if not isinstance(types, list) or not all(isinstance(t, str) for t in types):
+                raise RuleError(f"Chain {self.id}: stage types must be a list of strings")
+            if "all" in stage:
+                groups = [frozenset([t]) for t in types]
+            else:
+                groups = [frozenset(types)]
+            if not groups:
+                raise RuleError(f"Chain {self.id}: empty stage")
+            self.stages.append(groups)
+        if len(self.stages) < 2:
+            raise RuleError(f"Chain {self.id}: needs at least two stages")
+        self.types = frozenset(t for stage in self.stages for group in stage for t in group)
+
+
+def compile_chains(spec):
+    """Compiles the enabled chains of a parsed rules file; RuleError if anything is malformed."""
+    if not isinstance(spec, dict):
+        raise RuleError("Rules file must be an object with a 'chains' list")
+    specs = spec.get("chains", [])
+    if not isinstance(specs, list):
+        raise RuleError("'chains' must be a list")
+    chains = [Chain(c) for c in specs if not isinstance(c, dict) or c.get("enabled", True)]
+    ids = [c.id for c in chains]
+    if len(ids) != len(set(ids)):
+        raise RuleError("Duplicate chain ids")
+    return chains
+
+
+class _ChainState:
+    __slots__ = ("stage", "pending", "started", "last_seen", "pids", "steps", "name")
+
+    def __init__(self, chain, now):
+        self.stage = 0
+        self.pending = list(chain.stages[0])
+        self.started = now
+        self.last_seen = now
+        self.pids = set()
+        self.steps = []
+        self.name = None
+
+
+class CorrelationEngine:
+    """
+    Runs kill-chain state machines per process lineage over the ingest stream.
+
+    Each PID is mapped to a lineage root (the first known ancestor), so events
+    from children count toward their parent's chain. Per event the engine does
+    a constant number of dict operations: event types that no chain mentions
+    only update the lineage map. State that has been idle longer than its
+    chain's window is evicted, and both maps are LRU-bounded.
+    """
+
+    def __init__(self, chains=(), max_lineage=CORRELATION_MAX_LINEAGE, max_states=CORRELATION_MAX_STATES):
+        self.max_lineage = max_lineage
+        self.max_states = max_states
+        self.lineage = OrderedDict()   # pid -> lineage root
+        self.states = OrderedDict()    # (chain id, root) -> _ChainState, least recently touched first
+        self.incidents = 0
+        self.evicted = 0
+        self.last_error = None
+        self._seen = 0
+        self._lock = threading.Lock()
+        self.set_chains(chains)
+
+    @classmethod
+    def from_file(cls, path=RULES_PATH):
+        """A standalone engine; the API server instead loads chains as a RuleEngine section."""
+        engine = cls()
+        engine.reload(path)
+        return engine
+
+    def set_chains(self, chains):
+        by_type = {}
+        for chain in chains:
+            for event_type in chain.types:
+                by_type.setdefault(event_type, []).append(chain)
+        with self._lock:
+            self.chains = list(chains)
+            self.by_type = by_type
+            self.max_window = max((c.window for c in chains), default=0.0)
+            self.states.clear()
+
+    def compile(self, spec):
+        """RuleEngine section hook: the chains of a parsed rules file (RuleError if malformed)."""
+        return compile_chains(spec)
+
+    def apply(self, chains):
+        """RuleEngine section hook: swaps in chains returned by compile()."""
+        self.set_chains(chains)
+        self.last_error = None
+
+    def reload(self, path=RULES_PATH):
+        """Loads the `chains` section of the rules file. Keeps old chains on error."""
+        try:
+            with open(path, "r") as f:
+                spec = json.load(f)
+            chains = compile_chains(spec)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Chain reload failed ({path}), keeping the previous chains: {self.last_error}")
+            return False
+        self.set_chains(chains)
+        self.last_error = None
+        return True
+
+    def _root(self, pid, parent_pid):
+        lineage = self.lineage
+        root = lineage.get(pid)
+        if root is None:
+            # pid 0/1 are the kernel and init: every process descends from them
+            if parent_pid > 1:
+                root = lineage.get(parent_pid, parent_pid)
+            else:
+                root = pid
+            lineage[pid] = root
+            if len(lineage) > self.max_lineage:
+                lineage.popitem(last=False)
+        else:
+            lineage.move_to_end(pid)
+        return root
+
+    def observe(self, event, now=None):
+        """Advances chain state with one event and returns completed incidents."""
+        if event.pid <= 0:
+            return []
+        now = time.time() if now is None else now
+
+        with self._lock:
+            root = self._root(event.pid, event.parent_pid)
+            self._seen += 1
+            if self._seen % CORRELATION_SWEEP_EVERY == 0:
+                self._sweep(now)
+
+            chains = self.by_type.get(event.type)
+            if not chains:
+                return []
+
+            incidents = []
+            for chain in chains:
+                incident = self._advance(chain, root, event, now)
+                if incident:
+                    incidents.append(incident)
+            return incidents
+
+    def _advance(self, chain, root, event, now):
+        key = (chain.id, root)
+        state = self.states.get(key)
+        if state is not None and now - state.started > chain.window:
+            del self.states[key]
+            state = None
+
+        if state is None:
+            if not any(event.type in group for group in chain.stages[0]):
+                return None
+            state = _ChainState(chain, now)
+            self.states[key] = state
+            if len(self.states) > self.max_states:
+                self.states.popitem(last=False)
+                self.evicted += 1
+
+        for i, group in enumerate(state.pending):
+            if event.type in group:
+                del state.pending[i]
+                break
+        else:
+            return None
+
+        state.last_seen = now
+        self.states.move_to_end(key)
+        state.pids.add(event.pid)
+        state.steps.append(event.type)
+        if state.name is None:
+            state.name = event.process_name
+        if state.pending:
+            return None
+
+        state.stage += 1
+        if state.stage < len(chain.stages):
+            state.pending = list(chain.stages[state.stage])
+            return None
+
+        # Chain complete: report once and forget the state
+        del self.states[key]
+        self.incidents += 1
+        return {
+            "timestamp": event.timestamp,
+            "type": "CORRELATED_INCIDENT",
+            "severity": "HIGH",
+            "pid": root,
+            "process_name": state.name,
+            "chain": chain.id,
+            "pids": sorted(state.pids),
+            "details": (
+                f"Kill chain '{chain.id}' completed in lineage of PID {root} "
+                f"within {now - state.started:.0f}s: {' -> '.join(state.steps)}"
+            ),
+        }
+
+    def _sweep(self, now):
+        """Drops state idle for longer than the widest chain window."""
+        cutoff = now - self.max_window
+        states = self.states
+        while states:
+            key, state = next(iter(states.items()))
+            if state.last_seen >= cutoff:
+                break
+            del states[key]
+            self.evicted += 1
+
+    def stats(self):
+        return {
+            "chains": [c.id for c in self.chains],
+            "tracked_pids": len(self.lineage),
+            "active_states": len(self.states),
+            "incidents": self.incidents,
+            "evicted": self.evicted,
+            "last_error": self.last_error,
+        }
@@ -1,14 +1,54 @@
+import heapq
+import itertools
+import os
 import sqlite3
 import json
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timezone
 from models import KernelEvent
+from db_pool import reader, writer
+from timestamps import to_epoch_us, now_us
+import archive
 
-DB_PATH = "kernel_secmon.db"
+# Hot statements live at module level so every call hits the same
+# per-connection statement cache entry
+INSERT_EVENT_SQL = '''
+    INSERT INTO events (timestamp, pid, process_name, severity, type, details, parent_pid, ts_us)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+UPSERT_SUSPICIOUS_SQL = '''
+    INSERT OR REPLACE INTO suspicious_processes (pid, name, reason, last_seen)
+    VALUES (?, ?, ?, ?)
+'''
+UPSERT_STAT_SQL = '''
+    INSERT INTO event_stats (dimension, key, count) VALUES (?, ?, ?)
+    ON CONFLICT (dimension, key) DO UPDATE SET count = count + excluded.count
+'''
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
+INSERT_FTS_SQL = "INSERT INTO events_fts (rowid, details, process_name) VALUES (?, ?, ?)"
+# events_fts is contentless: removing a row needs the values it was indexed with
+DELETE_FTS_SQL = "INSERT INTO events_fts (events_fts, rowid, details, process_name) VALUES ('delete', ?, ?, ?)"
+UPSERT_PARTITION_SQL = '''
+    INSERT INTO event_partitions (day, table_name, min_id, max_id, rows, min_ts, max_ts, min_ts_us, max_ts_us)
+    VALUES (?, 'events', ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day) DO UPDATE SET
+        min_id = MIN(min_id, excluded.min_id),
+        max_id = MAX(max_id, excluded.max_id),
+        rows = rows + excluded.rows,
+        min_ts = MIN(min_ts, excluded.min_ts),
+        max_ts = MAX(max_ts, excluded.max_ts),
+        min_ts_us = MIN(min_ts_us, excluded.min_ts_us),
+        max_ts_us = MAX(max_ts_us, excluded.max_ts_us)
+'''
+
+# Dimensions kept in event_stats, mapped to the events column they count
+STAT_DIMENSIONS = {
+    "severity": "severity",
+    "type": "type",
+    "process": "process_name",
+}
+
+def _m1_baseline(cursor):
     # Events table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS events (
@@ -22,7 +62,11 @@ def init_db():
             parent_pid INTEGER DEFAULT 0
         )
     ''')
-    
+    # Older files (e.g. from populate_db.py) were created without parent_pid
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(events)")}
+    if "parent_pid" not in columns:
+        cursor.execute("ALTER TABLE events ADD COLUMN parent_pid INTEGER DEFAULT 0")
+
     # Suspicious processes table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS suspicious_processes (
@@ -32,114 +76,606 @@ def init_db():
             last_seen TEXT
         )
     ''')
-    
-    conn.commit()
-    conn.close()
 
-def save_event(event: KernelEvent):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def _m2_event_stats(cursor):
+    # Materialized counters, updated in the same transaction as each insert
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS event_stats (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID
+    ''')
+    _reconcile_stats(cursor)
+
+def _m3_event_indexes(cursor):
+    # Single-column indexes carry the rowid as a trailing key, so each also
+    # serves "WHERE col = ? ORDER BY id" keyset scans
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_pid ON events (pid)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_type ON events (type)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_severity ON events (severity)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_timestamp ON events (timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_process_name ON events (process_name)")
+
+def _m4_partitions(cursor):
+    # One row per ingest day (UTC). Rows of the current day live in the hot
+    # `events` table; retention.py later seals each past day into its own
+    # events_YYYYMMDD table. Ids only grow, so partitions are disjoint id ranges.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS event_partitions (
+            day TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            min_id INTEGER NOT NULL,
+            max_id INTEGER NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            min_ts TEXT,
+            max_ts TEXT,
+            sealed_at TEXT,
+            rolled_up_at TEXT
+        )
+    ''')
+    # Per-minute counts that replace raw INFO rows once they age out
     cursor.execute('''
-        INSERT INTO events (timestamp, pid, process_name, severity, type, details, parent_pid)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (event.timestamp, event.pid, event.process_name, event.severity, event.type, event.details, event.parent_pid))
-    
-    if event.type in ["HIDDEN_PROCESS", "PRIV_ESC"]:
+        CREATE TABLE IF NOT EXISTS event_rollups (
+            minute TEXT NOT NULL,
+            severity TEXT NOT NULL,
+            type TEXT NOT NULL,
+            process_name TEXT NOT NULL,
+            day TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (minute, severity, type, process_name)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_rollups_day ON event_rollups (day)")
+    # Existing rows have no ingest day: file them under today, which keeps
+    # them for the full retention period
+    cursor.execute("SELECT MIN(id), MAX(id), COUNT(*), MIN(timestamp), MAX(timestamp) FROM events")
+    min_id, max_id, rows, min_ts, max_ts = cursor.fetchone()
+    if rows:
         cursor.execute('''
-            INSERT OR REPLACE INTO suspicious_processes (pid, name, reason, last_seen)
-            VALUES (?, ?, ?, ?)
-        ''', (event.pid, event.process_name, event.type, event.timestamp))
-        
-    conn.commit()
-    conn.close()
+            INSERT INTO event_partitions (day, table_name, min_id, max_id, rows, min_ts, max_ts)
+            VALUES (?, 'events', ?, ?, ?, ?, ?)
+        ''', (_ingest_day(), min_id, max_id, rows, min_ts, max_ts))
+
+def _m5_archive(cursor):
+    # Partitions moved to Parquet by retention.py keep their catalog row
+    cursor.execute("ALTER TABLE event_partitions ADD COLUMN archive_path TEXT")
+    cursor.execute("ALTER TABLE event_partitions ADD COLUMN archived_at TEXT")
+
+def _m6_events_fts(cursor):
+    # Contentless full-text index keyed by event id: rows move between the
+    # hot table, partitions and the archive, but ids never change
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+            details, process_name, content = '', tokenize = 'unicode61'
+        )
+    ''')
+    # Process name hits weigh more than a mention in the details text
+    cursor.execute("INSERT INTO events_fts (events_fts, rank) VALUES ('rank', 'bm25(1.0, 2.0)')")
+    cursor.execute("SELECT table_name, archive_path FROM event_partitions WHERE table_name != 'events'")
+    sources = cursor.fetchall()
+    cursor.execute("INSERT INTO events_fts (rowid, details, process_name) SELECT id, details, process_name FROM events")
+    for table, path in sources:
+        if path:
+            cursor.executemany(INSERT_FTS_SQL, archive.iter_rows(path, ["id", "details", "process_name"]))
+        else:
+            cursor.execute(f"INSERT INTO events_fts (rowid, details, process_name) SELECT id, details, process_name FROM {table}")
+
+def _m7_ts_us(cursor):
+    # Normalized epoch microseconds next to the original timestamp string,
+    # indexed in place of the (lexicographic) timestamp index
+    cursor.connection.create_function("to_epoch_us", 1, to_epoch_us, deterministic=True)
+    migrated_at = now_us()
+    cursor.execute("SELECT day, table_name, archive_path, min_id, max_id FROM event_partitions")
+    partitions = cursor.fetchall()
+    tables = ["events"] + sorted({table for _, table, path, _, _ in partitions if table != "events" and not path})
+    for table in tables:
+        columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+        if "ts_us" not in columns:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN ts_us INTEGER")
+        cursor.execute(f"UPDATE {table} SET ts_us = COALESCE(to_epoch_us(timestamp), ?)", (migrated_at,))
+        cursor.execute(f"DROP INDEX IF EXISTS idx_{table}_timestamp")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_ts_us ON {table} (ts_us)")
+
+    cursor.execute("ALTER TABLE event_partitions ADD COLUMN min_ts_us INTEGER")
+    cursor.execute("ALTER TABLE event_partitions ADD COLUMN max_ts_us INTEGER")
+    for day, table, path, min_id, max_id in partitions:
+        if path:
+            bounds = archive.add_ts_us(path, lambda value: to_epoch_us(value, migrated_at))
+        else:
+            cursor.execute(f"SELECT MIN(ts_us), MAX(ts_us) FROM {table} WHERE id BETWEEN ? AND ?", (min_id, max_id))
+            bounds = cursor.fetchone()
+        cursor.execute("UPDATE event_partitions SET min_ts_us = ?, max_ts_us = ? WHERE day = ?", (*bounds, day))
+
+def _m8_ai_cache(cursor):
+    # Second tier of ai_cache.AnalysisCache
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ai_cache (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_expires_at ON ai_cache (expires_at)")
+
+# Ordered schema migrations. The applied version is stored in PRAGMA
+# user_version; each step runs in its own transaction. Append only.
+MIGRATIONS = [
+    (1, "baseline events and suspicious_processes tables", _m1_baseline),
+    (2, "materialized event_stats counters", _m2_event_stats),
+    (3, "secondary indexes on events", _m3_event_indexes),
+    (4, "daily event partitions and per-minute rollups", _m4_partitions),
+    (5, "cold archive columns on event_partitions", _m5_archive),
+    (6, "full-text index on details and process_name", _m6_events_fts),
+    (7, "epoch microsecond timestamps (ts_us)", _m7_ts_us),
+    (8, "AI analysis cache", _m8_ai_cache),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def migrate():
+    """Upgrades the database file in place to SCHEMA_VERSION."""
+    applied = []
+    with writer() as conn:
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, step in MIGRATIONS:
+        if version <= current:
+            continue
+        with writer() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            step(conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version}")
+        applied.append(version)
+        print(f"DB migration {version} applied: {description}")
+    return applied
+
+def init_db():
+    migrate()
+
+# Per-process aggregate behind load_process_summary(); {source} is a UNION ALL
+# of PROCESS_SUMMARY_SOURCE over the tables read.
+PROCESS_SUMMARY_SOURCE = "SELECT id, pid, process_name, parent_pid, severity FROM {table}"
+PROCESS_SUMMARY_SQL = '''
+    SELECT
+        pid,
+        process_name,
+        MAX(parent_pid) as parent_pid,
+        MAX(CASE WHEN severity = 'HIGH' THEN 1 ELSE 0 END) as is_suspicious,
+        COUNT(*) as event_count,
+        MAX(id) as last_event_id
+    FROM ({source})
+    GROUP BY pid
+    ORDER BY last_event_id
+'''
+
+def process_summary_sql(tables):
+    return PROCESS_SUMMARY_SQL.format(
+        source=" UNION ALL ".join(PROCESS_SUMMARY_SOURCE.format(table=table) for table in tables)
+    )
+
+# Columns /api/events can project; id is always returned as the page cursor
+EVENT_COLUMNS = ("id", "timestamp", "pid", "parent_pid", "process_name", "severity", "type", "details", "ts_us")
+
+# Filtered row by row, never through their index: an index range on ts_us
+# returns rows in time order, and the id-ordered page would then need a
+# sort of the whole range. Walking the id order (or another filter's
+# index) and stopping at the page size keeps a page O(limit) for the usual
+# recent-window query. The same goes for IN lists, which query_events
+# splits into one equality per value (see _split_alternatives) except for
+# a residual second list.
+_FILTER_ONLY = {"ts_us"}
+
+def _where_clause(conditions):
+    clauses, params = [], []
+    for column, op, value in conditions:
+        if column in _FILTER_ONLY or op == "in":
+            column = "+" + column  # unary plus: not usable as an index term
+        if op == "in":
+            clauses.append(f"{column} IN ({','.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            clauses.append(f"{column} {op} ?")
+            params.append(value)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def events_sql(table, columns, conditions, order="DESC"):
+    """One keyset page of `table` as (sql, params); the page size is the last parameter."""
+    where, params = _where_clause(conditions)
+    return f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY id {order} LIMIT ?", params
+
+def _split_alternatives(conditions):
+    """
+    Keyset variants of `conditions`: the first IN list becomes one equality
+    query per value, each an id-ordered index range, so a page costs
+    O(limit) per value instead of a sort of every match. Later IN lists
+    stay as row filters.
+    """
+    for i, (column, op, value) in enumerate(conditions):
+        if op == "in":
+            rest = conditions[:i] + conditions[i + 1:]
+            return [rest + [(column, "=", v)] for v in dict.fromkeys(value)]
+    return [conditions]
+
+# Hot queries and what their plans must (not) contain. check_query_plans()
+# fails if a schema change turns one of these into a table scan.
+HOT_QUERIES = {
+    "recent_events": (
+        "SELECT * FROM events ORDER BY id DESC LIMIT ?", (50,),
+        "SCAN events", "TEMP B-TREE"),
+    "event_by_id": (
+        "SELECT * FROM events WHERE id = ?", (1,),
+        "USING INTEGER PRIMARY KEY", None),
+    "events_by_pid": (
+        "SELECT * FROM events WHERE pid = ? AND id < ? ORDER BY id DESC LIMIT ?", (1, 100, 50),
+        "INDEX idx_events_pid", "TEMP B-TREE"),
+    "events_by_type": (
+        "SELECT * FROM events WHERE type = ? AND id < ? ORDER BY id DESC LIMIT ?", ("PRIV_ESC", 100, 50),
+        "INDEX idx_events_type", "TEMP B-TREE"),
+    "events_by_severity": (
+        "SELECT * FROM events WHERE severity = ? AND id < ? ORDER BY id DESC LIMIT ?", ("HIGH", 100, 50),
+        "INDEX idx_events_severity", "TEMP B-TREE"),
+    "events_by_process": (
+        "SELECT * FROM events WHERE process_name = ? AND id < ? ORDER BY id DESC LIMIT ?", ("bash", 100, 50),
+        "INDEX idx_events_process_name", "TEMP B-TREE"),
+    # The query /api/events?since=&until= sends
+    # One arm of a multi-value filter (?type=A,B&severity=HIGH,MEDIUM)
+    "events_by_types": (
+        events_sql("events", EVENT_COLUMNS, [("severity", "in", ["HIGH", "MEDIUM"]), ("id", "<", 100), ("type", "=", "PRIV_ESC")])[0],
+        ("HIGH", "MEDIUM", 100, "PRIV_ESC", 50),
+        "INDEX idx_events_type", "TEMP B-TREE"),
+    "events_since": (
+        events_sql("events", EVENT_COLUMNS, [("ts_us", ">=", 1767225600000000), ("ts_us", "<=", 1767312000000000)])[0],
+        (1767225600000000, 1767312000000000, 50),
+        "SCAN events", "TEMP B-TREE"),
+    "stats_counters": (
+        "SELECT count FROM event_stats WHERE dimension = ? AND key = ?", ("severity", "HIGH"),
+        "USING PRIMARY KEY", None),
+    # The hot-table form; the sort on last_event_id is inherent, a GROUP BY sort is not
+    "process_summary": (
+        process_summary_sql(["events"]), (),
+        "INDEX idx_events_pid", "TEMP B-TREE FOR GROUP BY"),
+}
+
+def explain(sql, params=()):
+    """Returns the EXPLAIN QUERY PLAN detail lines for a statement."""
+    with reader() as conn:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+def check_query_plans():
+    """
+    Runs EXPLAIN QUERY PLAN over HOT_QUERIES.
+    Returns a list of human-readable problems (empty when all plans are good).
+    """
+    problems = []
+    for name, (sql, params, must_contain, must_not_contain) in HOT_QUERIES.items():
+        plan = " | ".join(explain(sql, params))
+        if must_contain and must_contain not in plan:
+            problems.append(f"{name}: expected '{must_contain}' in plan: {plan}")
+        if must_not_contain and must_not_contain in plan:
+            problems.append(f"{name}: unexpected '{must_not_contain}' in plan: {plan}")
+    return problems
+
+def _reconcile_stats(cursor):
+    """
+    Backfills event_stats from the events table when the counters are empty
+    (new table on an existing database). One full scan, once.
+    """
+    cursor.execute("SELECT 1 FROM event_stats LIMIT 1")
+    if cursor.fetchone():
+        return
+    cursor.execute("INSERT INTO event_stats SELECT 'total', '', COUNT(*) FROM events")
+    for dimension, column in STAT_DIMENSIONS.items():
+        cursor.execute(f'''
+            INSERT INTO event_stats (dimension, key, count)
+            SELECT '{dimension}', COALESCE({column}, ''), COUNT(*) FROM events GROUP BY {column}
+        ''')
+
+def _stat_deltas(events):
+    """Aggregates counter increments for a batch of events."""
+    deltas = Counter()
+    deltas[("total", "")] = len(events)
+    for event in events:
+        deltas[("severity", event.severity)] += 1
+        deltas[("type", event.type)] += 1
+        deltas[("process", event.process_name)] += 1
+    return [(dimension, key, count) for (dimension, key), count in deltas.items()]
+
+def _ingest_day(now=None):
+    """Partition key: the UTC day an event was stored."""
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+
+SUSPICIOUS_EVENT_TYPES = ("HIDDEN_PROCESS", "PRIV_ESC")
+
+def _insert_event(cursor, event: KernelEvent, ts_us):
+    cursor.execute(INSERT_EVENT_SQL, (event.timestamp, event.pid, event.process_name, event.severity, event.type, event.details, event.parent_pid, ts_us))
+    event_id = cursor.lastrowid
+
+    if event.type in SUSPICIOUS_EVENT_TYPES:
+        cursor.execute(UPSERT_SUSPICIOUS_SQL, (event.pid, event.process_name, event.type, event.timestamp))
+
+    return event_id
+
+def clear_events():
+    """Deletes all events and resets the counters (demo / test helper)."""
+    with writer() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT table_name, archive_path FROM event_partitions WHERE table_name != 'events'")
+        for table, path in cursor.fetchall():
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            if path and os.path.exists(path):
+                os.remove(path)
+        cursor.execute("DELETE FROM event_partitions")
+        cursor.execute("INSERT INTO events_fts (events_fts) VALUES ('delete-all')")
+        cursor.execute("DELETE FROM event_rollups")
+        cursor.execute("DELETE FROM events")
+        cursor.execute("DELETE FROM event_stats")
+        _reconcile_stats(cursor)
+
+def save_event(event: KernelEvent):
+    return save_events([event])[0]
+
+def save_events(events):
+    """
+    Stores a batch of events in a single transaction, together with the
+    matching event_stats increments and full-text index entries.
+    Returns the row ids in the same order as the input.
+
+    Timestamps are normalized to epoch microseconds (ts_us) before taking
+    the write lock; unparseable ones fall back to the time of receipt.
+    """
+    received = now_us()
+    times = [to_epoch_us(event.timestamp, received) for event in events]
+    with writer() as conn:
+        cursor = conn.cursor()
+        ids = [_insert_event(cursor, event, ts_us) for event, ts_us in zip(events, times)]
+        cursor.executemany(UPSERT_STAT_SQL, _stat_deltas(events))
+        cursor.executemany(INSERT_FTS_SQL, [(event_id, event.details, event.process_name) for event_id, event in zip(ids, events)])
+        if ids:
+            timestamps = [event.timestamp for event in events]
+            cursor.execute(UPSERT_PARTITION_SQL, (
+                _ingest_day(), min(ids), max(ids), len(ids), min(timestamps), max(timestamps), min(times), max(times)
+            ))
+        return ids
 
 
 def get_recent_events(limit=50):
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM events ORDER BY id DESC LIMIT ?', (limit,))
-    rows = cursor.fetchall()
-    conn.close()
+    return query_events(limit=limit)
+
+def query_events(limit=50, before_id=None, after_id=None, pid=None, type=None, severity=None,
+                 process_name=None, since=None, until=None, fields=None):
+    """
+    Keyset-paginated event query, newest first.
+
+    Pass the smallest id of a page as `before_id` for the next (older) page, or
+    the largest as `after_id` for newer events. Each page is an index range
+    scan, so its cost does not grow with how deep the client has paged.
+    `type` and `severity` accept a list of alternatives (one index range per
+    value of the first list, merged in id order); `since`/`until`
+    bound the event time inclusively (ISO strings or epoch numbers, compared
+    as ts_us); `fields` selects columns from EVENT_COLUMNS.
+    """
+    columns = ["id"] + [f for f in (fields or EVENT_COLUMNS) if f != "id" and f in EVENT_COLUMNS]
+    # (column, op, value), shared by the SQL and the Parquet readers
+    conditions = []
+    for column, value in (("pid", pid), ("process_name", process_name)):
+        if value is not None:
+            conditions.append((column, "=", value))
+    for column, values in (("type", type), ("severity", severity)):
+        if values:
+            conditions.append((column, "in", list(values)))
+    since, until = to_epoch_us(since), to_epoch_us(until)
+    if since is not None:
+        conditions.append(("ts_us", ">=", since))
+    if until is not None:
+        conditions.append(("ts_us", "<=", until))
+    if before_id is not None:
+        conditions.append(("id", "<", before_id))
+    if after_id is not None:
+        conditions.append(("id", ">", after_id))
+
+    # Paging forward walks the index upwards from the cursor, then flips
+    order = "ASC" if after_id is not None and before_id is None else "DESC"
+
+    events = []
+    with reader() as conn:
+        conn.row_factory = sqlite3.Row
+        sources = _event_sources(conn, since, until, before_id, after_id)
+        if order == "ASC":
+            sources.reverse()
+        # Partitions are disjoint id ranges, so walking them in id order and
+        # stopping once the page is full keeps the keyset order exact
+        for table, path in sources:
+            remaining = limit - len(events)
+            if path:
+                events.extend(archive.read_events(path, columns, conditions, order == "DESC", remaining))
+            else:
+                pages = []
+                for alternative in _split_alternatives(conditions):
+                    sql, params = events_sql(table, columns, alternative, order)
+                    pages.append([dict(row) for row in conn.execute(sql, params + [remaining]).fetchall()])
+                merged = heapq.merge(*pages, key=lambda event: event["id"], reverse=order == "DESC")
+                events.extend(itertools.islice(merged, remaining))
+            if len(events) >= limit:
+                break
+    if order == "ASC":
+        events.reverse()
+    return events
+
+def _event_sources(conn, since_us=None, until_us=None, before_id=None, after_id=None):
+    """
+    Where events that may match live, newest first, as (table, archive_path)
+    pairs: the hot `events` table, then every sealed partition whose id and
+    timestamp ranges overlap the query. Archived partitions come with their
+    Parquet path instead of a table. The catalog has one row per retained
+    day, so this is cheap.
+    """
+    sources = [("events", None)]
+    rows = conn.execute('''
+        SELECT table_name, archive_path, min_id, max_id, min_ts_us, max_ts_us FROM event_partitions
+        WHERE sealed_at IS NOT NULL
+        ORDER BY max_id DESC
+    ''').fetchall()
+    for table, path, min_id, max_id, min_ts_us, max_ts_us in rows:
+        if before_id is not None and min_id >= before_id:
+            continue
+        if after_id is not None and max_id <= after_id:
+            continue
+        if since_us is not None and max_ts_us is not None and max_ts_us < since_us:
+            continue
+        if until_us is not None and min_ts_us is not None and min_ts_us > until_us:
+            continue
+        sources.append((table, path))
+    return sources
+
+def get_event(event_id):
+    """Looks up one event by id in the hot table, a sealed partition or the archive."""
+    events = query_events(limit=1, before_id=event_id + 1, after_id=event_id - 1)
+    return events[0] if events else None
+
+def get_events_by_ids(ids):
+    """Fetches events by id from wherever they live. Returns {id: event}."""
+    ids = sorted(set(ids))
+    found = {}
+    if not ids:
+        return found
+    with reader() as conn:
+        conn.row_factory = sqlite3.Row
+        for table, path in _event_sources(conn, before_id=ids[-1] + 1, after_id=ids[0] - 1):
+            wanted = [i for i in ids if i not in found]
+            if not wanted:
+                break
+            if path:
+                rows = archive.read_events(path, EVENT_COLUMNS, [("id", "in", wanted)], limit=len(wanted))
+            else:
+                rows = conn.execute(
+                    f"SELECT {', '.join(EVENT_COLUMNS)} FROM {table} WHERE id IN ({','.join('?' * len(wanted))})", wanted
+                ).fetchall()
+            for row in rows:
+                found[row["id"]] = dict(row)
+    return found
+
+# bm25 ranks only the newest matches: ranking every hit of a common term
+# (sys_call_table) costs O(matches), the newest-first window stays bounded
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "10000"))
+
+def _fts_query(text):
+    """Quotes every whitespace-separated term as an FTS5 phrase (implicit AND)."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def search_events(text, limit=50, offset=0):
+    """
+    Full-text search over details and process_name, best bm25 match first
+    among the newest SEARCH_RANK_WINDOW matches. Terms are matched as
+    phrases, so sys_call_table or 10.0.0.5 match as written rather than as
+    FTS5 syntax. The window bounds the ranking and sorting, but bm25 still
+    counts every row holding each term, so a page for a common term gets
+    slower as the index grows (scripts/bench_search.py).
+    """
+    query = _fts_query(text)
+    if not query:
+        return {"results": [], "offset": offset, "next_offset": None}
+    with reader() as conn:
+        hits = conn.execute('''
+            SELECT rowid, rank FROM (
+                SELECT rowid, rank FROM events_fts WHERE events_fts MATCH ?
+                ORDER BY rowid DESC LIMIT ?
+            )
+            ORDER BY rank LIMIT ? OFFSET ?
+        ''', (query, SEARCH_RANK_WINDOW, limit + 1, offset)).fetchall()
+    more = len(hits) > limit
+    hits = hits[:limit]
+    events = get_events_by_ids([event_id for event_id, _ in hits])
+    results = [
+        {**events[event_id], "score": round(-rank, 4)}
+        for event_id, rank in hits
+        if event_id in events
+    ]
+    return {"results": results, "offset": offset, "next_offset": offset + limit if more else None}
+
+def query_rollups(since=None, until=None, type=None, process_name=None, limit=1440):
+    """Per-minute (UTC) counts of rolled-up (INFO) events, newest minute first."""
+    where, params = [], []
+    for bound, op in ((since, ">="), (until, "<=")):
+        bound_us = to_epoch_us(bound)
+        if bound_us is not None:
+            where.append(f"minute {op} ?")
+            params.append(datetime.fromtimestamp(bound_us / 1e6, timezone.utc).strftime("%Y-%m-%dT%H:%M"))
+    if type is not None:
+        where.append("type = ?")
+        params.append(type)
+    if process_name is not None:
+        where.append("process_name = ?")
+        params.append(process_name)
+    sql = "SELECT minute, severity, type, process_name, count FROM event_rollups"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY minute DESC LIMIT ?"
+    params.append(limit)
+    with reader() as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(sql, params).fetchall()
+    return [dict(row) for row in rows]
+
+def get_partitions():
+    """The partition catalog, newest day first."""
+    with reader() as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM event_partitions ORDER BY day DESC").fetchall()
     return [dict(row) for row in rows]
 
 def get_stats():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT COUNT(*) FROM events')
-    total = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM events WHERE severity = "HIGH"')
-    high = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM events WHERE severity = "MEDIUM"')
-    medium = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT COUNT(*) FROM suspicious_processes')
-    suspicious_count = cursor.fetchone()[0]
-    
-    conn.close()
+    """Dashboard counters, read from event_stats instead of scanning events."""
+    with reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT dimension, key, count FROM event_stats
+            WHERE (dimension = 'total' AND key = '')
+               OR (dimension = 'severity' AND key IN ('HIGH', 'MEDIUM'))
+        ''')
+        counts = {(dimension, key): count for dimension, key, count in cursor.fetchall()}
+
+        cursor.execute('SELECT COUNT(*) FROM suspicious_processes')
+        suspicious_count = cursor.fetchone()[0]
+
     return {
-        "total_events": total,
-        "high_severity": high,
-        "medium_severity": medium,
+        "total_events": counts.get(("total", ""), 0),
+        "high_severity": counts.get(("severity", "HIGH"), 0),
+        "medium_severity": counts.get(("severity", "MEDIUM"), 0),
         "suspicious_processes": suspicious_count
     }
 
+def get_stats_breakdown(dimension, limit=20):
+    """Top keys for one counter dimension (severity, type or process)."""
+    with reader() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT key, count FROM event_stats
+            WHERE dimension = ?
+            ORDER BY count DESC
+            LIMIT ?
+        ''', (dimension, limit))
+        rows = cursor.fetchall()
+    return [{"key": key, "count": count} for key, count in rows]
+
 def get_suspicious_processes():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM suspicious_processes')
-    rows = cursor.fetchall()
-    conn.close()
+    with reader() as conn:
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM suspicious_processes')
+        rows = cursor.fetchall()
     return [dict(row) for row in rows]
 
-def get_process_tree():
+def load_process_summary():
     """
-    Returns all processes with their parent relationships for graph visualization.
+    Aggregates recent events per process, oldest activity first: the hot
+    table plus the newest sealed partition, so a restart just after midnight
+    still sees yesterday's processes.
+    Used once at startup to rebuild the in-memory process graph.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Get all unique processes from events
-    cursor.execute('''
-        SELECT DISTINCT 
-            pid, 
-            process_name,
-            parent_pid,
-            MAX(CASE WHEN severity = 'HIGH' THEN 1 ELSE 0 END) as is_suspicious,
-            COUNT(*) as event_count
-        FROM events
-        GROUP BY pid, process_name
-    ''')
-    
-    processes = cursor.fetchall()
-    
-    # Build nodes and links for force graph
-    nodes = []
-    links = []
-    
-    for pid, name, parent_pid, is_suspicious, event_count in processes:
-        nodes.append({
-            'id': str(pid),
-            'name': name,
-            'pid': pid,
-            'suspicious': bool(is_suspicious),
-            'event_count': event_count
-        })
-        
-        # Add link to parent if exists and parent is in our dataset
-        if parent_pid and parent_pid != 0:
-            links.append({
-                'source': str(parent_pid),
-                'target': str(pid)
-            })
-    
-    conn.close()
-    
-    return {
-        'nodes': nodes,
-        'links': links
-    }
+    with reader() as conn:
+        tables = [table for table, path in _event_sources(conn) if not path][:2]
+        cursor = conn.cursor()
+        cursor.execute(process_summary_sql(tables))
+        return cursor.fetchall()
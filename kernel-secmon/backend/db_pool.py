@@ -0,0 +1,123 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+DB_PATH = os.getenv("SECMON_DB_PATH", "kernel_secmon.db")
+
+# Connection tuning (overridable via environment)
+READER_POOL_SIZE = int(os.getenv("DB_READER_POOL_SIZE", "4"))
+SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")   # NORMAL is durable enough under WAL
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionPool:
+    """
+    Shared SQLite connections for the whole backend.
+
+    One dedicated writer connection serialized by a lock, plus a pool of
+    read-only reader connections. The database runs in WAL mode so readers
+    never block the writer and vice versa. Connections stay open for the life
+    of the process, so each one keeps its compiled statements in sqlite3's
+    per-connection statement cache; callers use module-level SQL constants so
+    the cache key is identical across calls.
+    """
+
+    def __init__(self, path=DB_PATH, readers=READER_POOL_SIZE):
+        self.path = path
+        self.max_readers = readers
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+
+    def _configure(self, conn):
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+
+    def _open_writer(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        self._configure(conn)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+        return conn
+
+    def _open_reader(self):
+        # The writer must exist first so the WAL and shared-memory files are in place
+        self._get_writer()
+        uri = f"file:{quote(os.path.abspath(self.path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        self._configure(conn)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _get_writer(self):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = self._open_writer()
+        return self._writer
+
+    @contextmanager
+    def writer(self):
+        """
+        Yields the writer connection inside a transaction.
+        Commits on success, rolls back if the block raises.
+        """
+        conn = self._get_writer()
+        with self._writer_lock:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _open_or_wait(self):
+        with self._reader_lock:
+            can_open = self._reader_count < self.max_readers
+            if can_open:
+                self._reader_count += 1
+        if not can_open:
+            return self._readers.get()
+        try:
+            return self._open_reader()
+        except Exception:
+            with self._reader_lock:
+                self._reader_count -= 1
+            raise
+
+    @contextmanager
+    def reader(self):
+        """Borrows a read-only connection from the pool."""
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._open_or_wait()
+        try:
+            yield conn
+        finally:
+            conn.row_factory = None
+            self._readers.put(conn)
+
+    def close(self):
+        """Closes every pooled connection (used on shutdown)."""
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self._reader_count = 0
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+pool = ConnectionPool()
+writer = pool.writer
+reader = pool.reader
@@ -0,0 +1,164 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+# Background enrichment tuning (overridable via environment)
+ENRICH_RPM = float(os.getenv("ENRICH_RPM", "30"))              # upstream AI calls per minute (0 = no AI stage)
+ENRICH_BURST = int(os.getenv("ENRICH_BURST", "5"))             # calls allowed back to back after an idle spell
+ENRICH_QUEUE_SIZE = int(os.getenv("ENRICH_QUEUE_SIZE", "1000"))
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "2"))        # 0 = enrichment disabled
+
+# Severities worth precomputing, highest priority first
+PRIORITIES = ("HIGH", "MEDIUM")
+
+
+class TokenBucket:
+    """Requests-per-minute budget; `acquire` waits for the next token. Loop-only."""
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            delay = (1 - self.tokens) / self.rate
+            self.waited_seconds += delay
+            await asyncio.sleep(delay)
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+
+class EnrichmentWorker:
+    """
+    Precomputes analyses for HIGH and MEDIUM events as they are stored, so
+    /api/analysis is usually a cache lookup by the time an analyst opens it.
+
+    `offer` is called from the ingest writer thread. Each priority has its
+    own deque; workers take HIGH before MEDIUM and the newest event first.
+    When the queue is full the oldest event of the lowest queued priority is
+    dropped, and a MEDIUM event is refused outright if only HIGH ones are
+    queued. `analyze(event_id, event, acquire)` awaits `acquire()` before
+    each upstream AI call, which spends one token of the RPM budget. Without
+    an AI stage (no model configured, or ENRICH_RPM=0) `acquire` is None and
+    only the threat intel and graph are precomputed.
+    """
+
+    def __init__(self, analyze, ai_enabled=True, rpm=ENRICH_RPM, burst=ENRICH_BURST,
+                 max_size=ENRICH_QUEUE_SIZE, workers=ENRICH_WORKERS):
+        self.analyze = analyze
+        self.enabled = workers > 0
+        self.ai_enabled = ai_enabled and rpm > 0
+        self.max_size = max_size
+        self.workers = workers
+        self.rpm = rpm
+        self.budget = TokenBucket(rpm, burst) if self.ai_enabled else None
+        self._queues = [deque() for _ in PRIORITIES]
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wakeup = None
+        self._tasks = []
+        self.counters = {"offered": 0, "enriched": 0, "skipped": 0, "failed": 0}
+        self.dropped = {severity: 0 for severity in PRIORITIES}
+
+    def start(self):
+        if not self.enabled:
+            print("Background enrichment disabled (ENRICH_WORKERS=0).")
+            return
+        if not self.ai_enabled:
+            print("Background enrichment without AI explanations (no AI model configured or ENRICH_RPM=0).")
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        with self._lock:
+            for queue in self._queues:
+                queue.clear()
+
+    def offer(self, pairs):
+        """Queues (event_id, event) pairs of enrichable severity. Thread-safe."""
+        if not self._tasks:
+            return
+        queued = False
+        with self._lock:
+            for event_id, event in pairs:
+                if event.severity not in PRIORITIES:
+                    continue
+                priority = PRIORITIES.index(event.severity)
+                self.counters["offered"] += 1
+                if sum(len(q) for q in self._queues) >= self.max_size:
+                    victim = next((p for p in reversed(range(priority, len(PRIORITIES))) if self._queues[p]), None)
+                    if victim is None:
+                        self.dropped[event.severity] += 1
+                        continue
+                    self._queues[victim].popleft()
+                    self.dropped[PRIORITIES[victim]] += 1
+                self._queues[priority].append((event_id, event))
+                queued = True
+        if queued:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _pop(self):
+        with self._lock:
+            for queue in self._queues:
+                if queue:
+                    return queue.pop()
+        return None
+
+    async def _run(self):
+        while True:
+            job = self._pop()
+            if job is None:
+                # Clear before re-checking so an offer in between is not missed
+                self._wakeup.clear()
+                job = self._pop()
+                if job is None:
+                    await self._wakeup.wait()
+                    continue
+            event_id, event = job
+            try:
+                enriched = await self.analyze(event_id, event, self.budget.acquire if self.budget else None)
+                self.counters["enriched" if enriched else "skipped"] += 1
+            except Exception as e:
+                self.counters["failed"] += 1
+                print(f"Enrichment failed for event {event_id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            depth = {severity: len(queue) for severity, queue in zip(PRIORITIES, self._queues)}
+        return {
+            "enabled": self.enabled,
+            "ai_enabled": self.ai_enabled,
+            "workers": len(self._tasks),
+            "queue_depth": depth,
+            "queue_capacity": self.max_size,
+            **self.counters,
+            "dropped": dict(self.dropped),
+            "rpm": self.rpm,
+            "tokens_available": round(self.budget.available(), 3) if self.budget else 0,
+            "budget_wait_seconds": round(self.budget.waited_seconds, 3) if self.budget else 0,
+        }
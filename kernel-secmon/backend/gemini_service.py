@@ -1,4 +1,8 @@
 import os
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
 from dotenv import load_dotenv
 import json
@@ -6,10 +10,20 @@ import json
 # Load environment variables
 load_dotenv()
 
+# Upstream call limits (overridable via environment)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", "8"))      # how long a caller waits
+GEMINI_REQUEST_TIMEOUT = float(os.getenv("GEMINI_REQUEST_TIMEOUT", "30"))       # HTTP timeout of the call itself
+# Alternative API endpoint (REST transport), e.g. a local stand-in server for tests
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+    if GEMINI_API_ENDPOINT:
+        genai.configure(api_key=GEMINI_API_KEY, transport="rest", client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+    else:
+        genai.configure(api_key=GEMINI_API_KEY)
     # Use the latest flash model
     model = genai.GenerativeModel('models/gemini-2.5-flash')
 else:
@@ -31,11 +45,12 @@ def generate_xai_explanation(event_type: str, process_name: str, pid: int, sever
     Returns:
         AI-generated explanation string
     """
-    if not model:
-        return _get_fallback_explanation(event_type, process_name, pid)
-    
-    try:
-        prompt = f"""You are a cybersecurity expert analyzing kernel-level security events in a rootkit detection system.
+    explanation = try_generate_xai_explanation(event_type, process_name, pid, severity, details)
+    return explanation or _get_fallback_explanation(event_type, process_name, pid)
+
+
+def _xai_prompt(event_type, process_name, pid, severity, details):
+    return f"""You are a cybersecurity expert analyzing kernel-level security events in a rootkit detection system.
 
 Analyze this security event and provide a detailed, technical explanation suitable for a security analyst:
 
@@ -52,8 +67,18 @@ Provide a concise but technical explanation (2-3 sentences) that:
 
 Keep the tone professional and technical. Focus on the "why" this is suspicious and "how" it works at a low level."""
 
-        # Set a shorter timeout for faster response
-        import time
+
+def try_generate_xai_explanation(event_type: str, process_name: str, pid: int, severity: str, details: str):
+    """
+    Same as generate_xai_explanation, but returns None instead of the
+    fallback text when Gemini is unavailable or fails, so callers can tell
+    a real answer (worth caching) from the canned one.
+    """
+    if not model:
+        return None
+    
+    try:
+        prompt = _xai_prompt(event_type, process_name, pid, severity, details)
         start_time = time.time()
         
         response = model.generate_content(
@@ -61,7 +86,8 @@ Keep the tone professional and technical. Focus on the "why" this is suspicious
             generation_config={
                 'temperature': 0.7,
                 'max_output_tokens': 200,
-            }
+            },
+            request_options={'timeout': GEMINI_REQUEST_TIMEOUT}
         )
         
         elapsed = time.time() - start_time
@@ -69,12 +95,161 @@ Keep the tone professional and technical. Focus on the "why" this is suspicious
         
         if response and response.text:
             return response.text.strip()
-        else:
-            return _get_fallback_explanation(event_type, process_name, pid)
+        return None
             
     except Exception as e:
         print(f"Gemini API Error: {e}")
-        return _get_fallback_explanation(event_type, process_name, pid)
+        return None
+
+
+# Blocking SDK calls run here, never on the event loop. The pool size is the
+# global cap on concurrent upstream requests; extra calls queue.
+_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini")
+_inflight = {}  # coalescing key -> future of the shared upstream call
+_stats_lock = threading.Lock()
+_stats = {"upstream_calls": 0, "coalesced": 0, "timeouts": 0, "failures": 0}
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _call(event_type, process_name, pid, severity, details, on_result):
+    """Runs on the executor: the upstream call plus its (blocking) result hook."""
+    _count("upstream_calls")
+    explanation = try_generate_xai_explanation(event_type, process_name, pid, severity, details)
+    if explanation is None:
+        _count("failures")
+    elif on_result:
+        on_result(explanation)
+    return explanation
+
+
+async def generate_xai_explanation_async(event_type: str, process_name: str, pid: int, severity: str, details: str,
+                                         key=None, on_result=None):
+    """
+    Non-blocking try_generate_xai_explanation.
+
+    Concurrent calls with the same `key` share one upstream request. Each
+    caller waits at most GEMINI_DEADLINE_SECONDS and then gets None; the
+    shared request keeps running (up to GEMINI_REQUEST_TIMEOUT) and hands a
+    late answer to `on_result` (called on the worker thread), e.g. to fill a
+    cache for the next caller.
+    """
+    if not model:
+        return None
+    key = key or (event_type, process_name, pid, severity, details)
+    task = _inflight.get(key)
+    if task is None:
+        loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(loop.run_in_executor(
+            _executor, _call, event_type, process_name, pid, severity, details, on_result
+        ))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    else:
+        _count("coalesced")
+    try:
+        # shield: one caller giving up must not cancel the shared request
+        return await asyncio.wait_for(asyncio.shield(task), GEMINI_DEADLINE_SECONDS)
+    except asyncio.TimeoutError:
+        _count("timeouts")
+        return None
+
+
+def _stream_call(event_type, process_name, pid, severity, details, emit, on_result):
+    """Runs on the executor: a streamed upstream call, handing each text chunk to `emit`."""
+    _count("upstream_calls")
+    parts = []
+    try:
+        start_time = time.time()
+        response = model.generate_content(
+            _xai_prompt(event_type, process_name, pid, severity, details),
+            generation_config={
+                'temperature': 0.7,
+                'max_output_tokens': 200,
+            },
+            request_options={'timeout': GEMINI_REQUEST_TIMEOUT},
+            stream=True
+        )
+        for chunk in response:
+            if chunk.text:
+                parts.append(chunk.text)
+                emit(chunk.text)
+        print(f"Gemini API took {time.time() - start_time:.2f}s for streamed XAI explanation")
+    except Exception as e:
+        print(f"Gemini API Error: {e}")
+    explanation = "".join(parts).strip() or None
+    if explanation is None:
+        _count("failures")
+    elif on_result:
+        on_result(explanation)
+    return explanation
+
+
+async def stream_xai_explanation_async(event_type: str, process_name: str, pid: int, severity: str, details: str,
+                                       key=None, on_result=None):
+    """
+    Streaming generate_xai_explanation_async: yields text chunks as Gemini
+    produces them, under the same concurrency cap. The first chunk must
+    arrive within GEMINI_DEADLINE_SECONDS. Yields nothing when Gemini is
+    unavailable or fails. If a call for `key` is already running, its answer
+    is awaited and yielded whole; a streamed call can likewise be joined by
+    non-streaming callers. Abandoning the stream does not stop the call.
+    """
+    if not model:
+        return
+    key = key or (event_type, process_name, pid, severity, details)
+    task = _inflight.get(key)
+    if task is not None:
+        _count("coalesced")
+        try:
+            explanation = await asyncio.wait_for(asyncio.shield(task), GEMINI_DEADLINE_SECONDS)
+        except asyncio.TimeoutError:
+            _count("timeouts")
+            return
+        if explanation:
+            yield explanation
+        return
+
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue()
+    emit = lambda text: loop.call_soon_threadsafe(chunks.put_nowait, text)
+    task = asyncio.ensure_future(loop.run_in_executor(
+        _executor, _stream_call, event_type, process_name, pid, severity, details, emit, on_result
+    ))
+    _inflight[key] = task
+    # None marks the end; queued after any chunk the worker emitted before finishing
+    task.add_done_callback(lambda _: (_inflight.pop(key, None), chunks.put_nowait(None)))
+
+    timeout = GEMINI_DEADLINE_SECONDS
+    while True:
+        try:
+            text = await asyncio.wait_for(chunks.get(), timeout)
+        except asyncio.TimeoutError:
+            _count("timeouts")
+            return
+        if text is None:
+            return
+        yield text
+        timeout = GEMINI_REQUEST_TIMEOUT
+
+
+def get_ai_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    return {
+        **stats,
+        "in_flight": len(_inflight),
+        "max_concurrency": GEMINI_MAX_CONCURRENCY,
+        "deadline_seconds": GEMINI_DEADLINE_SECONDS,
+        "model_configured": model is not None,
+    }
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
 
 
 def generate_knowledge_graph_data(event_type: str, process_name: str, pid: int, details: str) -> dict:
@@ -0,0 +1,173 @@
+import re
+import socket
+
+_OCTET = r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)"
+
+# One pattern, one pass. The shared lookbehind rejects positions inside a
+# word or number before any alternative is tried; alternatives are then
+# tried left to right, the more specific shapes first. IPv6 candidates are
+# loose here and validated by inet_pton afterwards.
+_INDICATOR_RE = re.compile(r"""
+(?<![\w.])(?=[0-9a-f:\[/ups])(?:
+    (?P<hex>0x[0-9a-f]{8,16}\b)
+  | uid\b[^\d\n]{0,32}?(?P<uid_from>\d+)\s*(?:->|→|to)\s*(?P<uid_to>\d+)
+  | (?:port|dport|sport)\b\s*[=:]?\s*(?P<port>\d{1,5})\b
+  | (?<!:)\[?(?P<v6>(?:[0-9a-f]{0,4}:){2,7}(?:(?:\d{1,3}\.){3}\d{1,3}|[0-9a-f]{1,4})?)(?:%\w+)?
+        (?:\]:(?P<v6port>\d{1,5})\b)?
+  | (?P<v4>OCTET(?:\.OCTET){3})(?!\.?\d)(?::(?P<v4port>\d{1,5})\b)?
+  | (?<![:/~])(?P<path>/(?:[\w.+@-]+/)*[\w.+@-]+/?)
+)""".replace("OCTET", _OCTET), re.IGNORECASE | re.VERBOSE)
+
+# Special-purpose IPv4 ranges by first octet: (network, prefix length, class)
+_V4_SPECIAL = [
+    ("0.0.0.0", 8, "unspecified"),
+    ("10.0.0.0", 8, "private"),
+    ("100.64.0.0", 10, "cgnat"),
+    ("127.0.0.0", 8, "loopback"),
+    ("169.254.0.0", 16, "link_local"),
+    ("172.16.0.0", 12, "private"),
+    ("192.0.0.0", 24, "reserved"),
+    ("192.0.2.0", 24, "documentation"),
+    ("192.168.0.0", 16, "private"),
+    ("198.18.0.0", 15, "benchmark"),
+    ("198.51.100.0", 24, "documentation"),
+    ("203.0.113.0", 24, "documentation"),
+    ("255.255.255.255", 32, "broadcast"),
+    ("224.0.0.0", 4, "multicast"),
+    ("240.0.0.0", 4, "reserved"),
+]
+
+
+def _index_by_octet(ranges):
+    """Buckets the ranges by every first octet they cover, so a lookup scans one short list."""
+    buckets = [[] for _ in range(256)]
+    for network, prefix, kind in ranges:
+        start = int.from_bytes(socket.inet_aton(network), "big")
+        shift = 32 - prefix
+        end = start | ((1 << shift) - 1)
+        for octet in range(start >> 24, (end >> 24) + 1):
+            buckets[octet].append((shift, start >> shift, kind))
+    return buckets
+
+
+_V4_BY_OCTET = _index_by_octet(_V4_SPECIAL)
+# Special-purpose IPv6 ranges, most specific first: (network, prefix length, class).
+# Global unicast is 2000::/3; anything else left over is reserved.
+_V6_RANGES = [
+    (0, 128, "unspecified"),
+    (1, 128, "loopback"),
+    (0x20010DB8 << 96, 32, "documentation"),
+    (0x2001 << 112, 23, "reserved"),
+    (0xFE80 << 112, 10, "link_local"),
+    (0xFF00 << 112, 8, "multicast"),
+    (0xFC00 << 112, 7, "private"),
+]
+_V6_SPECIAL = [(128 - length, network >> (128 - length), kind) for network, length, kind in _V6_RANGES]
+
+# x86-64 virtual address regions (kernel half starts at 0xffff800000000000)
+_KERNEL_REGIONS = [
+    (0xFFFFFFFFA0000000, "module"),
+    (0xFFFFFFFF80000000, "kernel_text"),
+    (0xFFFF800000000000, "kernel"),
+]
+
+
+def classify_ipv4(value):
+    """Address class of an IPv4 address given as an int: 'global' or a special-purpose range."""
+    for shift, network, kind in _V4_BY_OCTET[value >> 24]:
+        if value >> shift == network:
+            return kind
+    return "global"
+
+
+def classify_ipv6(value):
+    """Address class of an IPv6 address given as an int: 'global' or a special-purpose range."""
+    for shift, network, kind in _V6_SPECIAL:
+        if value >> shift == network:
+            return kind
+    return "global" if value >> 125 == 1 else "reserved"
+
+
+def kernel_region(value):
+    for start, region in _KERNEL_REGIONS:
+        if value >= start:
+            return region
+    return None
+
+
+def extract_indicators(details):
+    """
+    Extracts indicators from event details in one regex pass:
+
+    - ips: {"ip", "version", "class", "port"} for IPv4 and IPv6 addresses
+      (IPv4-mapped IPv6 is reported as IPv4), classified by range (global, private, cgnat, loopback, link_local,
+      multicast, documentation, ...)
+    - ports: ports seen after an address or as "port N" / "dport=N"
+    - kernel_addresses: {"address", "region"} for hex values in the
+      kernel half of the x86-64 address space
+    - paths: absolute file paths
+    - uid_transitions: {"from", "to"} for "UID ... 1000 to 0" / "1000 -> 0"
+
+    Every list is in order of appearance without duplicates.
+    """
+    ips, ports, kernel_addresses, paths, uids = {}, {}, {}, {}, {}
+    if not details:
+        return {"ips": [], "ports": [], "kernel_addresses": [], "paths": [], "uid_transitions": []}
+
+    for match in _INDICATOR_RE.finditer(details):
+        kind = match.lastgroup
+        if kind == "v4" or kind == "v4port":
+            text = match.group("v4")
+            value = int.from_bytes(socket.inet_aton(text), "big")
+            port = _port(match.group("v4port"), ports)
+            ips.setdefault(text, {"ip": text, "version": 4, "class": classify_ipv4(value), "port": port})
+        elif kind == "v6" or kind == "v6port":
+            try:
+                packed = socket.inet_pton(socket.AF_INET6, match.group("v6"))
+            except OSError:
+                continue
+            value = int.from_bytes(packed, "big")
+            port = _port(match.group("v6port"), ports)
+            if value >> 32 == 0xFFFF:
+                text = socket.inet_ntoa(packed[12:])
+                ips.setdefault(text, {"ip": text, "version": 4, "class": classify_ipv4(value & 0xFFFFFFFF), "port": port})
+            else:
+                text = socket.inet_ntop(socket.AF_INET6, packed)
+                ips.setdefault(text, {"ip": text, "version": 6, "class": classify_ipv6(value), "port": port})
+        elif kind == "hex":
+            text = match.group("hex").lower()
+            region = kernel_region(int(text, 16))
+            if region:
+                kernel_addresses.setdefault(text, {"address": text, "region": region})
+        elif kind == "port":
+            _port(match.group("port"), ports)
+        elif kind == "path":
+            path = match.group("path").rstrip(".")
+            if len(path) > 1:
+                paths.setdefault(path, path)
+        elif kind == "uid_to":
+            transition = (int(match.group("uid_from")), int(match.group("uid_to")))
+            uids.setdefault(transition, {"from": transition[0], "to": transition[1]})
+
+    return {
+        "ips": list(ips.values()),
+        "ports": list(ports),
+        "kernel_addresses": list(kernel_addresses.values()),
+        "paths": list(paths),
+        "uid_transitions": list(uids.values()),
+    }
+
+
+def _port(text, seen):
+    if text is None:
+        return None
+    port = int(text)
+    if port > 65535:
+        return None
+    seen.setdefault(port, None)
+    return port
+
+
+def public_ips(details):
+    """Globally routable IPv4/IPv6 addresses in event details, in order, without duplicates."""
+    return [ip["ip"] for ip in extract_indicators(details)["ips"] if ip["class"] == "global"]
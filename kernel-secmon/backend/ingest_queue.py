@@ -0,0 +1,197 @@
+import asyncio
+import os
+import time
+import traceback
+
+# Write-behind tuning (overridable via environment)
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_FLUSH_MS = int(os.getenv("INGEST_FLUSH_MS", "50"))
+
+
+def _report(message):
+    """Prints a failure together with the traceback of the exception being handled."""
+    print(f"{message}\n{traceback.format_exc().rstrip()}")
+
+
+class IngestPipeline:
+    """
+    Bounded in-process ingest queue drained by a single background writer.
+
+    The writer group-commits every `batch_size` events or every `flush_ms`
+    milliseconds, whichever comes first. Storage and analysis run in a worker
+    thread so SQLite never blocks the event loop; the resulting messages are
+    then handed to `publish` on the loop. If a group commit fails, its events
+    are stored one by one so a single bad event only loses itself.
+    """
+
+    def __init__(self, store, process, publish,
+                 max_size=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE, flush_ms=INGEST_FLUSH_MS):
+        self.store = store        # callable(list[event]) -> list[id], one transaction
+        self.process = process    # callable(event) -> list[message]
+        self.publish = publish    # async callable(message)
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.queue = None
+        self._task = None
+        self._collecting = []   # batch being gathered by the writer, not yet flushing
+        self._flushing = None   # in-flight flush task
+
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.failed = 0
+        self.process_errors = 0
+        self.split_batches = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.last_commit_lag_ms = 0.0
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the writer, lets an in-flight group commit finish, then flushes
+        the batch being gathered and whatever is still queued.
+        """
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushing:
+            await self._flushing
+            self._flushing = None
+        pending, self._collecting = self._collecting, []
+        if self.queue:
+            while not self.queue.empty():
+                pending.append(self.queue.get_nowait())
+        if pending:
+            await self._flush(pending)
+
+    def capacity(self):
+        """Free slots in the queue."""
+        return self.max_size - self.queue.qsize()
+
+    def enqueue(self, event):
+        """Queues an event. Returns False when the queue is full."""
+        return self.enqueue_many([event])
+
+    def enqueue_many(self, events):
+        """Queues all events, or none of them when they do not all fit. Returns whether they were queued."""
+        if len(events) > self.capacity():
+            self.rejected += len(events)
+            return False
+        now = time.perf_counter()
+        for event in events:
+            self.queue.put_nowait((event, now))
+        self.enqueued += len(events)
+        return True
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Kept on self so stop() can flush it if cancelled while gathering
+            batch = self._collecting = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._collecting = []
+            # shield: cancelling the writer (stop) must not abandon a commit halfway
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch):
+        events = [event for event, _ in batch]
+        start = time.perf_counter()
+        try:
+            stored, messages = await asyncio.to_thread(self._store_and_process, events)
+        except Exception:
+            self.failed += len(events)
+            _report(f"Ingest flush failed ({len(events)} events)")
+            return
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.batches += 1
+        self.flushed += stored
+        self.failed += len(events) - stored
+        self.last_batch_size = len(events)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        self.last_commit_lag_ms = (time.perf_counter() - batch[0][1]) * 1000
+
+        for message in messages:
+            try:
+                await self.publish(message)
+            except Exception:
+                _report("Ingest publish failed")
+
+    def _store_and_process(self, events):
+        """Runs in a worker thread. Returns (number of events stored, messages to publish)."""
+        try:
+            self.store(events)
+            stored = events
+        except Exception:
+            if len(events) == 1:
+                _report(f"Ingest store failed for one event: {events[0]!r}")
+                return 0, []
+            # Retry one by one so the bad event does not take the batch down with it
+            _report(f"Group commit of {len(events)} events failed, storing them one by one")
+            self.split_batches += 1
+            stored = []
+            for event in events:
+                try:
+                    self.store([event])
+                    stored.append(event)
+                except Exception:
+                    _report(f"Ingest store failed for one event: {event!r}")
+
+        messages = []
+        for event in stored:
+            try:
+                messages.extend(self.process(event))
+            except Exception:
+                self.process_errors += 1
+                _report(f"Analysis failed for a stored {getattr(event, 'type', '?')} event")
+        return len(stored), messages
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_capacity": self.max_size,
+            "batch_size": self.batch_size,
+            "flush_interval_ms": self.flush_interval * 1000,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "split_batches": self.split_batches,
+            "process_errors": self.process_errors,
+            "batches": self.batches,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.batches, 3) if self.batches else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "last_commit_lag_ms": round(self.last_commit_lag_ms, 3),
+        }
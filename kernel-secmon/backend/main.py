@@ -1,23 +1,46 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Deque
-from collections import deque
-import random
+from pydantic import ValidationError
 from models import KernelEvent
-from database import init_db, save_event, get_recent_events, get_stats, get_suspicious_processes, get_process_tree
-from analyzer import analyze_event, check_behavioral_patterns, get_event_analysis
+from database import (init_db, save_events, query_events, EVENT_COLUMNS, get_stats, get_stats_breakdown,
+                      get_suspicious_processes, load_process_summary, STAT_DIMENSIONS, query_rollups,
+                      get_partitions, search_events)
+from analyzer import (analyze_event, check_behavioral_patterns, correlate_event, get_event_analysis_async, precompute_event_analysis,
+                      stream_event_analysis,
+                      behavior_detector, rule_engine, correlation_engine)
 from response import execute_mitigation
+from ingest_queue import IngestPipeline
+from enrichment import EnrichmentWorker
+from ai_cache import analysis_cache
+from threat_intel import threat_intel_cache
+from reputation import reputation_engine
+import gemini_service
+from db_pool import pool
+import retention
+from process_graph import process_graph
+from timestamps import to_epoch_us
+from ws_manager import ConnectionManager, WS_BATCH_MS, WS_BATCH_MAX
 import json
+import asyncio
 
 app = FastAPI(title="Kernel SecMon API")
 
 # Security
 API_KEY = "SEC_MON_SECRET_KEY_2026"
 
+# How often process tree deltas are pushed over /ws/feed
+PROCESS_TREE_PUSH_SECONDS = 1.0
+
+# Upper bound on events accepted by /api/ingest/batch in one request
+MAX_BATCH_SIZE = 5000
+
 # Initialize DB
 init_db()
 
+# Rebuild the in-memory process graph from history
+process_graph.rebuild(load_process_summary())
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -25,24 +48,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# WebSocket Connection Manager
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
-
+# WebSocket Connection Manager (per-client bounded queues)
 manager = ConnectionManager()
 
 @app.get("/")
@@ -50,75 +59,406 @@ async def root():
     return {"status": "Kernel Monitor Active", "version": "1.0.0"}
 
 @app.get("/api/events")
-async def fetch_events(limit: int = 50):
-    return get_recent_events(limit)
+async def fetch_events(limit: int = 50, before_id: int = None, after_id: int = None, pid: int = None,
+                       type: str = None, severity: str = None, process_name: str = None,
+                       since: str = None, until: str = None, fields: str = None):
+    """
+    Events, newest first. Page with before_id=<smallest id seen> (older) or
+    after_id=<largest id seen> (newer). type and severity take comma-separated
+    alternatives; since/until bound the event time (ISO 8601 or epoch
+    s/ms/us); fields is a comma-separated column list (id is always included).
+    """
+    for name, value in (("since", since), ("until", until)):
+        if value is not None and to_epoch_us(value) is None:
+            return JSONResponse(status_code=400, content={"error": f"{name} must be an ISO 8601 timestamp or epoch number"})
+    columns = None
+    if fields:
+        columns = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = sorted(set(columns) - set(EVENT_COLUMNS))
+        if unknown:
+            return JSONResponse(status_code=400, content={"error": f"Unknown fields {unknown}; allowed: {list(EVENT_COLUMNS)}"})
+    return await asyncio.to_thread(
+        query_events,
+        limit=min(max(limit, 1), 1000),
+        before_id=before_id,
+        after_id=after_id,
+        pid=pid,
+        type=[t.strip().upper() for t in type.split(",") if t.strip()] if type else None,
+        severity=[s.strip().upper() for s in severity.split(",") if s.strip()] if severity else None,
+        process_name=process_name,
+        since=since,
+        until=until,
+        fields=columns
+    )
+
+@app.get("/api/search")
+async def search(q: str, limit: int = 50, offset: int = 0):
+    """
+    Ranked full-text search over event details and process names.
+    Page with offset=<next_offset> from the previous response.
+    """
+    return await asyncio.to_thread(search_events, q, min(max(limit, 1), 200), min(max(offset, 0), 10000))
+
+@app.get("/api/events/rollups")
+async def fetch_event_rollups(since: str = None, until: str = None, type: str = None,
+                              process_name: str = None, limit: int = 1440):
+    """Per-minute counts for INFO events whose raw rows were rolled up."""
+    return await asyncio.to_thread(query_rollups, since, until, type.upper() if type else None, process_name,
+                                   min(max(limit, 1), 10000))
 
 @app.get("/api/stats")
 async def fetch_stats():
-    return get_stats()
+    return await asyncio.to_thread(get_stats)
+
+@app.get("/api/stats/breakdown")
+async def fetch_stats_breakdown(by: str = "type", limit: int = 20):
+    """Per-severity, per-type or per-process event counts, largest first."""
+    if by not in STAT_DIMENSIONS:
+        return JSONResponse(status_code=400, content={"error": f"by must be one of {sorted(STAT_DIMENSIONS)}"})
+    return {"by": by, "counts": await asyncio.to_thread(get_stats_breakdown, by, min(max(limit, 1), 1000))}
 
 @app.get("/api/analysis/{event_id}")
 async def fetch_event_analysis(event_id: int):
-    analysis = get_event_analysis(event_id)
+    analysis = await get_event_analysis_async(event_id)
     if not analysis:
         return JSONResponse(status_code=404, content={"error": "Event not found"})
     return analysis
 
+@app.get("/api/analysis/{event_id}/stream")
+async def stream_event_analysis_sse(event_id: int):
+    """
+    Server-Sent Events version of /api/analysis: one SSE event per section
+    (explanation tokens, explanation, graph, threat_intel) as soon as it is
+    ready, then "done"; an unknown event gets a single "error".
+    """
+    async def sse():
+        async for section, data in stream_event_analysis(event_id):
+            yield f"event: {section}\ndata: {json.dumps(data)}\n\n"
+
+    return StreamingResponse(sse(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/api/cache/stats")
+async def fetch_cache_stats():
+    """Hit rates and sizes of the AI analysis cache."""
+    return await asyncio.to_thread(analysis_cache.stats)
+
+@app.get("/api/threat-intel/stats")
+async def fetch_threat_intel_stats():
+    """Threat-intel cache hits per tier, negative hits, API calls and refreshes."""
+    return threat_intel_cache.stats()
+
+@app.get("/api/reputation/stats")
+async def fetch_reputation_stats():
+    """Offline reputation feeds: entries per feed, prefix lengths, lookups and hits."""
+    return reputation_engine.stats()
+
+@app.post("/api/reputation/reload")
+async def reload_reputation(api_key: str = None):
+    if api_key != API_KEY:
+        return JSONResponse(status_code=401, content={"status": "unauthorized"})
+    if not await asyncio.to_thread(reputation_engine.reload):
+        return JSONResponse(status_code=400, content={"status": "invalid", "error": reputation_engine.last_error})
+    return {"status": "reloaded", "entries": reputation_engine.table.entries, "feeds": len(reputation_engine.feeds)}
+
+@app.get("/api/ai/stats")
+async def fetch_ai_stats():
+    """Upstream AI call counters: calls, coalesced waiters, timeouts, in flight."""
+    return gemini_service.get_ai_stats()
+
+@app.get("/api/enrichment/stats")
+async def fetch_enrichment_stats():
+    """Background enrichment queue depth, drops per priority and RPM budget."""
+    return enrichment_worker.stats()
+
 @app.get("/api/processes/suspicious")
 async def fetch_suspicious_procs():
-    return get_suspicious_processes()
+    return await asyncio.to_thread(get_suspicious_processes)
 
 @app.get("/api/processes/tree")
-async def fetch_process_tree():
-    """Returns process tree data for force graph visualization."""
-    return get_process_tree()
+async def fetch_process_tree(request: Request, since: int = None):
+    """
+    Returns process tree data for force graph visualization.
 
+    With ?since=<version> only nodes and links changed after that version are
+    returned, plus removed node ids. The ETag is the current version, so
+    If-None-Match (or since == current version) yields 304 Not Modified.
+    """
+    etag = f'"{process_graph.version}"'
+    if request.headers.get("if-none-match") == etag or since == process_graph.version:
+        return Response(status_code=304, headers={"ETag": etag})
 
-@app.post("/api/ingest")
-async def ingest_event(event: KernelEvent, api_key: str = None):
-    # Simple Hash-based or string comparison
-    if api_key != API_KEY:
-        return JSONResponse(status_code=401, content={"status": "unauthorized"})
-    # Store event in DB
-    save_event(event)
+    body = process_graph.delta(since) if since is not None else process_graph.snapshot()
+    return JSONResponse(content=body, headers={"ETag": etag})
+
+
+def process_event(event: KernelEvent):
+    """
+    Runs detection and automated response for a stored event.
+    Returns the messages to broadcast, in order. Messages are plain dicts;
+    the connection manager filters and serializes them once for all clients.
+    """
+    messages = []
+
+    # Keep the in-memory process graph current
+    process_graph.observe(event)
 
     # Analyze for immediate anomalies
     anomalies = analyze_event(event)
     for anomaly in anomalies:
         # Broadcast findings as special events
-        await manager.broadcast(json.dumps({
+        messages.append({
             "timestamp": event.timestamp,
             "type": "SECURITY_ALERT",
             "severity": "HIGH",
+            "pid": event.pid,
+            "process_name": event.process_name,
             "details": anomaly
-        }))
-        
+        })
+
         # Trigger Automated Response
         action = execute_mitigation(event.type, event.pid, event.process_name)
         if action:
-            await manager.broadcast(json.dumps({
+            messages.append({
                 "timestamp": event.timestamp,
                 "type": "RESPONSE_ACTION",
                 "severity": "INFO",
+                "pid": event.pid,
+                "process_name": event.process_name,
                 "details": f"Automated Action: {action}"
-            }))
+            })
+
+    # Broader behavioral patterns (sliding window per PID)
+    messages.extend(check_behavioral_patterns(event))
+
+    # Multi-stage kill chains across the process lineage
+    messages.extend(correlate_event(event))
+
+    # Raw event for WebSocket clients
+    messages.append(event.model_dump())
+    return messages
+
+
+async def push_process_tree_deltas():
+    """Pushes process tree deltas to WebSocket clients that joined the topic."""
+    pushed = process_graph.version
+    while True:
+        await asyncio.sleep(PROCESS_TREE_PUSH_SECONDS)
+        if process_graph.version == pushed or not manager.has_members("process_tree"):
+            continue
+        delta = process_graph.delta(pushed)
+        pushed = delta["version"]
+        await manager.publish("process_tree", {"type": "PROCESS_TREE_DELTA", **delta})
+
+
+async def run_storage_maintenance():
+    """Periodically seals past days into partitions and applies retention."""
+    while True:
+        try:
+            summary = await asyncio.to_thread(retention.maintain)
+            if any(summary.values()):
+                print(f"Storage maintenance: {summary}")
+        except Exception as e:
+            print(f"Storage maintenance failed: {e}")
+        await asyncio.sleep(retention.MAINTENANCE_INTERVAL_SECONDS)
+
+
+async def watch_reputation_feeds():
+    """Picks up blocklist feeds that were added, removed or modified on disk."""
+    while True:
+        await asyncio.sleep(max(1.0, reputation_engine.reload_interval))
+        try:
+            await asyncio.to_thread(reputation_engine.refresh)
+        except Exception as e:
+            print(f"Reputation feed refresh failed: {e}")
+
 
-    # Every 10th event, check for broader behavioral patterns
-    # (Simplified trigger logic)
-    if random.randint(1, 10) == 1:
-        patterns = check_behavioral_patterns()
-        for pattern in patterns:
-            await manager.broadcast(json.dumps(pattern))
+# HIGH/MEDIUM events get their analysis precomputed in the background; the
+# AI explanation stage only runs when a model is configured
+enrichment_worker = EnrichmentWorker(precompute_event_analysis, ai_enabled=gemini_service.model is not None)
 
-    # Broadcast to WebSocket clients
-    await manager.broadcast(event.model_dump_json())
-    return {"status": "received"}
+
+def store_events(events):
+    """save_events, then hands the stored events to the enrichment worker."""
+    ids = save_events(events)
+    enrichment_worker.offer(zip(ids, events))
+    return ids
+
+
+# Write-behind pipeline: HTTP handlers only enqueue, a background writer
+# group-commits to SQLite and then runs analysis and broadcast.
+pipeline = IngestPipeline(store=store_events, process=process_event, publish=manager.broadcast)
+background_tasks = []
+
+
+@app.on_event("startup")
+async def start_pipeline():
+    pipeline.start()
+    enrichment_worker.start()
+    background_tasks.append(asyncio.create_task(push_process_tree_deltas()))
+    background_tasks.append(asyncio.create_task(run_storage_maintenance()))
+    background_tasks.append(asyncio.create_task(watch_reputation_feeds()))
+
+
+@app.on_event("shutdown")
+async def stop_pipeline():
+    for task in background_tasks:
+        task.cancel()
+    await pipeline.stop()
+    await enrichment_worker.stop()
+    gemini_service.shutdown()
+    pool.close()
+
+
+def parse_batch_body(body: bytes, content_type: str):
+    """
+    Splits a batch request body into raw items.
+    Accepts a JSON array, or NDJSON (one JSON object per line).
+    Items that fail to decode are returned as ValueError instances.
+    """
+    text = body.decode("utf-8")
+    if "ndjson" not in content_type and text.lstrip().startswith("["):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of events")
+        return items
+
+    items = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            items.append(ValueError(f"Invalid JSON: {e}"))
+    return items
+
+
+@app.post("/api/ingest")
+async def ingest_event(event: KernelEvent, api_key: str = None):
+    # Simple Hash-based or string comparison
+    if api_key != API_KEY:
+        return JSONResponse(status_code=401, content={"status": "unauthorized"})
+    # Hand off to the background writer; storage happens in the next group commit
+    if not pipeline.enqueue(event):
+        return JSONResponse(status_code=503, content={"status": "queue_full"}, headers={"Retry-After": "1"})
+    return {"status": "queued"}
+
+
+@app.post("/api/ingest/batch")
+async def ingest_batch(request: Request, api_key: str = None):
+    """
+    Ingests many events in one request; they are group-committed together.
+    Body is a JSON array of events or NDJSON (application/x-ndjson).
+    """
+    if api_key != API_KEY:
+        return JSONResponse(status_code=401, content={"status": "unauthorized"})
+
+    try:
+        items = parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"status": "invalid", "error": str(e)})
+
+    if len(items) > MAX_BATCH_SIZE:
+        return JSONResponse(status_code=413, content={
+            "status": "too_large",
+            "error": f"Batch exceeds {MAX_BATCH_SIZE} events"
+        })
+
+    # Validate every item, then queue the valid events together or not at all
+    results = []
+    events = []
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            results.append({"index": index, "status": "invalid", "error": str(item)})
+            continue
+        try:
+            events.append((index, KernelEvent.model_validate(item)))
+        except ValidationError as e:
+            results.append({"index": index, "status": "invalid", "error": e.errors(include_url=False)})
+    invalid = len(results)
+
+    if not events:
+        return JSONResponse(status_code=400, content={
+            "status": "invalid", "queued": 0, "invalid": invalid, "rejected": 0, "results": results
+        })
+
+    queued = pipeline.enqueue_many([event for _, event in events])
+    for index, _ in events:
+        results.append({"index": index, "status": "queued"} if queued
+                       else {"index": index, "status": "rejected", "error": "queue_full"})
+    results.sort(key=lambda r: r["index"])
+    body = {
+        "status": "queued" if queued else "queue_full",
+        "queued": len(events) if queued else 0,
+        "invalid": invalid,
+        "rejected": 0 if queued else len(events),
+        "results": results
+    }
+    if not queued:
+        return JSONResponse(status_code=503, content=body, headers={"Retry-After": "1"})
+    return body
+
+
+@app.get("/api/ingest/stats")
+async def fetch_ingest_stats():
+    """Write-behind queue depth and group-commit latency."""
+    return pipeline.stats()
+
+@app.get("/api/rules/stats")
+async def fetch_rule_stats():
+    """Per-rule hit counters and evaluation time, most expensive first."""
+    return rule_engine.get_stats()
+
+@app.post("/api/rules/reload")
+async def reload_rules(api_key: str = None):
+    if api_key != API_KEY:
+        return JSONResponse(status_code=401, content={"status": "unauthorized"})
+    # Rules and chains are compiled together and swapped in only if both are valid
+    if not rule_engine.reload():
+        return JSONResponse(status_code=400, content={"status": "invalid", "error": rule_engine.last_error})
+    return {"status": "reloaded", "rules": len(rule_engine.rules), "chains": len(correlation_engine.chains)}
+
+@app.get("/api/correlation/stats")
+async def fetch_correlation_stats():
+    """Active kill-chain state and incident counts."""
+    return correlation_engine.stats()
+
+@app.get("/api/behavior/stats")
+async def fetch_behavior_stats():
+    """Sliding-window detector configuration and state size."""
+    return behavior_detector.stats()
+
+@app.get("/api/storage/stats")
+async def fetch_storage_stats():
+    return {"policy": retention.policy(), "partitions": await asyncio.to_thread(get_partitions)}
+
+@app.get("/api/ws/stats")
+async def fetch_ws_stats():
+    """Connected clients and their send queue depth / drop counts."""
+    return manager.stats()
 
 @app.websocket("/ws/feed")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, batch: bool = False, batch_ms: int = None, batch_max: int = None):
+    """
+    Live event feed. With ?batch=1 (or explicit batch_ms / batch_max) messages
+    are coalesced and delivered as JSON array frames.
+
+    Clients may narrow the stream by sending a subscription message:
+        {"action": "subscribe", "severity": ["HIGH"], "type": [...],
+         "pid": [...], "process_name": [...]}
+    Omitted fields match anything; {"action": "unsubscribe"} clears filters.
+    {"action": "join", "topic": "process_tree"} adds PROCESS_TREE_DELTA pushes.
+    """
+    window = 0
+    if batch or batch_ms or batch_max:
+        window = min(max(batch_ms or WS_BATCH_MS, 1), 1000)
+    limit = min(max(batch_max or WS_BATCH_MAX, 1), 10000)
+    await manager.connect(websocket, batch_ms=window, batch_max=limit)
     try:
         while True:
-            await websocket.receive_text() # Keep connection open
+            manager.handle_client_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
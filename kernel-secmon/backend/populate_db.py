@@ -1,28 +1,15 @@
 """
 Quick script to populate database with sample events for demo
 """
-import sqlite3
 from datetime import datetime
+from database import init_db, clear_events, save_events
+from models import KernelEvent
 
-# Initialize database
-conn = sqlite3.connect("kernel_secmon.db")
-cursor = conn.cursor()
-
-# Create tables
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS events (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        pid INTEGER,
-        process_name TEXT,
-        severity TEXT,
-        type TEXT,
-        details TEXT
-    )
-''')
+# Initialize database (creates or upgrades the schema)
+init_db()
 
 # Clear existing data
-cursor.execute("DELETE FROM events")
+clear_events()
 
 # Insert sample events
 events = [
@@ -36,15 +23,11 @@ events = [
      "Unsigned kernel module loaded via insmod - attempting to hide CPU usage from monitoring tools"),
 ]
 
-for event in events:
-    cursor.execute('''
-        INSERT INTO events (timestamp, pid, process_name, severity, type, details)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', event)
-
-conn.commit()
-conn.close()
+ids = save_events([
+    KernelEvent(timestamp=ts, pid=pid, process_name=name, severity=severity, type=type_, details=details)
+    for ts, pid, name, severity, type_, details in events
+])
 
-print("✓ Database populated with 4 sample events")
-print("✓ Events have IDs 1-4")
+print(f"✓ Database populated with {len(ids)} sample events")
+print(f"✓ Events have IDs {ids[0]}-{ids[-1]}")
 print("✓ You can now click on events in the dashboard to see AI analysis!")
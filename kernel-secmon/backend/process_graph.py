@@ -0,0 +1,149 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Keep at most this many processes, dropping the least recently active (0 = unlimited)
+PROCESS_GRAPH_MAX_NODES = int(os.getenv("PROCESS_GRAPH_MAX_NODES", "5000"))
+# Removed-node history kept for deltas; older clients get a full snapshot
+PROCESS_GRAPH_TOMBSTONES = 10000
+
+
+class _Node:
+    __slots__ = ("pid", "name", "parent_pid", "suspicious", "event_count", "version")
+
+    def __init__(self, pid, name, parent_pid=0, suspicious=False, event_count=0, version=0):
+        self.version = version
+        self.pid = pid
+        self.name = name
+        self.parent_pid = parent_pid
+        self.suspicious = suspicious
+        self.event_count = event_count
+
+    def to_dict(self):
+        return {
+            'id': str(self.pid),
+            'name': self.name,
+            'pid': self.pid,
+            'suspicious': self.suspicious,
+            'event_count': self.event_count
+        }
+
+    def link(self):
+        return {'source': str(self.parent_pid), 'target': str(self.pid)} if self.parent_pid else None
+
+
+class ProcessGraph:
+    """
+    Process lineage graph maintained incrementally at ingest time.
+
+    Nodes are kept in order of last activity so the graph can be capped to
+    the most recently active processes. Rebuilt from the events table on
+    startup and served from memory afterwards.
+
+    Every change bumps a graph-wide version and stamps the node with it.
+    Because each change also moves the node to the end of the ordering, the
+    nodes changed since version V are exactly a suffix of `nodes`, so a delta
+    costs O(changes) rather than O(graph). Versions start from the wall clock
+    in milliseconds so they keep increasing across restarts.
+    """
+
+    def __init__(self, max_nodes=PROCESS_GRAPH_MAX_NODES):
+        self.max_nodes = max_nodes
+        self.nodes = OrderedDict()  # pid -> _Node, least recently changed first
+        self.version = int(time.time() * 1000)
+        self.tombstones = deque()   # (version, pid) of evicted nodes, oldest first
+        self.delta_floor = self.version  # deltas from before this need a full snapshot
+        self._lock = threading.Lock()
+
+    def rebuild(self, rows):
+        """Loads (pid, name, parent_pid, suspicious, event_count, ...) rows, oldest first."""
+        with self._lock:
+            self.nodes.clear()
+            self.tombstones.clear()
+            self.version += 1
+            for pid, name, parent_pid, suspicious, event_count, *_ in rows:
+                self.nodes[pid] = _Node(pid, name, parent_pid or 0, bool(suspicious), event_count, self.version)
+            self.delta_floor = self.version
+            self._trim()
+
+    def observe(self, event):
+        with self._lock:
+            self.version += 1
+            node = self.nodes.get(event.pid)
+            if node is None:
+                node = self.nodes[event.pid] = _Node(event.pid, event.process_name)
+                self._trim()
+            else:
+                self.nodes.move_to_end(event.pid)
+                node.name = event.process_name
+            if event.parent_pid:
+                node.parent_pid = event.parent_pid
+            if event.severity == "HIGH":
+                node.suspicious = True
+            node.event_count += 1
+            node.version = self.version
+
+    def _trim(self):
+        if self.max_nodes:
+            while len(self.nodes) > self.max_nodes:
+                pid, _ = self.nodes.popitem(last=False)
+                self.tombstones.append((self.version, pid))
+                if len(self.tombstones) > PROCESS_GRAPH_TOMBSTONES:
+                    self.delta_floor = self.tombstones.popleft()[0]
+
+    def delta(self, since=None):
+        """
+        Changes since version `since`: added or changed nodes with their parent
+        links, plus removed node ids (apply removals first: a pid can be
+        removed and then re-added within one delta). Returns a full snapshot (full=True) when
+        `since` is missing, unknown or older than the retained history.
+        Links may reference parents the graph does not track; clients should
+        draw only links whose endpoints are both present.
+        """
+        with self._lock:
+            full = since is None or since < self.delta_floor or since > self.version
+            changed = []
+            for node in reversed(self.nodes.values()):
+                if not full and node.version <= since:
+                    break
+                changed.append(node)
+            removed = []
+            if not full:
+                for version, pid in reversed(self.tombstones):
+                    if version <= since:
+                        break
+                    removed.append(str(pid))
+            return {
+                'version': self.version,
+                'full': full,
+                'nodes': [node.to_dict() for node in changed],
+                'links': [link for link in (node.link() for node in changed) if link],
+                'removed': removed
+            }
+
+    def snapshot(self):
+        """
+        Returns nodes and links for force graph visualization, in the same
+        shape as a full delta (version, full=True, removed=[]), so clients
+        can apply it with the same code.
+        """
+        with self._lock:
+            version = self.version
+            nodes = [node.to_dict() for node in self.nodes.values()]
+            # Only link to parents we actually track
+            links = [
+                {'source': str(node.parent_pid), 'target': str(node.pid)}
+                for node in self.nodes.values()
+                if node.parent_pid and node.parent_pid in self.nodes
+            ]
+        return {
+            'version': version,
+            'full': True,
+            'nodes': nodes,
+            'links': links,
+            'removed': []
+        }
+
+
+process_graph = ProcessGraph()
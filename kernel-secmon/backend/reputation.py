@@ -0,0 +1,261 @@
+import csv
+import os
+import socket
+import threading
+import time
+
+# Offline blocklist feeds (overridable via environment)
+REPUTATION_FEED_DIR = os.getenv("REPUTATION_FEED_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "feeds"))
+REPUTATION_RELOAD_INTERVAL = float(os.getenv("REPUTATION_RELOAD_INTERVAL", "30"))
+# Score of entries from plain IP/CIDR lists, which carry none of their own
+REPUTATION_LIST_SCORE = int(os.getenv("REPUTATION_LIST_SCORE", "100"))
+
+_NETWORK_COLUMNS = ("network", "cidr", "ip", "ipaddress", "address")
+_SCORE_COLUMNS = ("score", "threat_score", "confidence", "abuseconfidencescore")
+_CATEGORY_COLUMNS = ("category", "categories", "comment", "description")
+
+_AF_INET, _AF_INET6 = socket.AF_INET, socket.AF_INET6
+_inet_pton = socket.inet_pton
+_from_bytes = int.from_bytes
+
+
+def parse_address(text):
+    """(version, int) for an IPv4/IPv6 string, or None. IPv4-mapped IPv6 counts as IPv4."""
+    try:
+        return 4, _from_bytes(_inet_pton(_AF_INET, text), "big")
+    except OSError:
+        pass
+    try:
+        value = _from_bytes(_inet_pton(_AF_INET6, text), "big")
+    except OSError:
+        return None
+    if value >> 32 == 0xFFFF:
+        return 4, value & 0xFFFFFFFF
+    return 6, value
+
+
+def parse_network(text):
+    """(version, prefix length, address int) for 'addr' or 'addr/len'; host bits are kept."""
+    address, _, length = text.partition("/")
+    parsed = parse_address(address)
+    if parsed is None:
+        raise ValueError(f"invalid address: {text!r}")
+    version, value = parsed
+    bits = 32 if version == 4 else 128
+    if not length:
+        return version, bits, value
+    prefix = int(length)
+    if version == 4 and ":" in address:
+        prefix -= 96  # ::ffff:a.b.c.d/len
+    if not 0 <= prefix <= bits:
+        raise ValueError(f"invalid prefix length: {text!r}")
+    return version, prefix, value
+
+
+class PrefixTable:
+    """
+    Longest-prefix-match table for IPv4 and IPv6 networks.
+
+    One hash table per prefix length, keyed by the network bits; a lookup
+    probes the lengths that actually occur, longest first, so its cost is
+    bounded by the number of distinct lengths (a handful in real feeds)
+    rather than by the number of entries. Immutable once built.
+    """
+
+    def __init__(self):
+        self._tables = {4: {}, 6: {}}   # version -> prefix length -> {network >> host bits: entry}
+        self._probes = {4: (), 6: ()}  # version -> ((prefix length, shift, table), ...) longest first
+        self.entries = 0
+
+    def add(self, text, score, feed, category=None):
+        """Adds an IP or CIDR string (ValueError if invalid); on duplicates the higher score wins."""
+        version, prefix, value = parse_network(text)
+        shift = (32 if version == 4 else 128) - prefix
+        key = value >> shift
+        table = self._tables[version].setdefault(prefix, {})
+        existing = table.get(key)
+        if existing is None:
+            self.entries += 1
+        elif existing[0] >= score:
+            return
+        table[key] = (score, feed, category, _format_network(version, key << shift, prefix))
+
+    def freeze(self):
+        for version, bits in ((4, 32), (6, 128)):
+            self._probes[version] = tuple(
+                (length, bits - length, table)
+                for length, table in sorted(self._tables[version].items(), reverse=True)
+            )
+        return self
+
+    def lookup(self, ip):
+        """(score, feed, category, network) of the most specific match for an IP string, or None."""
+        try:
+            value = _from_bytes(_inet_pton(_AF_INET, ip), "big")
+            probes = self._probes[4]
+        except OSError:
+            parsed = parse_address(ip)
+            if parsed is None:
+                return None
+            version, value = parsed
+            probes = self._probes[version]
+        for _, shift, table in probes:
+            entry = table.get(value >> shift)
+            if entry is not None:
+                return entry
+        return None
+
+    def prefix_lengths(self):
+        return {f"ipv{version}": [length for length, _, _ in probes] for version, probes in self._probes.items()}
+
+
+def _format_network(version, value, prefix):
+    family = _AF_INET if version == 4 else _AF_INET6
+    return f"{socket.inet_ntop(family, value.to_bytes(4 if version == 4 else 16, 'big'))}/{prefix}"
+
+
+def _read_list(path, feed, table):
+    """One IP or CIDR per line; '#' and ';' start comments."""
+    skipped = 0
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            text = line.split("#", 1)[0].split(";", 1)[0].strip()
+            if not text:
+                continue
+            try:
+                table.add(text.split()[0], REPUTATION_LIST_SCORE, feed)
+            except ValueError:
+                skipped += 1
+    return skipped
+
+
+def _read_csv(path, feed, table):
+    """
+    CSV of network (IP or CIDR), score 0-100 and an optional category, in
+    that order, or in any order under a header naming those columns.
+    """
+    skipped = 0
+    columns = (0, 1, 2)
+    first = True
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        for row in csv.reader(f):
+            if not any(cell.strip() for cell in row) or row[0].lstrip().startswith("#"):
+                continue
+            # The header, if any, is the first row that is not blank or a comment
+            if first:
+                first = False
+                names = [c.strip().lower() for c in row]
+                if any(name in _NETWORK_COLUMNS for name in names):
+                    pick = lambda options: next((names.index(o) for o in options if o in names), None)
+                    columns = (pick(_NETWORK_COLUMNS), pick(_SCORE_COLUMNS), pick(_CATEGORY_COLUMNS))
+                    continue
+            network_col, score_col, category_col = columns
+            try:
+                network = row[network_col].strip()
+                score = REPUTATION_LIST_SCORE if score_col is None else int(float(row[score_col]))
+            except (ValueError, IndexError):
+                skipped += 1
+                continue
+            category = row[category_col].strip() if category_col is not None and category_col < len(row) else None
+            try:
+                table.add(network, max(0, min(score, 100)), feed, category or None)
+            except ValueError:
+                skipped += 1
+    return skipped
+
+
+class ReputationEngine:
+    """
+    Local IP reputation from blocklist feeds in REPUTATION_FEED_DIR: plain
+    lists (one IP or CIDR per line) and CSV files with scores. Every file in
+    the directory is a feed named after the file.
+
+    The feeds are compiled into a PrefixTable off to the side and swapped in
+    with a single assignment, so lookups never see a half-loaded table and
+    never take a lock. `refresh()` (run periodically by the API server, off
+    the lookup path) reloads when a file was added, removed or modified;
+    `reload()` always does.
+    """
+
+    def __init__(self, path=REPUTATION_FEED_DIR, reload_interval=REPUTATION_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.table = PrefixTable().freeze()
+        self.feeds = {}
+        self.loaded_at = None
+        self.last_error = None
+        self.lookups = 0
+        self.hits = 0
+        self._signature = None
+        self._lock = threading.Lock()  # serializes reloads only
+        self.reload()
+
+    def _scan(self):
+        if not os.path.isdir(self.path):
+            return ()
+        files = []
+        for name in sorted(os.listdir(self.path)):
+            full = os.path.join(self.path, name)
+            if os.path.isfile(full) and not name.startswith("."):
+                stat = os.stat(full)
+                files.append((name, stat.st_mtime, stat.st_size))
+        return tuple(files)
+
+    def reload(self):
+        """Rebuilds the table from the feed directory. Keeps the previous table on error."""
+        with self._lock:
+            try:
+                signature = self._scan()
+                table = PrefixTable()
+                feeds = {}
+                for name, _, _ in signature:
+                    feed = os.path.splitext(name)[0]
+                    before = table.entries
+                    reader = _read_csv if name.lower().endswith(".csv") else _read_list
+                    skipped = reader(os.path.join(self.path, name), feed, table)
+                    feeds[feed] = {"file": name, "entries": table.entries - before, "skipped": skipped}
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Reputation feed reload failed ({self.path}), keeping the previous table: {self.last_error}")
+                return False
+
+            self.table = table.freeze()
+            self.feeds = feeds
+            self._signature = signature
+            self.loaded_at = time.time()
+            self.last_error = None
+        if feeds:
+            print(f"Loaded {table.entries} reputation entries from {len(feeds)} feed(s)")
+        return True
+
+    def refresh(self):
+        """Reloads if the feed directory changed since the last load. Blocking; returns whether it reloaded."""
+        try:
+            if self._scan() == self._signature:
+                return False
+        except OSError:
+            return False
+        return self.reload()
+
+    def lookup(self, ip):
+        """(score, feed, category, network) for a listed IP, else None."""
+        entry = self.table.lookup(ip)
+        self.lookups += 1
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "entries": self.table.entries,
+            "feeds": self.feeds,
+            "prefix_lengths": self.table.prefix_lengths(),
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+        }
+
+
+reputation_engine = ReputationEngine()
@@ -0,0 +1,225 @@
+import os
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import archive
+from database import DELETE_FTS_SQL, EVENT_COLUMNS, UPSERT_STAT_SQL, _ingest_day
+from db_pool import reader, writer
+
+# Retention policy in days (overridable via environment)
+RETENTION_DAYS = int(os.getenv("SECMON_RETENTION_DAYS", "90"))          # HIGH / MEDIUM raw rows
+INFO_RAW_DAYS = int(os.getenv("SECMON_INFO_RAW_DAYS", "7"))             # INFO raw rows, then rolled up
+ROLLUP_RETENTION_DAYS = int(os.getenv("SECMON_ROLLUP_RETENTION_DAYS", "365"))
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("SECMON_MAINTENANCE_SECONDS", "300"))
+
+# Event time truncated to the UTC minute
+MINUTE_SQL = "strftime('%Y-%m-%dT%H:%M', ts_us / 1000000, 'unixepoch')"
+
+PARTITION_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        timestamp TEXT,
+        pid INTEGER,
+        process_name TEXT,
+        severity TEXT,
+        type TEXT,
+        details TEXT,
+        parent_pid INTEGER DEFAULT 0,
+        ts_us INTEGER
+    )
+'''
+PARTITION_INDEXED_COLUMNS = ("pid", "type", "severity", "ts_us", "process_name")
+
+
+def partition_table(day):
+    return "events_" + day.replace("-", "")
+
+
+def _days_ago(now, days):
+    return _ingest_day(now - timedelta(days=days))
+
+
+def _subtract_stats(cursor, rows):
+    """Removes (severity, type, process_name, count) rows from event_stats."""
+    deltas = Counter()
+    for severity, type, process_name, count in rows:
+        deltas[("total", "")] -= count
+        deltas[("severity", severity or "")] -= count
+        deltas[("type", type or "")] -= count
+        deltas[("process", process_name or "")] -= count
+    cursor.executemany(UPSERT_STAT_SQL, [(dimension, key, count) for (dimension, key), count in deltas.items()])
+    cursor.execute("DELETE FROM event_stats WHERE count <= 0 AND dimension != 'total'")
+
+
+def seal_partition(day, now=None):
+    """Moves one past day out of the hot `events` table into events_YYYYMMDD."""
+    table = partition_table(day)
+    with writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        cursor.execute("SELECT min_id, max_id FROM event_partitions WHERE day = ? AND sealed_at IS NULL", (day,))
+        row = cursor.fetchone()
+        if not row:
+            return False
+        min_id, max_id = row
+        columns = ", ".join(EVENT_COLUMNS)
+        cursor.execute(PARTITION_TABLE_SQL.format(table=table))
+        cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM events WHERE id BETWEEN ? AND ?", (min_id, max_id))
+        cursor.execute("DELETE FROM events WHERE id BETWEEN ? AND ?", (min_id, max_id))
+        # Indexes are built after the bulk copy, which is cheaper than maintaining them row by row
+        for column in PARTITION_INDEXED_COLUMNS:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+        cursor.execute(
+            "UPDATE event_partitions SET table_name = ?, sealed_at = ? WHERE day = ?",
+            (table, (now or datetime.now(timezone.utc)).isoformat(), day)
+        )
+    return True
+
+
+def rollup_partition(day, now=None):
+    """Replaces the INFO rows of a sealed partition with per-minute counts."""
+    with writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        cursor.execute("SELECT table_name FROM event_partitions WHERE day = ? AND sealed_at IS NOT NULL AND rolled_up_at IS NULL", (day,))
+        row = cursor.fetchone()
+        if not row:
+            return 0
+        table = row[0]
+        cursor.execute(f'''
+            INSERT INTO event_rollups (minute, severity, type, process_name, day, count)
+            SELECT COALESCE({MINUTE_SQL}, ? || 'T00:00'), severity, COALESCE(type, ''), COALESCE(process_name, ''), ?, COUNT(*)
+            FROM {table}
+            WHERE severity = 'INFO'
+            GROUP BY 1, 2, 3, 4
+            ON CONFLICT (minute, severity, type, process_name) DO UPDATE SET count = count + excluded.count
+        ''', (day, day))
+        cursor.execute(f'''
+            INSERT INTO events_fts (events_fts, rowid, details, process_name)
+            SELECT 'delete', id, details, process_name FROM {table} WHERE severity = 'INFO'
+        ''')
+        cursor.execute(f"DELETE FROM {table} WHERE severity = 'INFO'")
+        removed = cursor.rowcount
+        cursor.execute(
+            f"UPDATE event_partitions SET rows = (SELECT COUNT(*) FROM {table}), rolled_up_at = ? WHERE day = ?",
+            ((now or datetime.now(timezone.utc)).isoformat(), day)
+        )
+    return removed
+
+
+def archive_partition(day, now=None):
+    """
+    Moves a sealed partition into a compressed Parquet file and drops its
+    table. The file is written from a reader connection (sealed partitions
+    no longer change), so ingest is only blocked for the final swap.
+    """
+    with reader() as conn:
+        row = conn.execute(
+            "SELECT table_name FROM event_partitions WHERE day = ? AND sealed_at IS NOT NULL AND archive_path IS NULL", (day,)
+        ).fetchone()
+        if not row:
+            return 0
+        table, path = row[0], archive.archive_path(day)
+        rows = archive.write_partition(conn, table, path)
+
+    with writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(
+            "UPDATE event_partitions SET archive_path = ?, archived_at = ?, rows = ? WHERE day = ?",
+            (path, (now or datetime.now(timezone.utc)).isoformat(), rows, day)
+        )
+    return rows
+
+
+def drop_partition(day):
+    """Deletes a sealed or archived partition and takes its rows out of event_stats."""
+    with writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        cursor.execute("SELECT table_name, archive_path FROM event_partitions WHERE day = ? AND sealed_at IS NOT NULL", (day,))
+        row = cursor.fetchone()
+        if not row:
+            return False
+        table, path = row
+        if path:
+            _subtract_stats(cursor, archive.group_counts(path))
+            cursor.executemany(DELETE_FTS_SQL, archive.iter_rows(path, ["id", "details", "process_name"]))
+        else:
+            cursor.execute(f"SELECT severity, type, process_name, COUNT(*) FROM {table} GROUP BY 1, 2, 3")
+            _subtract_stats(cursor, cursor.fetchall())
+            cursor.execute(f'''
+                INSERT INTO events_fts (events_fts, rowid, details, process_name)
+                SELECT 'delete', id, details, process_name FROM {table}
+            ''')
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute("DELETE FROM event_partitions WHERE day = ?", (day,))
+    if path and os.path.exists(path):
+        os.remove(path)
+    return True
+
+
+def drop_rollups(before_day):
+    """Deletes rollups of days before `before_day` and their event_stats share."""
+    with writer() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        cursor.execute("SELECT severity, type, process_name, SUM(count) FROM event_rollups WHERE day < ? GROUP BY 1, 2, 3", (before_day,))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        _subtract_stats(cursor, rows)
+        cursor.execute("DELETE FROM event_rollups WHERE day < ?", (before_day,))
+        return cursor.rowcount
+
+
+def maintain(now=None):
+    """
+    One retention pass: seal finished days, roll up aged INFO rows, archive
+    old partitions to Parquet, and drop partitions and rollups past their
+    retention. Each step is its own transaction, so ingest only waits for
+    one partition at a time.
+    Returns what was done.
+    """
+    now = now or datetime.now(timezone.utc)
+    today = _ingest_day(now)
+    info_cutoff = _days_ago(now, INFO_RAW_DAYS)
+    raw_cutoff = _days_ago(now, RETENTION_DAYS)
+    archive_cutoff = _days_ago(now, archive.ARCHIVE_AFTER_DAYS) if archive.ARCHIVE_AFTER_DAYS else None
+
+    with reader() as conn:
+        partitions = conn.execute(
+            "SELECT day, sealed_at, rolled_up_at, archive_path FROM event_partitions ORDER BY day"
+        ).fetchall()
+
+    summary = {"sealed": [], "rolled_up": [], "archived": [], "dropped": [], "rollups_dropped": 0}
+    for day, sealed_at, rolled_up_at, archive_path in partitions:
+        if day >= today:
+            continue
+        if not sealed_at and seal_partition(day, now):
+            summary["sealed"].append(day)
+        # Roll up before dropping so INFO counts survive even a long outage
+        if day < info_cutoff and not rolled_up_at and rollup_partition(day, now):
+            summary["rolled_up"].append(day)
+        if day < raw_cutoff:
+            if drop_partition(day):
+                summary["dropped"].append(day)
+            continue
+        # Archive only after the INFO rollup, which works on SQLite tables
+        if (archive_cutoff and day < archive_cutoff and day < info_cutoff and not archive_path
+                and archive.available() and archive_partition(day, now)):
+            summary["archived"].append(day)
+    summary["rollups_dropped"] = drop_rollups(_days_ago(now, ROLLUP_RETENTION_DAYS))
+    return summary
+
+
+def policy():
+    return {
+        "retention_days": RETENTION_DAYS,
+        "info_raw_days": INFO_RAW_DAYS,
+        "rollup_retention_days": ROLLUP_RETENTION_DAYS,
+        "archive_after_days": archive.ARCHIVE_AFTER_DAYS,
+        "archive_dir": archive.ARCHIVE_DIR if archive.available() else None,
+        "maintenance_interval_seconds": MAINTENANCE_INTERVAL_SECONDS,
+    }
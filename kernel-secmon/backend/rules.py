@@ -0,0 +1,336 @@
+import json
+import os
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+
+from behavior import SlidingWindowCounter
+
+RULES_PATH = os.getenv("RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+# How often (seconds) evaluate() checks the rules file for changes
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", "2"))
+# Per-event-type plans kept; the least recently seen type is dropped past this
+RULES_MAX_PLANS = int(os.getenv("RULES_MAX_PLANS", "4096"))
+
+EVENT_FIELDS = ("timestamp", "pid", "parent_pid", "process_name", "severity", "type", "details")
+# Names a rule message may reference
+MESSAGE_FIELDS = EVENT_FIELDS + ("rule_id",)
+
+
+class RuleError(ValueError):
+    """Raised when a rules file cannot be compiled."""
+
+
+class _FormatDict(dict):
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def _check_message(message):
+    """Rejects templates that cannot be filled from an event."""
+    if not isinstance(message, str):
+        raise RuleError("message must be a string")
+    try:
+        fields = [name for _, name, _, _ in string.Formatter().parse(message) if name is not None]
+    except ValueError as e:
+        raise RuleError(f"Bad message template {message!r}: {e}")
+    for name in fields:
+        if name not in MESSAGE_FIELDS:
+            raise RuleError(f"Bad message field {{{name}}}; expected one of {', '.join(MESSAGE_FIELDS)}")
+    return message
+
+
+def _compile_condition(spec):
+    """Compiles one condition into (field, predicate)."""
+    if not isinstance(spec, dict):
+        raise RuleError(f"Condition must be an object, got {spec!r}")
+    field = spec.get("field")
+    if field not in EVENT_FIELDS:
+        raise RuleError(f"Unknown field: {field!r}")
+    ignore_case = spec.get("ignore_case", False)
+
+    def norm(value):
+        value = str(value)
+        return value.lower() if ignore_case else value
+
+    if "equals" in spec:
+        expected = spec["equals"]
+        if isinstance(expected, str):
+            expected = norm(expected)
+            return field, lambda v: norm(v) == expected
+        return field, lambda v: v == expected
+    if "in" in spec:
+        if not isinstance(spec["in"], list):
+            raise RuleError(f"Condition on {field!r}: 'in' must be a list")
+        options = {norm(o) if isinstance(o, str) else o for o in spec["in"]}
+        return field, lambda v: (norm(v) if isinstance(v, str) else v) in options
+    if "contains" in spec:
+        needle = norm(spec["contains"])
+        return field, lambda v: needle in norm(v)
+    if "regex" in spec:
+        try:
+            pattern = re.compile(spec["regex"], re.IGNORECASE if ignore_case else 0)
+        except re.error as e:
+            raise RuleError(f"Bad regex {spec['regex']!r}: {e}")
+        return field, lambda v: pattern.search(str(v)) is not None
+    if "gte" in spec or "lte" in spec:
+        low, high = spec.get("gte"), spec.get("lte")
+        for bound in (low, high):
+            if bound is not None and (isinstance(bound, bool) or not isinstance(bound, (int, float))):
+                raise RuleError(f"Condition on {field!r}: bounds must be numbers, got {bound!r}")
+        return field, lambda v: (low is None or v >= low) and (high is None or v <= high)
+    raise RuleError(f"Condition on {field!r} has no operator")
+
+
+class CompiledRule:
+    """A rule with its conditions compiled to predicates."""
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise RuleError(f"Rule must be an object, got {spec!r}")
+        self.id = spec.get("id")
+        if not self.id:
+            raise RuleError("Rule without id")
+        self.description = spec.get("description", "")
+        try:
+            self.message = _check_message(spec.get("message", "Rule {rule_id} matched: {type}"))
+        except RuleError as e:
+            raise RuleError(f"Rule {self.id}: {e}")
+        for key in ("all", "any", "types"):
+            if not isinstance(spec.get(key, []), list):
+                raise RuleError(f"Rule {self.id}: {key!r} must be a list")
+        self.types = set(spec["types"]) if spec.get("types") else None
+        try:
+            self.type_pattern = re.compile(spec["type_pattern"]) if spec.get("type_pattern") else None
+        except re.error as e:
+            raise RuleError(f"Rule {self.id}: bad type_pattern: {e}")
+        try:
+            self.all = [_compile_condition(c) for c in spec.get("all", [])]
+            self.any = [_compile_condition(c) for c in spec.get("any", [])]
+        except RuleError as e:
+            raise RuleError(f"Rule {self.id}: {e}")
+
+        self.counter = None
+        threshold = spec.get("threshold")
+        if threshold:
+            if not isinstance(threshold, dict):
+                raise RuleError(f"Rule {self.id}: threshold must be an object")
+            try:
+                self.threshold = int(threshold["count"])
+                window = int(threshold.get("window_seconds", 60))
+            except (KeyError, TypeError, ValueError):
+                raise RuleError(f"Rule {self.id}: threshold needs an integer count and window_seconds")
+            if self.threshold < 1 or window < 1:
+                raise RuleError(f"Rule {self.id}: threshold count and window_seconds must be positive")
+            self.group_by = threshold.get("group_by", "pid")
+            if self.group_by not in EVENT_FIELDS:
+                raise RuleError(f"Rule {self.id}: unknown group_by {self.group_by!r}")
+            self.counter = SlidingWindowCounter(window, max(1, window // 10))
+
+    def applies_to_type(self, event_type):
+        if self.types is not None and event_type not in self.types:
+            return False
+        if self.type_pattern is not None and not self.type_pattern.search(event_type):
+            return False
+        return True
+
+    def specialize(self, event_type):
+        """
+        Resolves conditions on the `type` field once per event type.
+        Returns (all_conditions, any_conditions) for the remaining fields, or
+        None when the rule can never match events of this type.
+        """
+        if not self.applies_to_type(event_type):
+            return None
+        remaining_all = []
+        for field, predicate in self.all:
+            if field == "type":
+                if not predicate(event_type):
+                    return None
+            else:
+                remaining_all.append((field, predicate))
+
+        remaining_any = []
+        for field, predicate in self.any:
+            if field == "type":
+                if predicate(event_type):
+                    # One static alternative matches: the any-block is satisfied
+                    remaining_any = None
+                    break
+            else:
+                remaining_any.append((field, predicate))
+        if remaining_any == [] and self.any:
+            return None
+        return remaining_all, remaining_any or []
+
+
+def compile_rules(spec):
+    """Compiles the enabled rules of a parsed rules file; RuleError if anything is malformed."""
+    if not isinstance(spec, dict):
+        raise RuleError("Rules file must be an object with a 'rules' list")
+    specs = spec.get("rules", [])
+    if not isinstance(specs, list):
+        raise RuleError("'rules' must be a list")
+    rules = [CompiledRule(r) for r in specs if not isinstance(r, dict) or r.get("enabled", True)]
+    ids = [r.id for r in rules]
+    if len(ids) != len(set(ids)):
+        raise RuleError("Duplicate rule ids")
+    return rules
+
+
+class RuleEngine:
+    """
+    Evaluates declarative detection rules from a JSON file.
+
+    Rules are compiled once and indexed by event type: the first time a type
+    is seen, the engine computes which rules can apply to it (with type
+    conditions already resolved) and caches that plan. The file is reloaded
+    when it changes on disk or on `reload()`, and the new ruleset is swapped in
+    atomically. Per-rule hit counts and evaluation time are kept across
+    reloads.
+
+    Other sections of the same file are configured through `sections`:
+    objects with `compile(spec)` (raising on a malformed section) and
+    `apply(compiled)`. Every reload compiles the rules and all sections
+    first and swaps them in together, or changes nothing on any error, so
+    they always come from the same version of the file.
+    """
+
+    def __init__(self, path=RULES_PATH, reload_interval=RULES_RELOAD_INTERVAL, sections=(), max_plans=RULES_MAX_PLANS):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.sections = list(sections)
+        self.max_plans = max_plans
+        self.rules = []
+        self.plans = OrderedDict()  # event type -> plan, least recently seen first
+        self.stats = {}
+        self.loaded_at = None
+        self.last_error = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """Recompiles the rules file and its sections. Keeps the previous configuration on error."""
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, "r") as f:
+                spec = json.load(f)
+            rules = compile_rules(spec)
+            compiled = [section.compile(spec) for section in self.sections]
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Rules reload failed ({self.path}), keeping the previous configuration: {self.last_error}")
+            return False
+
+        with self._lock:
+            self.rules = rules
+            self.plans = OrderedDict()
+            for rule in rules:
+                self.stats.setdefault(rule.id, {"evaluations": 0, "hits": 0, "errors": 0, "total_ns": 0})
+            for section, value in zip(self.sections, compiled):
+                section.apply(value)
+            self._mtime = mtime
+            self.loaded_at = time.time()
+            self.last_error = None
+        return True
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        try:
+            if os.path.getmtime(self.path) != self._mtime:
+                self.reload()
+        except OSError:
+            pass
+
+    def _plan(self, event_type):
+        plan = self.plans.get(event_type)
+        if plan is not None:
+            self.plans.move_to_end(event_type)
+            return plan
+        plan = []
+        for rule in self.rules:
+            specialized = rule.specialize(event_type)
+            if specialized is not None:
+                plan.append((rule, specialized[0], specialized[1]))
+        # Bounded: a sensor emitting arbitrary type strings must not grow it forever
+        self.plans[event_type] = plan
+        if len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+        return plan
+
+    def evaluate(self, event, now=None):
+        """
+        Returns the alert messages of all rules matching the event. `now` is
+        the event time in epoch seconds for threshold windows (wall clock if
+        omitted).
+        """
+        self._maybe_reload()
+        now = time.time() if now is None else now
+        values = event.model_dump()
+        messages = []
+        with self._lock:
+            for rule, all_conditions, any_conditions in self._plan(event.type):
+                stats = self.stats[rule.id]
+                start = time.perf_counter_ns()
+                try:
+                    message = self._match(rule, all_conditions, any_conditions, values, now)
+                except Exception as e:
+                    # One broken rule must not stop the others from being evaluated
+                    message = None
+                    stats["errors"] += 1
+                    print(f"Rule {rule.id} failed on a {event.type} event: {type(e).__name__}: {e}")
+                stats["evaluations"] += 1
+                stats["total_ns"] += time.perf_counter_ns() - start
+                if message is not None:
+                    stats["hits"] += 1
+                    messages.append(message)
+        return messages
+
+    @staticmethod
+    def _match(rule, all_conditions, any_conditions, values, now):
+        """The rule's alert message if it fires on the event values, else None."""
+        matched = all(predicate(values[field]) for field, predicate in all_conditions)
+        if matched and any_conditions:
+            matched = any(predicate(values[field]) for field, predicate in any_conditions)
+        if matched and rule.counter is not None:
+            state = rule.counter.add(values[rule.group_by], now)
+            if state.total < rule.threshold:
+                state.fired = False
+                matched = False
+            elif state.fired:
+                matched = False
+            else:
+                state.fired = True
+        if not matched:
+            return None
+        return rule.message.format_map(_FormatDict(values, rule_id=rule.id))
+
+    def get_stats(self):
+        """Per-rule counters, most expensive first."""
+        with self._lock:
+            active = {rule.id for rule in self.rules}
+            rules = []
+            for rule_id, s in self.stats.items():
+                rules.append({
+                    "id": rule_id,
+                    "active": rule_id in active,
+                    "evaluations": s["evaluations"],
+                    "hits": s["hits"],
+                    "errors": s["errors"],
+                    "total_ms": round(s["total_ns"] / 1e6, 3),
+                    "avg_us": round(s["total_ns"] / s["evaluations"] / 1e3, 3) if s["evaluations"] else 0.0,
+                })
+            return {
+                "path": self.path,
+                "loaded_at": self.loaded_at,
+                "last_error": self.last_error,
+                "indexed_types": len(self.plans),
+                "rules": sorted(rules, key=lambda r: r["total_ms"], reverse=True),
+            }
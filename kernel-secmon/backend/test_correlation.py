@@ -0,0 +1,102 @@
+"""
+Checks kill-chain correlation against the sequence scripts/red_team.py
+plays: hidden process, privilege escalation, rootkit load plus syscall
+hook from a child, then C2 traffic. Also checks the window, stage order,
+lineage separation and that a bad rules file keeps the previous chains.
+"""
+import sys
+import os
+import json
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from models import KernelEvent
+from correlation import CorrelationEngine
+from rules import RULES_PATH
+
+# (type, pid, parent_pid) in the order red_team.py writes them
+RED_TEAM = [
+    ("HIDDEN_PROC", 8822, 1234),
+    ("FILE_SCAN", 8822, 1234),
+    ("PRIV_ESC", 8822, 1234),
+    ("ANOMALY", 8822, 1234),
+    ("MODULE_LOAD", 9001, 8822),
+    ("SYSCALL_HOOK", 9001, 8822),
+    ("NETWORK_CONNECTION", 8822, 1234),
+]
+
+
+def event(event_type, pid, parent_pid):
+    return KernelEvent(timestamp="2026-01-01T00:00:00", pid=pid, parent_pid=parent_pid,
+                       process_name="payload.sh", severity="HIGH", type=event_type, details="test")
+
+
+def play(engine, sequence, start=1000.0, step=5.0):
+    incidents = []
+    for i, (event_type, pid, parent_pid) in enumerate(sequence):
+        incidents.extend(engine.observe(event(event_type, pid, parent_pid), start + i * step))
+    return incidents
+
+
+def test_red_team_sequence():
+    print("=" * 60)
+    print("Checking the red team sequence against the shipped chains")
+    print("=" * 60)
+    engine = CorrelationEngine.from_file(RULES_PATH)
+    incidents = play(engine, RED_TEAM)
+    assert len(incidents) == 1, incidents
+    incident = incidents[0]
+    print(f"Incident: {incident['details']}")
+    assert incident["chain"] == "rootkit-kill-chain"
+    assert incident["type"] == "CORRELATED_INCIDENT" and incident["severity"] == "HIGH"
+    assert incident["pid"] == 1234
+    assert incident["pids"] == [8822, 9001]
+    assert engine.stats()["active_states"] == 0
+    print("✓ One incident for the lineage, raised on the C2 connection")
+
+    assert play(engine, RED_TEAM[-1:]) == []
+    print("✓ A completed chain is not reported again")
+
+
+def test_chain_constraints():
+    print("=" * 60)
+    print("Checking window, stage order and lineage separation")
+    print("=" * 60)
+    engine = CorrelationEngine.from_file(RULES_PATH)
+    assert play(engine, RED_TEAM, step=200.0) == []
+    print("✓ No incident when the sequence spans more than the window")
+
+    engine = CorrelationEngine.from_file(RULES_PATH)
+    out_of_order = [RED_TEAM[0], RED_TEAM[6], RED_TEAM[4], RED_TEAM[5], RED_TEAM[2]]
+    assert play(engine, out_of_order) == []
+    print("✓ No incident when stages arrive out of order")
+
+    engine = CorrelationEngine.from_file(RULES_PATH)
+    # The rootkit stage comes from an unrelated lineage
+    split = RED_TEAM[:4] + [("MODULE_LOAD", 7001, 7000), ("SYSCALL_HOOK", 7001, 7000)] + RED_TEAM[6:]
+    assert play(engine, split) == []
+    print("✓ Events of another lineage do not advance the chain")
+
+
+def test_reload_keeps_previous_chains():
+    print("=" * 60)
+    print("Checking that a failed chain reload keeps the previous chains")
+    print("=" * 60)
+    engine = CorrelationEngine.from_file(RULES_PATH)
+    path = os.path.join(tempfile.mkdtemp(), "rules.json")
+    for bad in ([], {"chains": {}}, {"chains": ["x"]}, {"chains": [{"id": "c", "stages": [{"any": ["A"]}]}]},
+                {"chains": [{"id": "c", "stages": ["A", "B"]}]}):
+        with open(path, "w") as f:
+            json.dump(bad, f)
+        assert engine.reload(path) is False, bad
+        assert engine.last_error
+        assert [chain.id for chain in engine.chains] == ["rootkit-kill-chain"]
+    assert len(play(engine, RED_TEAM)) == 1
+    print(f"✓ Bad files rejected, last error: {engine.last_error}")
+
+
+if __name__ == "__main__":
+    test_red_team_sequence()
+    test_chain_constraints()
+    test_reload_keeps_previous_chains()
@@ -1,21 +1,100 @@
 """
 Test script to verify Gemini AI integration for XAI explanations and knowledge graphs.
+
+Runs against a local stand-in for the Gemini REST API, so no API key or
+network access is needed: the stand-in answers generateContent requests,
+counts them, and sleeps when the prompt asks it to (details containing
+"SLOW") to exercise deadlines and the concurrency cap.
 """
 import sys
 import os
+import asyncio
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInGemini(BaseHTTPRequestHandler):
+    calls = 0
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        cls = StandInGemini
+        with cls.lock:
+            cls.calls += 1
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            prompt = json.loads(body)["contents"][0]["parts"][0]["text"]
+            event_type = re.search(r"Event Type: (\S+)", prompt).group(1)
+            time.sleep(2.0 if "SLOW" in prompt else 0.3)
+            if "streamGenerateContent" in self.path:
+                return self.stream(["Stand-in ", "analysis ", f"of {event_type}."])
+            answer = json.dumps({"candidates": [{
+                "content": {"role": "model", "parts": [{"text": f"Stand-in analysis of {event_type}."}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(answer)))
+            self.end_headers()
+            self.wfile.write(answer)
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def stream(self, pieces):
+        """streamGenerateContent over REST: a JSON array written one element at a time."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        for i, piece in enumerate(pieces):
+            chunk = json.dumps({"candidates": [{
+                "content": {"role": "model", "parts": [{"text": piece}]},
+                "index": 0,
+            }]})
+            self.wfile.write((("[" if i == 0 else ",") + chunk).encode())
+            self.wfile.flush()
+            time.sleep(0.2)
+        self.wfile.write(b"]")
+
+    def log_message(self, *args):
+        pass
+
+    @classmethod
+    def reset(cls):
+        cls.calls = cls.active = cls.max_active = 0
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), StandInGemini)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+
+# Point the service at the stand-in before it is imported
+os.environ["GEMINI_API_KEY"] = "stand-in-key"
+os.environ["GEMINI_API_ENDPOINT"] = f"http://127.0.0.1:{server.server_port}"
+os.environ["GEMINI_MAX_CONCURRENCY"] = "2"
+os.environ["GEMINI_DEADLINE_SECONDS"] = "1"
 
 # Add parent directory to path to import backend modules
 sys.path.insert(0, os.path.dirname(__file__))
 
-from gemini_service import generate_xai_explanation, generate_knowledge_graph_data
-import json
+import gemini_service
+from gemini_service import (generate_xai_explanation, generate_xai_explanation_async, stream_xai_explanation_async,
+                            generate_knowledge_graph_data)
+
 
 def test_xai_explanation():
     print("=" * 60)
     print("Testing XAI Explanation Generation")
     print("=" * 60)
-    
-    # Test case 1: Privilege Escalation
+    StandInGemini.reset()
+
     print("\n[Test 1] Privilege Escalation Event")
     explanation = generate_xai_explanation(
         event_type="PRIV_ESC",
@@ -25,8 +104,9 @@ def test_xai_explanation():
         details="UID transition from 1000 to 0 without execve"
     )
     print(f"Explanation: {explanation}\n")
-    
-    # Test case 2: Hidden Process
+    assert explanation == "Stand-in analysis of PRIV_ESC.", explanation
+    assert StandInGemini.calls == 1
+
     print("[Test 2] Hidden Process Event")
     explanation = generate_xai_explanation(
         event_type="HIDDEN_PROCESS",
@@ -36,23 +116,106 @@ def test_xai_explanation():
         details="Process visible in task_struct but missing from /proc"
     )
     print(f"Explanation: {explanation}\n")
-    
-    # Test case 3: Syscall Hook
-    print("[Test 3] Syscall Hook Event")
-    explanation = generate_xai_explanation(
-        event_type="SYSCALL_HOOK",
-        process_name="kernel_module",
-        pid=0,
-        severity="HIGH",
-        details="sys_call_table[__NR_read] modified to 0xffffffffc0123456"
-    )
-    print(f"Explanation: {explanation}\n")
+    assert explanation == "Stand-in analysis of HIDDEN_PROCESS.", explanation
+
+
+def test_coalescing():
+    print("=" * 60)
+    print("Testing Request Coalescing")
+    print("=" * 60)
+    StandInGemini.reset()
+
+    async def run():
+        return await asyncio.gather(*[
+            generate_xai_explanation_async("SYSCALL_HOOK", "kernel_module", 0, "HIGH",
+                                           "sys_call_table[__NR_read] modified", key="same-event")
+            for _ in range(10)
+        ])
+
+    results = asyncio.run(run())
+    print(f"10 concurrent requests -> {StandInGemini.calls} upstream call(s)")
+    assert StandInGemini.calls == 1, StandInGemini.calls
+    assert set(results) == {"Stand-in analysis of SYSCALL_HOOK."}, results
+    print("✓ Concurrent requests for the same event share one call")
+
+
+def test_concurrency_cap():
+    print("=" * 60)
+    print("Testing Global Concurrency Cap")
+    print("=" * 60)
+    StandInGemini.reset()
+
+    async def run():
+        return await asyncio.gather(*[
+            generate_xai_explanation_async("PRIV_ESC", f"proc{i}", i, "HIGH", "UID transition", key=f"event-{i}")
+            for i in range(6)
+        ])
+
+    results = asyncio.run(run())
+    print(f"6 distinct requests -> {StandInGemini.calls} calls, at most {StandInGemini.max_active} at once")
+    assert StandInGemini.calls == 6
+    assert StandInGemini.max_active <= gemini_service.GEMINI_MAX_CONCURRENCY
+    assert all(results)
+    print("✓ Upstream concurrency stays within GEMINI_MAX_CONCURRENCY")
+
+
+def test_deadline_fallback():
+    print("=" * 60)
+    print("Testing Deadline and Late Results")
+    print("=" * 60)
+    StandInGemini.reset()
+    late = []
+
+    async def run():
+        start = time.perf_counter()
+        result = await generate_xai_explanation_async("KERNEL_MODULE", "crypto_miner", 4242, "HIGH",
+                                                      "SLOW unsigned module", key="slow-event", on_result=late.append)
+        waited = time.perf_counter() - start
+        # The event loop stays free while the upstream call is outstanding
+        ticks = 0
+        while not late and ticks < 50:
+            await asyncio.sleep(0.1)
+            ticks += 1
+        return result, waited
+
+    result, waited = asyncio.run(run())
+    print(f"Caller gave up after {waited:.2f}s with {result!r}; late answer: {late}")
+    assert result is None
+    assert waited < gemini_service.GEMINI_DEADLINE_SECONDS + 0.5
+    assert late == ["Stand-in analysis of KERNEL_MODULE."]
+    assert gemini_service.get_ai_stats()["timeouts"] >= 1
+    print("✓ Slow calls fall back at the deadline and still deliver their result")
+
+
+def test_streaming():
+    print("=" * 60)
+    print("Testing Streamed Explanations")
+    print("=" * 60)
+    StandInGemini.reset()
+    stored = []
+
+    async def run():
+        start = time.perf_counter()
+        chunks = []
+        async for text in stream_xai_explanation_async("HIDDEN_PROCESS", "rootkit_daemon", 6666, "HIGH",
+                                                       "missing from /proc", key="stream-event", on_result=stored.append):
+            chunks.append((text, time.perf_counter() - start))
+        return chunks
+
+    chunks = asyncio.run(run())
+    print(f"Chunks (text, seconds): {chunks}")
+    assert [text for text, _ in chunks] == ["Stand-in ", "analysis ", "of HIDDEN_PROCESS."], chunks
+    assert chunks[0][1] < chunks[-1][1] - 0.3, "first chunk should arrive well before the last"
+    assert stored == ["Stand-in analysis of HIDDEN_PROCESS."]
+    assert StandInGemini.calls == 1
+    print("✓ Tokens arrive incrementally and the full text reaches on_result")
+
 
 def test_knowledge_graph():
     print("=" * 60)
     print("Testing Knowledge Graph Generation")
     print("=" * 60)
-    
+
     print("\n[Test] Process Lineage Graph for Suspicious Process")
     graph = generate_knowledge_graph_data(
         event_type="PRIV_ESC",
@@ -60,36 +223,42 @@ def test_knowledge_graph():
         pid=9999,
         details="Spawned from web server, escalated to root"
     )
-    
+
     print(f"\nGenerated Graph Structure:")
     print(json.dumps(graph, indent=2))
-    
+
     # Validate structure
     assert "nodes" in graph, "Graph missing 'nodes' field"
     assert "links" in graph, "Graph missing 'links' field"
     assert len(graph["nodes"]) >= 3, "Graph should have at least 3 nodes"
-    
+
     # Check for TARGET node
     target_found = any(node.get("type") == "TARGET" for node in graph["nodes"])
     assert target_found, "Graph should have a TARGET node"
-    
+
     print("\n✓ Graph structure validation passed!")
 
 if __name__ == "__main__":
     print("\n🚀 Starting Gemini AI Integration Tests\n")
-    
+
     try:
         test_xai_explanation()
+        test_coalescing()
+        test_concurrency_cap()
+        test_deadline_fallback()
+        test_streaming()
         test_knowledge_graph()
-        
+
         print("\n" + "=" * 60)
         print("✅ All tests completed successfully!")
         print("=" * 60)
         print("\nGemini AI integration is working correctly.")
         print("XAI explanations and knowledge graphs are being generated.")
-        
+
     except Exception as e:
         print(f"\n❌ Test failed with error: {e}")
         import traceback
         traceback.print_exc()
         sys.exit(1)
+    finally:
+        server.shutdown()
@@ -0,0 +1,101 @@
+"""
+Checks indicator extraction from event details: IPv4/IPv6 addresses with
+ports, IPv4-mapped IPv6, range classification, and that kernel addresses,
+UID transitions and other numbers are not mistaken for IPs.
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from indicators import extract_indicators, public_ips
+
+
+def ips(details):
+    return [(ip["ip"], ip["version"], ip["class"], ip["port"]) for ip in extract_indicators(details)["ips"]]
+
+
+def test_addresses_and_ports():
+    print("=" * 60)
+    print("Checking IPv4/IPv6 addresses with ports")
+    print("=" * 60)
+    found = extract_indicators("Outbound connection to 185.220.101.41:4444 from 10.0.0.5:51234 via [2a01:4f8::1]:443")
+    assert [(ip["ip"], ip["version"], ip["port"]) for ip in found["ips"]] == [
+        ("185.220.101.41", 4, 4444), ("10.0.0.5", 4, 51234), ("2a01:4f8::1", 6, 443),
+    ], found["ips"]
+    assert found["ports"] == [4444, 51234, 443]
+    assert ips("DNS query to 8.8.8.8, dport=53 then port 853") == [("8.8.8.8", 4, "global", None)]
+    assert extract_indicators("DNS query to 8.8.8.8, dport=53 then port 853")["ports"] == [53, 853]
+    assert ips("peer 2001:4860:4860::8888 and 2001:4860:4860:0:0:0:0:8888") == [("2001:4860:4860::8888", 6, "global", None)]
+    assert ips("link fe80::1%eth0 up") == [("fe80::1", 6, "link_local", None)]
+    assert ips("to 1.2.3.4:99999") == [("1.2.3.4", 4, "global", None)]
+    print("✓ Addresses, ports and duplicates")
+
+
+def test_mapped_addresses():
+    print("=" * 60)
+    print("Checking IPv4-mapped IPv6")
+    print("=" * 60)
+    assert ips("accept from ::ffff:45.142.212.61") == [("45.142.212.61", 4, "global", None)]
+    assert ips("accept from [::ffff:192.168.1.10]:22") == [("192.168.1.10", 4, "private", 22)]
+    assert ips("::ffff:8.8.8.8 then 8.8.8.8") == [("8.8.8.8", 4, "global", None)]
+    print("✓ Mapped addresses are reported as IPv4")
+
+
+def test_classification():
+    print("=" * 60)
+    print("Checking address classification")
+    print("=" * 60)
+    cases = {
+        "10.1.2.3": "private", "172.16.0.1": "private", "172.31.255.255": "private", "172.32.0.1": "global",
+        "192.168.0.1": "private", "100.64.0.1": "cgnat", "100.127.255.254": "cgnat", "100.128.0.1": "global",
+        "169.254.1.1": "link_local", "127.0.0.1": "loopback", "224.0.0.251": "multicast",
+        "203.0.113.9": "documentation", "0.0.0.0": "unspecified", "255.255.255.255": "broadcast",
+        "fe80::abcd": "link_local", "fd00::1": "private", "ff02::1": "multicast", "::1": "loopback",
+        "2001:db8::1": "documentation", "2606:4700::1111": "global",
+    }
+    for address, expected in cases.items():
+        found = ips(f"addr {address} seen")
+        assert len(found) == 1 and found[0][2] == expected, (address, found)
+    assert public_ips("from 10.0.0.5 and 100.64.1.1 to 91.4.5.6 and 2606:4700::1111") == ["91.4.5.6", "2606:4700::1111"]
+    print(f"✓ {len(cases)} addresses classified")
+
+
+def test_not_ips():
+    print("=" * 60)
+    print("Checking that other values are not taken for IPs")
+    print("=" * 60)
+    found = extract_indicators("sys_call_table[__NR_read] modified to 0xffffffffc028a000 by module at 0xffffffffa0012345")
+    assert found["ips"] == []
+    assert found["kernel_addresses"] == [
+        {"address": "0xffffffffc028a000", "region": "module"},
+        {"address": "0xffffffffa0012345", "region": "module"},
+    ], found["kernel_addresses"]
+    assert extract_indicators("user pointer 0x00007ffd12345678")["kernel_addresses"] == []
+
+    found = extract_indicators("Changed effective UID: 1000 -> 0 (ROOT); UID transition from 33 to 0")
+    assert found["ips"] == [] and found["ports"] == []
+    assert found["uid_transitions"] == [{"from": 1000, "to": 0}, {"from": 33, "to": 0}], found["uid_transitions"]
+
+    for details in ("version 1.2.3.4.5", "build 10.0.19045.2965", "at 12:30:45", "256.1.1.1", "uid 1000:1000",
+                    "sha 1.2.3", "ratio 3:4:5"):
+        assert ips(details) == [], (details, ips(details))
+    print("✓ Kernel addresses, UIDs, versions and times are not IPs")
+
+
+def test_paths():
+    print("=" * 60)
+    print("Checking file paths")
+    print("=" * 60)
+    found = extract_indicators("Opened /etc/shadow for write; dropped /tmp/.X11-unix/.x and /dev/shm/payload.")
+    assert found["paths"] == ["/etc/shadow", "/tmp/.X11-unix/.x", "/dev/shm/payload"], found["paths"]
+    assert extract_indicators("ratio 3/4 at 10.0.0.1/24")["paths"] == []
+    print("✓ Absolute paths only")
+
+
+if __name__ == "__main__":
+    test_addresses_and_ports()
+    test_mapped_addresses()
+    test_classification()
+    test_not_ips()
+    test_paths()
@@ -0,0 +1,174 @@
+"""
+Checks the write-behind ingest pipeline: a bad event in a group commit
+only loses itself, analysis failures do not stop publishing, stop() waits
+for the commit in flight, and /api/ingest/batch queues a batch whole or
+rejects it whole.
+"""
+import sys
+import os
+import asyncio
+import tempfile
+import threading
+import time
+
+# Point the backend at a throwaway database before it opens any connection
+os.environ["SECMON_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "ingest.db")
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient
+from ingest_queue import IngestPipeline
+
+
+class Store:
+    """Records stored events; refuses any batch containing `poison`."""
+
+    def __init__(self, poison=None, delay=0.0):
+        self.poison = poison
+        self.delay = delay
+        self.stored = []
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, events):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.poison in events:
+            raise ValueError("constraint failed")
+        with self.lock:
+            self.stored.extend(events)
+        return list(range(len(events)))
+
+
+def run_pipeline(store, events, process=lambda e: [e], **kwargs):
+    published = []
+
+    async def publish(message):
+        published.append(message)
+
+    async def scenario():
+        pipeline = IngestPipeline(store, process, publish, **kwargs)
+        pipeline.start()
+        assert pipeline.enqueue_many(events)
+        await asyncio.sleep(0.3)
+        await pipeline.stop()
+        return pipeline
+
+    return asyncio.run(scenario()), published
+
+
+def test_bad_event_isolated():
+    print("=" * 60)
+    print("Checking that a failing group commit is retried event by event")
+    print("=" * 60)
+    store = Store(poison=3)
+    pipeline, published = run_pipeline(store, list(range(10)), batch_size=10)
+    assert store.stored == [0, 1, 2, 4, 5, 6, 7, 8, 9], store.stored
+    assert published == store.stored
+    stats = pipeline.stats()
+    assert stats["flushed"] == 9 and stats["failed"] == 1 and stats["split_batches"] == 1, stats
+    print("✓ 9 of 10 events stored and published, the bad one counted as failed")
+
+
+def test_process_failure_isolated():
+    print("=" * 60)
+    print("Checking that an analysis failure does not stop publishing")
+    print("=" * 60)
+
+    def process(event):
+        if event == 5:
+            raise RuntimeError("analysis bug")
+        return [event]
+
+    store = Store()
+    pipeline, published = run_pipeline(store, list(range(10)), process=process, batch_size=10)
+    assert store.stored == list(range(10))
+    assert published == [0, 1, 2, 3, 4, 6, 7, 8, 9], published
+    assert pipeline.stats()["process_errors"] == 1
+    print("✓ Every stored event except the failing one was published")
+
+
+def test_stop_waits_for_inflight_flush():
+    print("=" * 60)
+    print("Checking that stop() lets the commit in flight finish")
+    print("=" * 60)
+    store = Store(delay=0.3)
+
+    async def publish(message):
+        pass
+
+    async def scenario():
+        pipeline = IngestPipeline(store, lambda e: [], publish, batch_size=5, flush_ms=1)
+        pipeline.start()
+        pipeline.enqueue_many(list(range(5)))
+        await asyncio.sleep(0.05)   # first batch is now in the worker thread
+        pipeline.enqueue_many(list(range(5, 12)))
+        await pipeline.stop()
+        # Nothing may still be writing once stop() returns
+        calls = store.calls
+        await asyncio.sleep(0.4)
+        assert store.calls == calls
+        return pipeline
+
+    pipeline = asyncio.run(scenario())
+    assert sorted(store.stored) == list(range(12)), store.stored
+    assert pipeline.stats()["flushed"] == 12
+    print("✓ All 12 events stored before stop() returned")
+
+
+def test_enqueue_many_all_or_nothing():
+    print("=" * 60)
+    print("Checking that enqueue_many queues a batch whole or not at all")
+    print("=" * 60)
+
+    async def scenario():
+        pipeline = IngestPipeline(Store(), lambda e: [], None, max_size=5)
+        pipeline.queue = asyncio.Queue(maxsize=5)
+        assert pipeline.enqueue_many([1, 2, 3])
+        assert not pipeline.enqueue_many([4, 5, 6])
+        assert pipeline.queue.qsize() == 3 and pipeline.capacity() == 2
+        assert pipeline.enqueue_many([4, 5])
+        return pipeline
+
+    stats = asyncio.run(scenario()).stats()
+    assert stats["enqueued"] == 5 and stats["rejected"] == 3, stats
+    print("✓ An oversized batch is rejected without queuing any of it")
+
+
+def test_batch_endpoint():
+    print("=" * 60)
+    print("Checking /api/ingest/batch responses")
+    print("=" * 60)
+    import main
+    event = {"timestamp": "2026-01-01T00:00:00", "pid": 1, "process_name": "bash",
+             "severity": "INFO", "type": "PROCESS_START", "details": "test"}
+    url = f"/api/ingest/batch?api_key={main.API_KEY}"
+    with TestClient(main.app) as client:
+        response = client.post(url, json=[event, {"pid": "x"}, event])
+        body = response.json()
+        assert response.status_code == 200, body
+        assert (body["status"], body["queued"], body["invalid"], body["rejected"]) == ("queued", 2, 1, 0)
+        assert [r["status"] for r in body["results"]] == ["queued", "invalid", "queued"]
+        print("✓ Valid events queued, invalid ones reported")
+
+        response = client.post(url, json=[{"pid": "x"}])
+        assert response.status_code == 400 and response.json()["queued"] == 0
+        print("✓ Nothing valid: 400, not 'queued'")
+
+        max_size = main.pipeline.max_size
+        main.pipeline.max_size = main.pipeline.queue.qsize() + 1
+        try:
+            response = client.post(url, json=[event, event])
+        finally:
+            main.pipeline.max_size = max_size
+        body = response.json()
+        assert response.status_code == 503 and response.headers["retry-after"], body
+        assert (body["status"], body["queued"], body["rejected"]) == ("queue_full", 0, 2)
+        print("✓ A batch that does not fit is rejected whole with 503")
+
+
+if __name__ == "__main__":
+    test_bad_event_isolated()
+    test_process_failure_isolated()
+    test_stop_waits_for_inflight_flush()
+    test_enqueue_many_all_or_nothing()
+    test_batch_endpoint()
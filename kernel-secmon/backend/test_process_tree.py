@@ -0,0 +1,63 @@
+"""
+Checks the shape of /api/processes/tree: the first request (no ?since)
+must be a full payload the frontend's applyDelta can consume, and later
+requests return deltas against the version it carried.
+"""
+import sys
+import os
+import tempfile
+
+# Point the backend at a throwaway database before it opens any connection
+os.environ["SECMON_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "tree.db")
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient
+import main
+from models import KernelEvent
+
+DELTA_KEYS = {"version", "full", "nodes", "links", "removed"}
+
+
+def observe(pid, parent_pid, name):
+    main.process_graph.observe(KernelEvent(
+        timestamp="2026-01-01T00:00:00", pid=pid, parent_pid=parent_pid,
+        process_name=name, severity="INFO", type="PROCESS_START", details="test"
+    ))
+
+
+def test_tree_without_since():
+    print("=" * 60)
+    print("Checking /api/processes/tree without ?since")
+    print("=" * 60)
+    observe(100, 1, "bash")
+    observe(101, 100, "nc")
+    with TestClient(main.app) as client:
+        body = client.get("/api/processes/tree").json()
+    print(f"Keys: {sorted(body)}")
+    assert DELTA_KEYS <= set(body), body
+    assert body["full"] is True
+    assert body["removed"] == []
+    assert body["version"] == main.process_graph.version
+    assert {"100", "101"} <= {node["id"] for node in body["nodes"]}
+    print("✓ First request is a full delta payload")
+
+
+def test_tree_delta_since():
+    print("=" * 60)
+    print("Checking /api/processes/tree?since=<version>")
+    print("=" * 60)
+    with TestClient(main.app) as client:
+        version = client.get("/api/processes/tree").json()["version"]
+        observe(102, 100, "curl")
+        body = client.get(f"/api/processes/tree?since={version}").json()
+        unchanged = client.get(f"/api/processes/tree?since={body['version']}")
+    assert DELTA_KEYS <= set(body), body
+    assert body["full"] is False
+    assert [node["id"] for node in body["nodes"]] == ["102"]
+    assert unchanged.status_code == 304
+    print("✓ Later requests return only what changed")
+
+
+if __name__ == "__main__":
+    test_tree_without_since()
+    test_tree_delta_since()
@@ -0,0 +1,35 @@
+"""
+Regression check for the query plans of the hot read paths.
+Runs the migrations on a scratch database and fails if any hot query
+falls back to a full scan or a temp sort.
+"""
+import sys
+import os
+import tempfile
+
+# Point the backend at a throwaway database before it opens any connection
+os.environ["SECMON_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "plans.db")
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import init_db, check_query_plans, explain, HOT_QUERIES, SCHEMA_VERSION
+from db_pool import pool
+
+def test_query_plans():
+    print("=" * 60)
+    print(f"Checking query plans (schema version {SCHEMA_VERSION})")
+    print("=" * 60)
+    init_db()
+    for name, (sql, params, _, _) in HOT_QUERIES.items():
+        print(f"{name:20} {' | '.join(explain(sql, params))}")
+
+    problems = check_query_plans()
+    for problem in problems:
+        print(f"✗ {problem}")
+    assert not problems, f"{len(problems)} query plan regression(s)"
+    print("✓ All hot queries use their indexes")
+
+if __name__ == "__main__":
+    try:
+        test_query_plans()
+    finally:
+        pool.close()
@@ -0,0 +1,130 @@
+"""
+Checks offline IP reputation: longest-prefix matching in PrefixTable for
+IPv4, IPv6 and IPv4-mapped addresses, feed parsing (comments and blank
+lines before a CSV header), and that a feed that fails to parse keeps the
+previous table.
+"""
+import sys
+import os
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from reputation import PrefixTable, ReputationEngine
+
+
+def build(*entries):
+    table = PrefixTable()
+    for network, score, feed in entries:
+        table.add(network, score, feed)
+    return table.freeze()
+
+
+def write_feed(directory, name, text):
+    with open(os.path.join(directory, name), "w") as f:
+        f.write(text)
+
+
+def test_longest_prefix_match():
+    print("=" * 60)
+    print("Checking longest-prefix matching")
+    print("=" * 60)
+    table = build(
+        ("10.0.0.0/8", 10, "wide"),
+        ("10.1.0.0/16", 20, "mid"),
+        ("10.1.2.0/24", 30, "narrow"),
+        ("10.1.2.3", 40, "host"),
+        ("2001:db8::/32", 50, "v6-wide"),
+        ("2001:db8:1::/48", 60, "v6-narrow"),
+        ("0.0.0.0/0", 1, "default"),
+    )
+    cases = {
+        "10.1.2.3": "host",
+        "10.1.2.4": "narrow",
+        "10.1.3.1": "mid",
+        "10.200.0.1": "wide",
+        "11.0.0.1": "default",
+        "::ffff:10.1.2.3": "host",
+        "2001:db8:1::5": "v6-narrow",
+        "2001:db8:2::5": "v6-wide",
+    }
+    for ip, feed in cases.items():
+        entry = table.lookup(ip)
+        assert entry is not None and entry[1] == feed, (ip, entry)
+    assert table.lookup("2001:db9::1") is None
+    assert table.lookup("not-an-ip") is None
+    assert table.lookup("10.1.2.7")[3] == "10.1.2.0/24"
+    assert table.prefix_lengths() == {"ipv4": [32, 24, 16, 8, 0], "ipv6": [48, 32]}
+    print(f"✓ {len(cases)} lookups hit the most specific network")
+
+
+def test_add_rules():
+    print("=" * 60)
+    print("Checking entry normalization and duplicates")
+    print("=" * 60)
+    table = build(
+        ("192.0.2.77/24", 10, "a"),     # host bits are dropped
+        ("192.0.2.0/24", 90, "b"),      # higher score wins
+        ("192.0.2.0/24", 50, "c"),      # lower score is ignored
+        ("::ffff:198.51.100.0/120", 70, "mapped"),
+    )
+    assert table.entries == 2
+    assert table.lookup("192.0.2.1")[:2] == (90, "b")
+    assert table.lookup("198.51.100.9")[1:] == ("mapped", None, "198.51.100.0/24")
+    for bad in ("10.0.0.0/33", "10.0.0.0/x", "300.1.1.1", "2001:db8::/129"):
+        try:
+            PrefixTable().add(bad, 1, "bad")
+        except ValueError:
+            continue
+        raise AssertionError(f"{bad} accepted")
+    print("✓ Host bits dropped, higher score kept, invalid networks refused")
+
+
+def test_feeds():
+    print("=" * 60)
+    print("Checking feed parsing")
+    print("=" * 60)
+    directory = tempfile.mkdtemp()
+    write_feed(directory, "scanners.txt", "# scanners\n\n198.51.100.7  ; seen 2026-01-01\n203.0.113.0/24 # block\nbogus\n")
+    write_feed(directory, "scored.csv", "# exported feed\n\n,,\nscore,network,category\n90,45.142.212.61,c2\n40,89.248.0.0/16,scanner\nx,1.2.3.4,\n")
+    engine = ReputationEngine(directory)
+    assert engine.feeds == {
+        "scanners": {"file": "scanners.txt", "entries": 2, "skipped": 1},
+        "scored": {"file": "scored.csv", "entries": 2, "skipped": 1},
+    }, engine.feeds
+    assert engine.lookup("45.142.212.61") == (90, "scored", "c2", "45.142.212.61/32")
+    assert engine.lookup("89.248.165.181")[:3] == (40, "scored", "scanner")
+    assert engine.lookup("203.0.113.9")[:2] == (100, "scanners")
+    assert engine.lookup("8.8.8.8") is None
+    print("✓ Header found after comments and blank lines; bad rows skipped")
+
+
+def test_reload_failure_and_refresh():
+    print("=" * 60)
+    print("Checking reload failures and refresh")
+    print("=" * 60)
+    directory = tempfile.mkdtemp()
+    write_feed(directory, "list.txt", "198.51.100.7\n")
+    engine = ReputationEngine(directory)
+    assert engine.refresh() is False
+
+    # A field beyond the csv module's size limit raises csv.Error
+    write_feed(directory, "broken.csv", "network,score\n\"" + "x" * 200_000 + "\",10\n")
+    assert engine.refresh() is False
+    assert engine.last_error and engine.last_error.startswith("Error"), engine.last_error
+    assert engine.lookup("198.51.100.7") is not None and "broken" not in engine.feeds
+    print(f"✓ Previous table kept: {engine.last_error[:60]}")
+
+    os.remove(os.path.join(directory, "broken.csv"))
+    write_feed(directory, "more.txt", "203.0.113.5\n")
+    assert engine.refresh() is True
+    assert engine.last_error is None
+    assert engine.lookup("203.0.113.5") is not None
+    print("✓ refresh() picks up changed feeds")
+
+
+if __name__ == "__main__":
+    test_longest_prefix_match()
+    test_add_rules()
+    test_feeds()
+    test_reload_failure_and_refresh()
@@ -0,0 +1,215 @@
+"""
+Checks the detection rule loader and operators: malformed rules files are
+rejected at compile time with the previous ruleset kept, each operator
+matches what it should, and a rule that fails at evaluation time does not
+stop the others.
+"""
+import sys
+import os
+import json
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from models import KernelEvent
+from rules import RuleEngine, RuleError, compile_rules
+from correlation import CorrelationEngine
+
+GOOD = {"rules": [
+    {"id": "critical", "all": [{"field": "severity", "equals": "HIGH"}], "message": "Critical: {type} in {process_name}"},
+]}
+
+MALFORMED = {
+    "top-level list": [{"id": "x"}],
+    "rules not a list": {"rules": {"id": "x"}},
+    "non-object rule": {"rules": ["critical"]},
+    "missing threshold count": {"rules": [{"id": "burst", "threshold": {"window_seconds": 60}}]},
+    "positional message field": {"rules": [{"id": "pos", "message": "{0} hit"}]},
+    "unknown message field": {"rules": [{"id": "unk", "message": "{user} hit"}]},
+    "unknown condition field": {"rules": [{"id": "f", "all": [{"field": "uid", "equals": 0}]}]},
+    "condition without operator": {"rules": [{"id": "op", "all": [{"field": "pid"}]}]},
+    "bad regex": {"rules": [{"id": "re", "all": [{"field": "details", "regex": "("}]}]},
+    "non-numeric bound": {"rules": [{"id": "b", "all": [{"field": "pid", "gte": "10"}]}]},
+    "duplicate ids": {"rules": [{"id": "d"}, {"id": "d"}]},
+}
+
+
+def event(**fields):
+    values = {"timestamp": "2026-01-01T00:00:00", "pid": 100, "process_name": "bash",
+              "severity": "INFO", "type": "PROCESS_START", "details": "test"}
+    values.update(fields)
+    return KernelEvent(**values)
+
+
+def engine_for(spec):
+    path = os.path.join(tempfile.mkdtemp(), "rules.json")
+    with open(path, "w") as f:
+        json.dump(spec, f)
+    return RuleEngine(path, reload_interval=3600), path
+
+
+def test_malformed_rules_rejected():
+    print("=" * 60)
+    print("Checking that malformed rules files are rejected")
+    print("=" * 60)
+    for name, spec in MALFORMED.items():
+        try:
+            compile_rules(spec)
+        except RuleError as e:
+            print(f"✓ {name}: {e}")
+        else:
+            raise AssertionError(f"{name} compiled")
+
+
+def test_reload_keeps_previous_ruleset():
+    print("=" * 60)
+    print("Checking that a failed reload keeps the previous ruleset")
+    print("=" * 60)
+    engine, path = engine_for(GOOD)
+    assert [rule.id for rule in engine.rules] == ["critical"]
+    for name, spec in MALFORMED.items():
+        with open(path, "w") as f:
+            json.dump(spec, f)
+        assert engine.reload() is False, name
+        assert engine.last_error, name
+        assert engine.evaluate(event(severity="HIGH")) == ["Critical: PROCESS_START in bash"], name
+    with open(path, "w") as f:
+        f.write("{not json")
+    assert engine.reload() is False
+    print(f"✓ {len(MALFORMED) + 1} bad files rejected, last error: {engine.last_error}")
+
+    with open(path, "w") as f:
+        json.dump(GOOD, f)
+    assert engine.reload() is True
+    assert engine.last_error is None
+    print("✓ A good file is picked up again")
+
+
+def test_operators():
+    print("=" * 60)
+    print("Checking the condition operators")
+    print("=" * 60)
+    engine, _ = engine_for({"rules": [
+        {"id": "equals", "all": [{"field": "process_name", "equals": "NC", "ignore_case": True}]},
+        {"id": "in", "all": [{"field": "pid", "in": [1, 2, 3]}]},
+        {"id": "contains", "all": [{"field": "details", "contains": "/dev/shm"}]},
+        {"id": "regex", "all": [{"field": "details", "regex": "\\bunsigned\\b", "ignore_case": True}]},
+        {"id": "range", "all": [{"field": "parent_pid", "gte": 10, "lte": 20}]},
+        {"id": "any", "any": [{"field": "type", "contains": "HOOK"}, {"field": "severity", "equals": "HIGH"}]},
+        {"id": "typed", "types": ["MODULE_LOAD"], "message": "{rule_id}:{type}"},
+    ]})
+    cases = [
+        (event(process_name="nc"), {"equals"}),
+        (event(pid=2), {"in"}),
+        (event(details="exec from /dev/shm/payload"), {"contains"}),
+        (event(details="Unsigned module"), {"regex"}),
+        (event(details="unsignedness"), set()),
+        (event(parent_pid=10), {"range"}),
+        (event(parent_pid=21), set()),
+        (event(type="SYSCALL_HOOK"), {"any"}),
+        (event(severity="HIGH"), {"any"}),
+        (event(type="MODULE_LOAD"), {"typed"}),
+    ]
+    for e, expected in cases:
+        engine.evaluate(e)
+    for e, expected in cases:
+        before = {rule_id: s["hits"] for rule_id, s in engine.stats.items()}
+        messages = engine.evaluate(e)
+        fired = {rule_id for rule_id, s in engine.stats.items() if s["hits"] > before[rule_id]}
+        assert fired == expected, (e, fired, messages)
+    assert engine.evaluate(event(type="MODULE_LOAD")) == ["typed:MODULE_LOAD"]
+    print(f"✓ {len(cases)} operator cases matched")
+
+
+def test_threshold():
+    print("=" * 60)
+    print("Checking threshold rules")
+    print("=" * 60)
+    engine, _ = engine_for({"rules": [
+        {"id": "burst", "types": ["NETWORK_CONNECTION"], "message": "Burst {pid}",
+         "threshold": {"count": 3, "window_seconds": 60}},
+    ]})
+    fired = [engine.evaluate(event(type="NETWORK_CONNECTION")) for _ in range(5)]
+    assert fired == [[], [], ["Burst 100"], [], []], fired
+    print("✓ Fires once when the count is reached")
+
+    # Replayed events counted at their own time: 30s apart never reach 3 per 60s
+    engine, _ = engine_for({"rules": [
+        {"id": "burst", "types": ["NETWORK_CONNECTION"], "message": "Burst {pid}",
+         "threshold": {"count": 3, "window_seconds": 60}},
+    ]})
+    fired = [engine.evaluate(event(type="NETWORK_CONNECTION"), 1000.0 + i * 30) for i in range(5)]
+    assert fired == [[], [], [], [], []], fired
+    fired = [engine.evaluate(event(type="NETWORK_CONNECTION", pid=7), 2000.0 + i) for i in range(3)]
+    assert fired == [[], [], ["Burst 7"]], fired
+    print("✓ Windows run on the event time passed in")
+
+
+def test_plans_bounded():
+    print("=" * 60)
+    print("Checking that per-type plans are bounded")
+    print("=" * 60)
+    _, path = engine_for(GOOD)
+    engine = RuleEngine(path, reload_interval=3600, max_plans=8)
+    for i in range(100):
+        engine.evaluate(event(type=f"RANDOM_{i}", severity="HIGH"))
+    assert len(engine.plans) == 8
+    assert engine.evaluate(event(type="RANDOM_0", severity="HIGH")) == ["Critical: RANDOM_0 in bash"]
+    print("✓ Plan cache stays at max_plans and evicted types still match")
+
+
+def test_failing_rule_isolated():
+    print("=" * 60)
+    print("Checking that a rule failing at evaluation time is isolated")
+    print("=" * 60)
+    engine, _ = engine_for({"rules": [
+        # Compiles (numeric bound) but compares a string field with a number
+        {"id": "broken", "all": [{"field": "details", "gte": 5}]},
+        {"id": "critical", "all": [{"field": "severity", "equals": "HIGH"}], "message": "Critical: {type}"},
+    ]})
+    assert engine.evaluate(event(severity="HIGH")) == ["Critical: PROCESS_START"]
+    stats = {rule["id"]: rule for rule in engine.get_stats()["rules"]}
+    assert stats["broken"]["errors"] == 1 and stats["broken"]["hits"] == 0
+    assert stats["critical"]["hits"] == 1
+    print("✓ The other rules still fire and the error is counted")
+
+
+def test_chains_reload_with_rules():
+    print("=" * 60)
+    print("Checking that chains reload with the rules, all or nothing")
+    print("=" * 60)
+    chain = {"id": "esc-then-c2", "stages": [{"any": ["PRIV_ESC"]}, {"any": ["NETWORK_CONNECTION"]}]}
+    path = os.path.join(tempfile.mkdtemp(), "rules.json")
+    with open(path, "w") as f:
+        json.dump({**GOOD, "chains": [chain]}, f)
+    correlation = CorrelationEngine()
+    engine = RuleEngine(path, reload_interval=0, sections=[correlation])
+    assert [c.id for c in correlation.chains] == ["esc-then-c2"]
+
+    # Edited on disk: the mtime check picks up rules and chains together
+    renamed = {**chain, "id": "renamed"}
+    with open(path, "w") as f:
+        json.dump({"rules": [{**GOOD["rules"][0], "id": "critical-v2"}], "chains": [renamed]}, f)
+    os.utime(path, (1, 1))
+    engine.evaluate(event())
+    assert [r.id for r in engine.rules] == ["critical-v2"]
+    assert [c.id for c in correlation.chains] == ["renamed"]
+    print("✓ A file edit reloads the rules and the chains")
+
+    # Valid rules but a broken chain: neither section changes
+    with open(path, "w") as f:
+        json.dump({"rules": [{**GOOD["rules"][0], "id": "critical-v3"}], "chains": [{"id": "bad", "stages": []}]}, f)
+    assert engine.reload() is False
+    assert [r.id for r in engine.rules] == ["critical-v2"]
+    assert [c.id for c in correlation.chains] == ["renamed"]
+    print(f"✓ A bad chain keeps both sections: {engine.last_error}")
+
+
+if __name__ == "__main__":
+    test_malformed_rules_rejected()
+    test_reload_keeps_previous_ruleset()
+    test_operators()
+    test_threshold()
+    test_plans_bounded()
+    test_failing_rule_isolated()
+    test_chains_reload_with_rules()
@@ -1,151 +1,143 @@
 import requests
 import sqlite3
-import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import os
 from dotenv import load_dotenv
+from db_pool import reader, writer
+from reputation import reputation_engine
+from indicators import public_ips
 
 load_dotenv()
 
 ABUSEIPDB_API_KEY = os.getenv("ABUSEIPDB_API_KEY", "")
 ABUSEIPDB_API_URL = "https://api.abuseipdb.com/api/v2/check"
 CACHE_DURATION_HOURS = 24
-DB_PATH = "kernel_secmon.db"
+# Air-gapped sensors: answer from the local reputation feeds only, never call AbuseIPDB
+THREAT_INTEL_OFFLINE = os.getenv("THREAT_INTEL_OFFLINE", "").lower() in ("1", "true", "yes")
+# In-process tier in front of threat_intel_cache (overridable via environment)
+THREAT_INTEL_MEMORY_ENTRIES = int(os.getenv("THREAT_INTEL_MEMORY_ENTRIES", "4096"))
+# Errors and the no-API-key placeholder are remembered this long, in memory only
+NEGATIVE_CACHE_SECONDS = float(os.getenv("THREAT_INTEL_NEGATIVE_TTL_SECONDS", "300"))
+# Entries in the last part of their lifetime are refreshed in the background
+REFRESH_AHEAD_FRACTION = 0.1
 
 
 def extract_ips_from_details(details: str) -> List[str]:
     """
-    Extract IP addresses from event details string.
-    Supports both IPv4 and basic IPv6 patterns.
+    Extract globally routable IPv4 and IPv6 addresses from event details.
+    Private, CGNAT, loopback, link-local, multicast and other special-purpose
+    ranges are skipped; see indicators.extract_indicators for the rest.
     """
-    # IPv4 pattern
-    ipv4_pattern = r'\b(?:[0-9]{1,3}\.){3}[0-9]{1,3}\b'
-    
-    # Find all IPv4 addresses
-    ips = re.findall(ipv4_pattern, details)
-    
-    # Filter out invalid IPs (e.g., 999.999.999.999)
-    valid_ips = []
-    for ip in ips:
-        parts = ip.split('.')
-        if all(0 <= int(part) <= 255 for part in parts):
-            # Skip private/local IPs
-            if not (parts[0] in ['10', '127'] or 
-                   (parts[0] == '172' and 16 <= int(parts[1]) <= 31) or
-                   (parts[0] == '192' and parts[1] == '168')):
-                valid_ips.append(ip)
-    
-    return valid_ips
+    return public_ips(details)
 
 
 def init_threat_intel_db():
     """Initialize threat intelligence cache table."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS threat_intel_cache (
-            ip TEXT PRIMARY KEY,
-            threat_score INTEGER,
-            is_malicious BOOLEAN,
-            abuse_count INTEGER,
-            country_code TEXT,
-            isp TEXT,
-            domain TEXT,
-            report_url TEXT,
-            cached_at TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with writer() as conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS threat_intel_cache (
+                ip TEXT PRIMARY KEY,
+                threat_score INTEGER,
+                is_malicious BOOLEAN,
+                abuse_count INTEGER,
+                country_code TEXT,
+                isp TEXT,
+                domain TEXT,
+                report_url TEXT,
+                cached_at TEXT
+            )
+        ''')
+
+
+def _row_result(row) -> Dict:
+    return {
+        'ip': row['ip'],
+        'threat_score': row['threat_score'],
+        'is_malicious': bool(row['is_malicious']),
+        'abuse_count': row['abuse_count'],
+        'country_code': row['country_code'],
+        'isp': row['isp'],
+        'domain': row['domain'],
+        'report_url': row['report_url'],
+        'cached': True
+    }
+
+
+def _placeholder(ip: str, error: str) -> Dict:
+    return {
+        'ip': ip,
+        'threat_score': 0,
+        'is_malicious': False,
+        'abuse_count': 0,
+        'country_code': 'Unknown',
+        'isp': 'Unknown',
+        'domain': 'Unknown',
+        'report_url': f"https://www.abuseipdb.com/check/{ip}",
+        'cached': False,
+        'error': error
+    }
+
+
+def get_cached_threat_intel_many(ips: List[str]) -> Dict[str, tuple]:
+    """
+    Looks up unexpired cache rows for many IPs in one query.
+    Returns {ip: (result, cached_at epoch seconds)}.
+    """
+    if not ips:
+        return {}
+    with reader() as conn:
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute(
+            f'SELECT * FROM threat_intel_cache WHERE ip IN ({", ".join("?" * len(ips))})',
+            list(ips)
+        ).fetchall()
+
+    found = {}
+    for row in rows:
+        cached_at = datetime.fromisoformat(row['cached_at'])
+        if datetime.now() - cached_at > timedelta(hours=CACHE_DURATION_HOURS):
+            continue
+        found[row['ip']] = (_row_result(row), cached_at.timestamp())
+    return found
 
 
 def get_cached_threat_intel(ip: str) -> Optional[Dict]:
     """Retrieve cached threat intelligence if not expired."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        'SELECT * FROM threat_intel_cache WHERE ip = ?',
-        (ip,)
-    )
-    row = cursor.fetchone()
-    conn.close()
-    
-    if not row:
-        return None
-    
-    # Check if cache is still valid
-    cached_at = datetime.fromisoformat(row['cached_at'])
-    if datetime.now() - cached_at > timedelta(hours=CACHE_DURATION_HOURS):
-        return None
-    
-    return dict(row)
+    found = get_cached_threat_intel_many([ip])
+    return found[ip][0] if ip in found else None
 
 
 def save_threat_intel(ip: str, data: Dict):
     """Save threat intelligence data to cache."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT OR REPLACE INTO threat_intel_cache 
-        (ip, threat_score, is_malicious, abuse_count, country_code, isp, domain, report_url, cached_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        ip,
-        data.get('abuseConfidenceScore', 0),
-        data.get('abuseConfidenceScore', 0) > 50,
-        data.get('totalReports', 0),
-        data.get('countryCode', 'Unknown'),
-        data.get('isp', 'Unknown'),
-        data.get('domain', 'Unknown'),
-        f"https://www.abuseipdb.com/check/{ip}",
-        datetime.now().isoformat()
-    ))
-    
-    conn.commit()
-    conn.close()
+    with writer() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO threat_intel_cache
+            (ip, threat_score, is_malicious, abuse_count, country_code, isp, domain, report_url, cached_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            ip,
+            data.get('abuseConfidenceScore', 0),
+            data.get('abuseConfidenceScore', 0) > 50,
+            data.get('totalReports', 0),
+            data.get('countryCode', 'Unknown'),
+            data.get('isp', 'Unknown'),
+            data.get('domain', 'Unknown'),
+            f"https://www.abuseipdb.com/check/{ip}",
+            datetime.now().isoformat()
+        ))
 
 
-def check_ip_reputation(ip: str) -> Dict:
-    """
-    Check IP reputation using AbuseIPDB API.
-    Returns cached data if available, otherwise makes API call.
-    """
-    # Check cache first
-    cached = get_cached_threat_intel(ip)
-    if cached:
-        return {
-            'ip': ip,
-            'threat_score': cached['threat_score'],
-            'is_malicious': bool(cached['is_malicious']),
-            'abuse_count': cached['abuse_count'],
-            'country_code': cached['country_code'],
-            'isp': cached['isp'],
-            'domain': cached['domain'],
-            'report_url': cached['report_url'],
-            'cached': True
-        }
-    
+def _fetch_ip_reputation(ip: str) -> Dict:
+    """Asks AbuseIPDB about one IP and saves a successful answer to the cache table."""
     # If no API key, return placeholder data
     if not ABUSEIPDB_API_KEY:
-        return {
-            'ip': ip,
-            'threat_score': 0,
-            'is_malicious': False,
-            'abuse_count': 0,
-            'country_code': 'Unknown',
-            'isp': 'Unknown',
-            'domain': 'Unknown',
-            'report_url': f"https://www.abuseipdb.com/check/{ip}",
-            'cached': False,
-            'error': 'No API key configured'
-        }
-    
+        return _placeholder(ip, 'No API key configured')
+
     try:
         # Make API request
         headers = {
@@ -183,33 +175,179 @@ def check_ip_reputation(ip: str) -> Dict:
                 'cached': False
             }
         else:
-            return {
-                'ip': ip,
-                'threat_score': 0,
-                'is_malicious': False,
-                'abuse_count': 0,
-                'country_code': 'Unknown',
-                'isp': 'Unknown',
-                'domain': 'Unknown',
-                'report_url': f"https://www.abuseipdb.com/check/{ip}",
-                'cached': False,
-                'error': f'API error: {response.status_code}'
-            }
+            return _placeholder(ip, f'API error: {response.status_code}')
     except Exception as e:
+        return _placeholder(ip, str(e))
+
+
+class ThreatIntelCache:
+    """
+    In-process LRU in front of threat_intel_cache.
+
+    Each entry carries an expiry and a refresh time. A hit past its refresh
+    time is still served while a background worker re-fetches it, so hot
+    IPs never fall through to a synchronous API call. Error results
+    (including the no-API-key placeholder) are kept for
+    NEGATIVE_CACHE_SECONDS and never refreshed ahead. Misses go to SQLite in
+    one IN (...) query per batch, then to the API.
+    """
+
+    def __init__(self, max_entries=THREAT_INTEL_MEMORY_ENTRIES, negative_ttl=NEGATIVE_CACHE_SECONDS):
+        self.max_entries = max_entries
+        self.negative_ttl = negative_ttl
+        self.ttl = CACHE_DURATION_HOURS * 3600
+        self._memory = OrderedDict()  # ip -> (expires_at, refresh_at, result), least recently used first
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="threat-intel-refresh")
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "negative_hits": 0,
+                         "api_calls": 0, "refreshes": 0, "evicted": 0}
+
+    def lookup(self, ips: List[str]) -> Dict[str, Dict]:
+        """Reputation for each distinct IP in `ips`: memory, then one SQLite query, then the API."""
+        now = time.time()
+        results, stale, missing = {}, [], []
+        with self._lock:
+            for ip in dict.fromkeys(ips):
+                entry = self._memory.get(ip)
+                if entry is None or entry[0] <= now:
+                    missing.append(ip)
+                    continue
+                self._memory.move_to_end(ip)
+                self.counters["negative_hits" if 'error' in entry[2] else "memory_hits"] += 1
+                results[ip] = {**entry[2], 'cached': True}
+                if entry[1] <= now:
+                    stale.append(ip)
+
+        for ip, (result, cached_at) in get_cached_threat_intel_many(missing).items():
+            self._remember(ip, result, cached_at + self.ttl)
+            with self._lock:
+                self.counters["db_hits"] += 1
+            results[ip] = result
+            if cached_at + self.ttl * (1 - REFRESH_AHEAD_FRACTION) <= now:
+                stale.append(ip)
+
+        for ip in missing:
+            if ip in results:
+                continue
+            with self._lock:
+                self.counters["misses"] += 1
+            results[ip] = self._fetch(ip)
+
+        for ip in stale:
+            self._schedule_refresh(ip)
+        return {ip: results[ip] for ip in dict.fromkeys(ips)}
+
+    def _fetch(self, ip: str) -> Dict:
+        with self._lock:
+            self.counters["api_calls"] += 1
+        result = _fetch_ip_reputation(ip)
+        ttl = self.negative_ttl if 'error' in result else self.ttl
+        self._remember(ip, result, time.time() + ttl)
+        return result
+
+    def _remember(self, ip, result, expires_at):
+        if 'error' in result:
+            refresh_at = expires_at  # negative entries just expire
+        else:
+            refresh_at = expires_at - self.ttl * REFRESH_AHEAD_FRACTION
+        with self._lock:
+            self._memory[ip] = (expires_at, refresh_at, {**result, 'cached': False})
+            self._memory.move_to_end(ip)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def _schedule_refresh(self, ip):
+        with self._lock:
+            if ip in self._refreshing:
+                return
+            self._refreshing.add(ip)
+            self.counters["refreshes"] += 1
+        self._refresher.submit(self._refresh, ip)
+
+    def _refresh(self, ip):
+        try:
+            result = _fetch_ip_reputation(ip)
+            # Keep serving the old answer if the refresh itself failed
+            if 'error' not in result:
+                self._remember(ip, result, time.time() + self.ttl)
+        finally:
+            with self._lock:
+                self._refreshing.discard(ip)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._memory)
+            refreshing = len(self._refreshing)
+        lookups = counters["memory_hits"] + counters["negative_hits"] + counters["db_hits"] + counters["misses"]
         return {
-            'ip': ip,
-            'threat_score': 0,
-            'is_malicious': False,
-            'abuse_count': 0,
-            'country_code': 'Unknown',
-            'isp': 'Unknown',
-            'domain': 'Unknown',
-            'report_url': f"https://www.abuseipdb.com/check/{ip}",
-            'cached': False,
-            'error': str(e)
+            **counters,
+            "lookups": lookups,
+            "hit_rate": round((lookups - counters["misses"]) / lookups, 4) if lookups else 0.0,
+            "memory_size": size,
+            "memory_capacity": self.max_entries,
+            "refreshing": refreshing,
+            "negative_ttl_seconds": self.negative_ttl,
+            "api_key_configured": bool(ABUSEIPDB_API_KEY),
         }
 
 
+threat_intel_cache = ThreatIntelCache()
+
+
+def _feed_result(ip: str, entry) -> Dict:
+    """Result for an IP found in (or, with entry None, absent from) the local feeds."""
+    score, feed, category, network = entry or (0, None, None, None)
+    return {
+        'ip': ip,
+        'threat_score': score,
+        'is_malicious': score > 50,
+        'abuse_count': 0,
+        'country_code': 'Unknown',
+        'isp': 'Unknown',
+        'domain': 'Unknown',
+        'report_url': f"https://www.abuseipdb.com/check/{ip}",
+        'cached': False,
+        'source': f"feed:{feed}" if feed else 'feeds',
+        'matched_network': network,
+        'category': category
+    }
+
+
+def lookup_ip_reputation(ips: List[str]) -> Dict[str, Dict]:
+    """
+    Reputation for each distinct IP: the local feeds first, then (unless
+    THREAT_INTEL_OFFLINE) the cached AbuseIPDB lookup for unlisted IPs.
+    """
+    results = {}
+    remote = []
+    for ip in dict.fromkeys(ips):
+        entry = reputation_engine.lookup(ip)
+        if entry is not None:
+            results[ip] = _feed_result(ip, entry)
+        elif THREAT_INTEL_OFFLINE:
+            results[ip] = _feed_result(ip, None)
+        else:
+            remote.append(ip)
+    if remote:
+        results.update(threat_intel_cache.lookup(remote))
+    return {ip: results[ip] for ip in dict.fromkeys(ips)}
+
+
+def check_ip_reputation(ip: str) -> Dict:
+    """
+    Check IP reputation against the local feeds, then the AbuseIPDB API.
+    Returns cached data if available, otherwise makes API call.
+    """
+    return lookup_ip_reputation([ip])[ip]
+
+
 def enrich_event_with_threat_intel(event_details: str) -> Dict:
     """
     Main function to enrich event with threat intelligence.
@@ -229,8 +367,8 @@ def enrich_event_with_threat_intel(event_details: str) -> Dict:
     malicious_ips = []
     max_score = 0
     
-    for ip in ips[:5]:  # Limit to first 5 IPs to avoid rate limits
-        intel = check_ip_reputation(ip)
+    # Limit to first 5 IPs to avoid rate limits; local feeds answer first
+    for intel in lookup_ip_reputation(ips[:5]).values():
         results.append(intel)
         
         if intel['is_malicious']:
@@ -0,0 +1,49 @@
+import math
+import time
+from datetime import datetime
+
+# SQLite INTEGER is a signed 64-bit value
+_MIN_US, _MAX_US = -(1 << 63), (1 << 63) - 1
+
+
+def to_epoch_us(value, default=None):
+    """
+    Normalizes a timestamp to integer epoch microseconds.
+
+    Accepts ISO 8601 strings (naive ones are local time, like the collector's
+    datetime.now().isoformat()) and epoch numbers or numeric strings in
+    seconds, milliseconds, microseconds or nanoseconds, told apart by
+    magnitude. The result is clamped to SQLite's signed 64-bit INTEGER range;
+    `default` is returned when the value cannot be parsed or converted.
+    """
+    if value is None:
+        return default
+    try:
+        return max(_MIN_US, min(_MAX_US, _convert(value)))
+    except (ValueError, OverflowError, OSError):
+        return default
+
+
+def _convert(value):
+    if isinstance(value, (int, float)):
+        number = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            number = float(text)
+        except ValueError:
+            return round(datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp() * 1_000_000)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite timestamp: {value!r}")
+    magnitude = abs(number)
+    if magnitude >= 1e17:
+        return round(number / 1_000)
+    if magnitude >= 1e14:
+        return round(number)
+    if magnitude >= 1e11:
+        return round(number * 1_000)
+    return round(number * 1_000_000)
+
+
+def now_us():
+    return time.time_ns() // 1_000
@@ -0,0 +1,299 @@
+import asyncio
+import json
+import os
+from typing import Dict
+from fastapi import WebSocket
+
+# Per-client fan-out tuning (overridable via environment)
+WS_QUEUE_SIZE = int(os.getenv("WS_QUEUE_SIZE", "1000"))
+WS_SLOW_CLIENT_POLICY = os.getenv("WS_SLOW_CLIENT_POLICY", "drop_oldest")  # or "disconnect"
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+# Message fields clients can filter on, with the type each value is coerced to
+FILTER_FIELDS = {
+    "severity": str,
+    "type": str,
+    "pid": int,
+    "process_name": str,
+}
+
+# Opt-in side channels beside the event stream
+TOPICS = ("process_tree",)
+
+# Frame batching defaults for clients connecting with ?batch=1
+WS_BATCH_MS = int(os.getenv("WS_BATCH_MS", "50"))
+WS_BATCH_MAX = int(os.getenv("WS_BATCH_MAX", "256"))
+
+
+class ClientConnection:
+    """
+    One WebSocket client with its own bounded send queue and writer task.
+
+    In batching mode the writer coalesces whatever arrives within `batch_ms`
+    (up to `batch_max` messages) into a single JSON array frame. Messages are
+    already serialized by the producer, so a frame is just a string join.
+    """
+
+    def __init__(self, websocket: WebSocket, manager, max_queue=WS_QUEUE_SIZE, policy=WS_SLOW_CLIENT_POLICY,
+                 batch_ms=0, batch_max=WS_BATCH_MAX):
+        self.websocket = websocket
+        self.manager = manager
+        self.policy = policy
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_window = batch_ms / 1000.0
+        self.batch_max = batch_max
+        self.sent = 0
+        self.frames = 0
+        self.dropped = 0
+        self.filters = {}
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self._writer())
+
+    def stop(self):
+        if self.task and self.task is not asyncio.current_task():
+            self.task.cancel()
+        self.task = None
+
+    def offer(self, message: str) -> bool:
+        """
+        Queues a message without waiting on the network.
+        Returns False when the client is too slow and must be disconnected.
+        """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            if self.policy != "drop_oldest":
+                return False
+        # Drop-oldest: make room for the newest message
+        self.queue.get_nowait()
+        self.dropped += 1
+        self.queue.put_nowait(message)
+        return True
+
+    async def _next_frame(self):
+        message = await self.queue.get()
+        if not self.batch_window:
+            return message, 1
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_window
+        batch = [message]
+        while len(batch) < self.batch_max:
+            if self.queue.empty():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(remaining)
+                if self.queue.empty():
+                    break
+            batch.append(self.queue.get_nowait())
+        return "[" + ",".join(batch) + "]", len(batch)
+
+    async def _writer(self):
+        try:
+            while True:
+                frame, count = await self._next_frame()
+                await asyncio.wait_for(self.websocket.send_text(frame), WS_SEND_TIMEOUT)
+                self.sent += count
+                self.frames += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead or stalled socket: reap it and close it so the client can reconnect
+            self.manager.disconnect(self.websocket)
+            await self.manager._close_quietly(self.websocket)
+
+
+class ConnectionManager:
+    """
+    Fans messages out to WebSocket clients.
+
+    `broadcast` only enqueues onto each client's bounded queue, so the ingest
+    path never awaits a socket. Each client's writer task does the sending and
+    reaps its own socket on error.
+
+    Subscription filters are compiled into an inverted index per field
+    (value -> clients) plus the set of clients with no constraint on that
+    field. Recipients are resolved with set intersections before anything is
+    serialized, and a message nobody wants is never serialized at all.
+    """
+
+    def __init__(self):
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self.evicted = 0
+        self.filtered_out = 0
+        self._index = {field: {} for field in FILTER_FIELDS}
+        self._unfiltered = {field: set() for field in FILTER_FIELDS}
+        self._filtering = 0  # clients with at least one filter
+        self.topics = {topic: set() for topic in TOPICS}
+
+    async def connect(self, websocket: WebSocket, batch_ms=0, batch_max=WS_BATCH_MAX):
+        await websocket.accept()
+        client = ClientConnection(websocket, self, batch_ms=batch_ms, batch_max=batch_max)
+        self.clients[websocket] = client
+        self._index_client(client)
+        client.start()
+
+    def disconnect(self, websocket: WebSocket):
+        client = self.clients.pop(websocket, None)
+        if client:
+            self._unindex_client(client)
+            for members in self.topics.values():
+                members.discard(client)
+            client.stop()
+
+    def subscribe(self, websocket: WebSocket, filters: dict):
+        """
+        Replaces a client's filters. Each field maps to a list of accepted
+        values; missing or empty fields accept everything.
+        """
+        client = self.clients.get(websocket)
+        if not client:
+            return
+        compiled = {}
+        for field, cast in FILTER_FIELDS.items():
+            values = filters.get(field)
+            if values is None:
+                continue
+            if not isinstance(values, list):
+                values = [values]
+            values = {cast(v) for v in values}
+            if field in ("severity", "type"):
+                values = {v.upper() for v in values}
+            if values:
+                compiled[field] = values
+        self._unindex_client(client)
+        client.filters = compiled
+        self._index_client(client)
+
+    def handle_client_message(self, websocket: WebSocket, text: str):
+        """
+        Applies subscribe / unsubscribe messages and topic join / leave
+        ({"action": "join", "topic": "process_tree"}); anything else is ignored.
+        """
+        try:
+            message = json.loads(text)
+            action = message.get("action")
+            if action == "subscribe":
+                self.subscribe(websocket, message)
+            elif action == "unsubscribe":
+                self.subscribe(websocket, {})
+            elif action in ("join", "leave"):
+                client = self.clients.get(websocket)
+                members = self.topics.get(message.get("topic"))
+                if client and members is not None:
+                    if action == "join":
+                        members.add(client)
+                    else:
+                        members.discard(client)
+        except (ValueError, TypeError, AttributeError):
+            pass
+
+    def has_members(self, topic):
+        return bool(self.topics.get(topic))
+
+    async def publish(self, topic, message: dict):
+        """Queues a message for the clients that joined `topic`."""
+        members = self.topics.get(topic)
+        if not members:
+            return
+        text = json.dumps(message)
+        for client in list(members):
+            if not client.offer(text):
+                self._evict(client)
+
+    def _index_client(self, client: ClientConnection):
+        for field in FILTER_FIELDS:
+            values = client.filters.get(field)
+            if values is None:
+                self._unfiltered[field].add(client)
+            else:
+                for value in values:
+                    self._index[field].setdefault(value, set()).add(client)
+        if client.filters:
+            self._filtering += 1
+
+    def _unindex_client(self, client: ClientConnection):
+        for field in FILTER_FIELDS:
+            values = client.filters.get(field)
+            if values is None:
+                self._unfiltered[field].discard(client)
+                continue
+            for value in values:
+                subscribers = self._index[field].get(value)
+                if subscribers is not None:
+                    subscribers.discard(client)
+                    if not subscribers:
+                        del self._index[field][value]
+        if client.filters:
+            self._filtering -= 1
+
+    def recipients(self, message: dict):
+        """Clients whose filters accept the message."""
+        if not self._filtering:
+            return list(self.clients.values())
+        matched = None
+        for field in FILTER_FIELDS:
+            allowed = self._unfiltered[field]
+            subscribers = self._index[field].get(message.get(field))
+            if subscribers:
+                allowed = allowed | subscribers
+            matched = allowed if matched is None else matched & allowed
+            if not matched:
+                return []
+        return list(matched)
+
+    async def broadcast(self, message):
+        """
+        Queues a message for every matching client. Accepts a dict, which is
+        filtered and serialized once, or an already-serialized string, which
+        goes to every client.
+        """
+        if isinstance(message, str):
+            targets = list(self.clients.values())
+        else:
+            targets = self.recipients(message)
+            self.filtered_out += len(self.clients) - len(targets)
+            if not targets:
+                return
+            message = json.dumps(message)
+        for client in targets:
+            if not client.offer(message):
+                self._evict(client)
+
+    def _evict(self, client: ClientConnection):
+        """Disconnects a client that cannot keep up."""
+        self.evicted += 1
+        self.disconnect(client.websocket)
+        asyncio.create_task(self._close_quietly(client.websocket))
+
+    async def _close_quietly(self, websocket: WebSocket):
+        try:
+            # 1013: try again later
+            await asyncio.wait_for(websocket.close(code=1013), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "policy": WS_SLOW_CLIENT_POLICY,
+            "queue_capacity": WS_QUEUE_SIZE,
+            "evicted": self.evicted,
+            "filtered_out": self.filtered_out,
+            "topics": {topic: len(members) for topic, members in self.topics.items()},
+            "queues": [
+                {
+                    "depth": c.queue.qsize(),
+                    "sent": c.sent,
+                    "frames": c.frames,
+                    "dropped": c.dropped,
+                    "batch_ms": c.batch_window * 1000,
+                    "filters": {k: sorted(v) for k, v in c.filters.items()},
+                }
+                for c in self.clients.values()
+            ],
+        }
@@ -5,22 +5,44 @@ import KnowledgeGraph from './KnowledgeGraph';
 
 const AnalysisModal = ({ isOpen, onClose, event }) => {
     const [analysis, setAnalysis] = useState(null);
-    const [loading, setLoading] = useState(true);
+    // Sections still streaming in; each one renders as soon as it arrives
+    const [loading, setLoading] = useState({ explanation: true, graph: true, threat_intel: true });
 
     useEffect(() => {
-        if (isOpen && event && event.id) {
-            setLoading(true);
-            fetch(`http://localhost:8001/api/analysis/${event.id}`)
-                .then(res => res.json())
-                .then(data => {
-                    setAnalysis(data);
-                    setLoading(false);
-                })
-                .catch(err => {
-                    console.error("Analysis fetch failed:", err);
-                    setLoading(false);
-                });
-        }
+        if (!(isOpen && event && event.id)) return;
+        setAnalysis({ xai_explanation: '' });
+        setLoading({ explanation: true, graph: true, threat_intel: true });
+
+        const source = new EventSource(`http://localhost:8001/api/analysis/${event.id}/stream`);
+        const update = (fields) => setAnalysis(prev => ({ ...prev, ...fields }));
+        const finish = (section) => setLoading(prev => ({ ...prev, [section]: false }));
+
+        source.addEventListener('token', (e) => {
+            const { text } = JSON.parse(e.data);
+            setAnalysis(prev => ({ ...prev, xai_explanation: (prev?.xai_explanation || '') + text }));
+        });
+        source.addEventListener('explanation', (e) => {
+            const data = JSON.parse(e.data);
+            update({ xai_explanation: data?.text, cached: data?.cached });
+            finish('explanation');
+        });
+        source.addEventListener('graph', (e) => {
+            update({ graph: JSON.parse(e.data) });
+            finish('graph');
+        });
+        source.addEventListener('threat_intel', (e) => {
+            update({ threat_intel: JSON.parse(e.data) });
+            finish('threat_intel');
+        });
+        source.addEventListener('done', () => source.close());
+        // Unknown event (server "error" section) or a dropped connection
+        source.addEventListener('error', (e) => {
+            if (e.data) console.error("Analysis stream failed:", JSON.parse(e.data).error);
+            source.close();
+            setLoading({ explanation: false, graph: false, threat_intel: false });
+        });
+
+        return () => source.close();
     }, [isOpen, event]);
 
     if (!isOpen) return null;
@@ -70,7 +92,7 @@ const AnalysisModal = ({ isOpen, onClose, event }) => {
                                     <div className="absolute top-0 right-0 p-2 opacity-10">
                                         <Cpu size={40} className="text-cyber-primary" />
                                     </div>
-                                    {loading ? (
+                                    {loading.explanation && !analysis?.xai_explanation ? (
                                         <div className="animate-pulse space-y-3">
                                             <div className="h-4 bg-slate-800 rounded w-3/4"></div>
                                             <div className="h-4 bg-slate-800 rounded w-full"></div>
@@ -79,6 +101,7 @@ const AnalysisModal = ({ isOpen, onClose, event }) => {
                                     ) : (
                                         <p className="text-sm italic leading-relaxed text-slate-300 font-mono">
                                             "{analysis?.xai_explanation || 'No AI context available for this event type.'}"
+                                            {loading.explanation && <span className="animate-pulse text-cyber-primary">▍</span>}
                                         </p>
                                     )}
                                 </div>
@@ -110,7 +133,7 @@ const AnalysisModal = ({ isOpen, onClose, event }) => {
                                     <AlertTriangle size={14} /> THREAT_INTELLIGENCE
                                 </h3>
                                 <div className="space-y-3">
-                                    {loading ? (
+                                    {loading.threat_intel ? (
                                         <div className="p-4 bg-cyber-dark rounded-xl border border-cyber-border/50 animate-pulse">
                                             <div className="h-4 bg-slate-800 rounded w-2/3"></div>
                                         </div>
@@ -200,7 +223,7 @@ const AnalysisModal = ({ isOpen, onClose, event }) => {
                             <h3 className="text-xs font-mono font-bold text-cyber-warning p-1 border-l-2 border-cyber-warning mb-4 flex items-center gap-2">
                                 <Network size={14} /> LINEAGE_KNOWLEDGE_GRAPH
                             </h3>
-                            {loading ? (
+                            {loading.graph ? (
                                 <div className="flex-1 bg-cyber-dark rounded-xl border border-cyber-border flex items-center justify-center">
                                     <div className="text-cyber-primary font-mono text-xs animate-pulse">GENERATING_TOPOLOGY...</div>
                                 </div>
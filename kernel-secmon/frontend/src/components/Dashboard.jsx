@@ -33,21 +33,27 @@ const Dashboard = () => {
         fetchData();
 
         const connectWs = () => {
-            const ws = new WebSocket('ws://localhost:8001/ws/feed');
+            // Batched mode: the server coalesces messages into JSON array frames
+            const ws = new WebSocket('ws://localhost:8001/ws/feed?batch=1');
             ws.onopen = () => {
                 console.log('Connected to WS');
                 setIsConnected(true);
             };
 
             ws.onmessage = (event) => {
-                const newEvent = JSON.parse(event.data);
-                setEvents(prev => [...prev.slice(-99), newEvent]);
+                const data = JSON.parse(event.data);
+                const batch = Array.isArray(data) ? data : [data];
+                if (batch.length === 0) return;
 
+                setEvents(prev => [...prev, ...batch].slice(-100));
+
+                const high = batch.filter(e => e.severity === 'HIGH').length;
+                const medium = batch.filter(e => e.severity === 'MEDIUM').length;
                 setStats(prev => ({
                     ...prev,
-                    total_events: (prev.total_events || 0) + 1,
-                    high_severity: newEvent.severity === 'HIGH' ? (prev.high_severity || 0) + 1 : (prev.high_severity || 0),
-                    medium_severity: newEvent.severity === 'MEDIUM' ? (prev.medium_severity || 0) + 1 : (prev.medium_severity || 0)
+                    total_events: (prev.total_events || 0) + batch.length,
+                    high_severity: (prev.high_severity || 0) + high,
+                    medium_severity: (prev.medium_severity || 0) + medium
                 }));
             };
 
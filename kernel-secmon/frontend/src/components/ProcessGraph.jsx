@@ -6,6 +6,10 @@ const ProcessGraph = ({ onNodeClick }) => {
     const [graphData, setGraphData] = useState({ nodes: [], links: [] });
     const [loading, setLoading] = useState(true);
     const graphRef = useRef();
+    // Local copy of the server graph, patched with deltas
+    const versionRef = useRef(null);
+    const nodesRef = useRef(new Map());
+    const linksRef = useRef(new Map());
 
     useEffect(() => {
         fetchProcessTree();
@@ -15,11 +19,45 @@ const ProcessGraph = ({ onNodeClick }) => {
         return () => clearInterval(interval);
     }, []);
 
+    const applyDelta = (delta) => {
+        const nodes = nodesRef.current;
+        const links = linksRef.current;
+        if (delta.full) {
+            nodes.clear();
+            links.clear();
+        }
+        (delta.removed || []).forEach(id => {
+            nodes.delete(id);
+            links.delete(id);
+        });
+        delta.nodes.forEach(node => {
+            // Keep the existing object so the layout position is preserved
+            const existing = nodes.get(node.id);
+            nodes.set(node.id, existing ? Object.assign(existing, node) : node);
+        });
+        delta.links.forEach(link => links.set(link.target, link));
+        versionRef.current = delta.version;
+    };
+
     const fetchProcessTree = async () => {
         try {
-            const res = await fetch('http://localhost:8001/api/processes/tree');
-            const data = await res.json();
-            setGraphData(data);
+            const since = versionRef.current === null ? '' : `?since=${versionRef.current}`;
+            const res = await fetch(`http://localhost:8001/api/processes/tree${since}`);
+            if (res.status === 304) {
+                setLoading(false);
+                return;
+            }
+            const delta = await res.json();
+            applyDelta(delta);
+
+            const nodes = nodesRef.current;
+            setGraphData({
+                nodes: Array.from(nodes.values()),
+                // Only draw links whose endpoints are both known
+                links: Array.from(linksRef.current.values())
+                    .filter(l => nodes.has(l.source) && nodes.has(l.target))
+                    .map(l => ({ ...l }))
+            });
             setLoading(false);
         } catch (err) {
             console.error('Failed to fetch process tree:', err);
@@ -39,11 +77,11 @@ const ProcessGraph = ({ onNodeClick }) => {
 
     const handleNodeClick = (node) => {
         if (onNodeClick) {
-            // Find a recent event for this process
-            fetch(`http://localhost:8001/api/events?limit=200`)
+            // Fetch the most recent event for this process
+            fetch(`http://localhost:8001/api/events?pid=${node.pid}&limit=1`)
                 .then(res => res.json())
                 .then(events => {
-                    const event = events.find(e => e.pid === node.pid);
+                    const event = events[0];
                     if (event) {
                         onNodeClick(event);
                     }
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Full-text search benchmark.
+
+Fills a scratch database with N synthetic events (default 10M) through the
+normal save_events() path, then times /api/search queries (search_events)
+against it and, for comparison, the LIKE '%...%' scan they replace.
+
+Usage: python bench_search.py [N] [--keep] [--no-like]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+N = int(next((a for a in sys.argv[1:] if a.isdigit()), 10_000_000))
+KEEP = "--keep" in sys.argv
+LIKE = "--no-like" not in sys.argv
+BATCH = 10_000
+REPEAT = 20
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench_search.db")
+os.environ["SECMON_DB_PATH"] = DB_FILE
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from database import init_db, save_events, search_events  # noqa: E402
+from db_pool import pool, reader  # noqa: E402
+from models import KernelEvent  # noqa: E402
+
+PROCESSES = ["bash", "sshd", "python3", "nginx", "kworker/0:1", "systemd", "dockerd", "nc", "rootkit_daemon"]
+TEMPLATES = [
+    ("INFO", "FILE_OPEN", "Opened /var/log/syslog for write by uid {uid}"),
+    ("INFO", "NETWORK_CONNECTION", "Outbound connection to {ip}:{port}"),
+    ("MEDIUM", "MODULE_LOAD", "Kernel module loaded: {module}"),
+    ("HIGH", "SYSCALL_HOOK", "sys_call_table[{nr}] modified to 0xffffffffc0{addr:06x}"),
+    ("HIGH", "PRIV_ESC", "UID transition from {uid} to 0 without execve"),
+]
+MODULES = ["ext4.ko", "nf_conntrack.ko", "rootkit_v1.ko", "e1000e.ko", "overlay.ko"]
+
+QUERIES = ["sys_call_table", "rootkit_v1.ko", "10.13.37.5", "rootkit_daemon", "uid 1000", "nonexistent_token_xyz"]
+
+
+def make_event(i, rng):
+    severity, event_type, template = TEMPLATES[i % len(TEMPLATES)]
+    details = template.format(
+        uid=rng.choice((0, 33, 1000, 1001)),
+        ip=f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+        port=rng.choice((22, 80, 443, 4444, 8080)),
+        module=rng.choice(MODULES),
+        nr=rng.randrange(400),
+        addr=rng.randrange(1 << 24),
+    )
+    return KernelEvent(
+        timestamp=f"2026-01-01T00:00:{i % 60:02d}",
+        pid=rng.randrange(100, 40000),
+        process_name=rng.choice(PROCESSES),
+        severity=severity,
+        type=event_type,
+        details=details,
+    )
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def main():
+    print("=" * 60)
+    print(f"FTS5 search benchmark: {N:,} events -> {DB_FILE}")
+    print("=" * 60)
+    init_db()
+    rng = random.Random(42)
+
+    start = time.perf_counter()
+    for offset in range(0, N, BATCH):
+        save_events([make_event(i, rng) for i in range(offset, min(N, offset + BATCH))])
+        if (offset // BATCH) % 100 == 0:
+            print(f"  {offset:,} / {N:,} events", end="\r", flush=True)
+    elapsed = time.perf_counter() - start
+    print(f"Ingest: {N / elapsed:,.0f} events/s ({elapsed:.1f}s), db size {os.path.getsize(DB_FILE) / 2**20:,.0f} MiB")
+
+    print(f"\n{'query':24} {'hits/page':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for text in QUERIES:
+        samples = []
+        for _ in range(REPEAT):
+            t = time.perf_counter()
+            page = search_events(text, limit=50)
+            samples.append((time.perf_counter() - t) * 1000)
+        print(f"{text:24} {len(page['results']):>9} {percentile(samples, 0.5):>9.2f} {percentile(samples, 0.95):>9.2f}")
+
+    if LIKE:
+        print("\nBaseline: LIKE scan (single run)")
+        for text in ("10.13.37.5", "nonexistent_token_xyz"):
+            t = time.perf_counter()
+            with reader() as conn:
+                conn.execute("SELECT id FROM events WHERE details LIKE ? ORDER BY id DESC LIMIT 50", (f"%{text}%",)).fetchall()
+            print(f"{text:24} {(time.perf_counter() - t) * 1000:>9.2f} ms")
+
+    pool.close()
+    if not KEEP:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(DB_FILE + suffix):
+                os.remove(DB_FILE + suffix)
+
+
+if __name__ == "__main__":
+    main()